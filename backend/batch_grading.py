@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""Batch grading: pushes large NEW_APPLICATION backlogs through the Gemini Batch API.
+
+Batch jobs are cheaper than one synchronous generate_content call per candidate and
+don't count against the interactive rate limits, at the cost of latency (results
+arrive within hours, not seconds). The grader submits a batch when the backlog is at
+least BATCH_GRADING_MIN_CANDIDATES, records the job in grading_batches and parks the
+candidates in GRADING_BATCHED; each later cycle polls pending jobs and applies results.
+
+Set GEMINI_BATCH_BACKEND=local to use LocalBatchBackend, an offline stand-in for the
+batch endpoint that stores jobs on disk and grades with a keyword-overlap heuristic.
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+from utils import log
+
+# --- Configuration ---
+# Use batch mode only when at least this many candidates are waiting (else grade synchronously)
+BATCH_GRADING_MIN_CANDIDATES = int(os.getenv("BATCH_GRADING_MIN_CANDIDATES", "200"))
+# Requests per batch job (keeps each inline batch well under the 20 MB request limit)
+BATCH_MAX_REQUESTS = 500
+# "gemini" for the real Batch API, "local" for the offline stand-in
+BATCH_BACKEND = os.getenv("GEMINI_BATCH_BACKEND", "gemini")
+LOCAL_BATCH_DIR = Path(os.getenv("GEMINI_BATCH_LOCAL_DIR", Path(__file__).parent / "local_batches"))
+# The local stand-in reports jobs as running for this long, so polling gets exercised
+LOCAL_BATCH_DELAY_SECONDS = int(os.getenv("GEMINI_BATCH_LOCAL_DELAY_SECONDS", "30"))
+
+_FAILED_STATES = {"JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED"}
+
+
+class GeminiBatchBackend:
+    """Submits and polls jobs on the Gemini Batch API (inline requests)."""
+
+    name = "gemini"
+
+    def __init__(self, gemini_client):
+        self.client = gemini_client
+
+    def submit(self, model: str, requests: list[dict], display_name: str) -> str:
+        job = self.client.batches.create(model=model, src=requests, config={"display_name": display_name})
+        return job.name
+
+    def poll(self, batch_name: str):
+        """Return (state, results): state is PENDING/SUCCEEDED/FAILED; results holds one
+        parsed grade dict (or None on a per-request error) per request, in order."""
+        job = self.client.batches.get(name=batch_name)
+        state = job.state.name
+        if state in _FAILED_STATES:
+            return "FAILED", None
+        if state != "JOB_STATE_SUCCEEDED":
+            return "PENDING", None
+
+        results = []
+        for item in job.dest.inlined_responses or []:
+            if item.error or not item.response:
+                results.append(None)
+                continue
+            try:
+                results.append(json.loads(item.response.text.strip()))
+            except (ValueError, AttributeError):
+                results.append(None)
+        return "SUCCEEDED", results
+
+
+class LocalBatchBackend:
+    """
+    Offline stand-in for the Gemini Batch API with the same submit/poll interface.
+    Jobs are written to LOCAL_BATCH_DIR and complete LOCAL_BATCH_DELAY_SECONDS after
+    submission; each request is scored by word overlap between the resume and the job
+    description, so no network access or API key is needed.
+    """
+
+    name = "local"
+
+    def __init__(self, directory: Path = LOCAL_BATCH_DIR):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def submit(self, model: str, requests: list[dict], display_name: str) -> str:
+        batch_name = f"local-batches/{uuid.uuid4().hex}"
+        self._path(batch_name).write_text(json.dumps({
+            "display_name": display_name,
+            "model": model,
+            "submitted_at": time.time(),
+            "requests": requests,
+        }))
+        return batch_name
+
+    def poll(self, batch_name: str):
+        path = self._path(batch_name)
+        if not path.exists():
+            return "FAILED", None
+        job = json.loads(path.read_text())
+        if time.time() - job["submitted_at"] < LOCAL_BATCH_DELAY_SECONDS:
+            return "PENDING", None
+        return "SUCCEEDED", [self._grade(request) for request in job["requests"]]
+
+    def _path(self, batch_name: str) -> Path:
+        return self.directory / f"{batch_name.split('/')[-1]}.json"
+
+    @staticmethod
+    def _grade(request: dict) -> dict:
+        prompt = request["contents"][0]["parts"][0]["text"]
+        job_part, _, resume_part = prompt.partition("CANDIDATE RESUME:")
+        job_words = set(re.findall(r"[a-z]{3,}", job_part.lower()))
+        resume_words = set(re.findall(r"[a-z]{3,}", resume_part.lower()))
+        overlap = len(job_words & resume_words) / max(len(job_words), 1)
+        score = min(100, round(overlap * 100))
+        return {"score": score, "reasoning": f"[local batch stand-in] {score}% of job description terms found in resume"}
+
+
+def get_batch_backend(gemini_client):
+    if BATCH_BACKEND == "local":
+        return LocalBatchBackend()
+    return GeminiBatchBackend(gemini_client)
+
+
+def build_batch_request(prompt: str, schema) -> dict:
+    """One inline batch request: the grading prompt with the structured grade schema."""
+    # Plain JSON so requests can also be stored by the local stand-in
+    if hasattr(schema, "model_dump"):
+        schema = schema.model_dump(mode="json", exclude_none=True)
+    return {
+        "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+        "config": {
+            "response_mime_type": "application/json",
+            "response_schema": schema,
+        },
+    }
+
+
+def submit_grading_batches(supabase, backend, model: str, prompts: dict, schema) -> tuple[int, list]:
+    """
+    Submit {candidate_id: prompt} as batch jobs of up to BATCH_MAX_REQUESTS, persist each
+    job and park its candidates in GRADING_BATCHED. Each chunk succeeds or fails on its own.
+    Returns (candidates submitted, ids from chunks that failed to submit).
+    """
+    candidate_ids = list(prompts)
+    submitted, unsubmitted = 0, []
+    for i in range(0, len(candidate_ids), BATCH_MAX_REQUESTS):
+        chunk = candidate_ids[i:i + BATCH_MAX_REQUESTS]
+        requests = [build_batch_request(prompts[cid], schema) for cid in chunk]
+        display_name = f"cv-grading-{datetime.now(timezone.utc):%Y%m%d-%H%M%S}-{i // BATCH_MAX_REQUESTS}"
+
+        try:
+            batch_name = backend.submit(model, requests, display_name)
+            supabase.table("grading_batches").insert({
+                "batch_name": batch_name,
+                "backend": backend.name,
+                "model": model,
+                "candidate_ids": chunk,
+            }).execute()
+            supabase.table("candidates").update({"status": "GRADING_BATCHED"}).in_("id", chunk).execute()
+        except Exception as e:
+            # A job whose row or candidates didn't persist is never polled; its candidates are graded elsewhere
+            log("ERROR", f"Failed to submit grading batch of {len(chunk)} candidate(s): {e}")
+            unsubmitted.extend(chunk)
+            continue
+
+        log("INFO", f"Submitted grading batch {batch_name} ({len(chunk)} candidates)")
+        submitted += len(chunk)
+    return submitted, unsubmitted
+
+
+def poll_grading_batches(supabase, backend, apply_grade, flush) -> int:
+    """
+    Poll every pending batch job. Finished jobs have their grades applied through
+    apply_grade(candidate, score, reasoning) and persisted by flush() before the job is
+    marked done, so a crash in between leaves the job pending and it is re-applied next
+    cycle. Candidates without a usable result (or in a failed job) go back to
+    NEW_APPLICATION for synchronous grading. Returns grades applied.
+    """
+    result = (
+        supabase.table("grading_batches")
+        .select("id, batch_name, backend, candidate_ids")
+        .eq("state", "PENDING")
+        .eq("backend", backend.name)
+        .order("created_at")
+        .execute()
+    )
+
+    applied = 0
+    for batch in result.data or []:
+        state, results = backend.poll(batch["batch_name"])
+        if state == "PENDING":
+            continue
+
+        candidate_ids = batch["candidate_ids"]
+        retry_ids = list(candidate_ids)
+        batch_applied = 0
+        if state == "SUCCEEDED":
+            rows = (
+                supabase.table("candidates")
+                .select("id, email, metadata, status")
+                .in_("id", candidate_ids)
+                .execute()
+            ).data or []
+            by_id = {row["id"]: row for row in rows}
+            retry_ids = []
+            for candidate_id, grade in zip(candidate_ids, results):
+                candidate = by_id.get(candidate_id)
+                # Skip rows that were deleted or moved on while the batch was running
+                if not candidate or candidate.get("status") != "GRADING_BATCHED":
+                    continue
+                if not grade or "score" not in grade:
+                    retry_ids.append(candidate_id)
+                    continue
+                apply_grade(candidate, grade["score"], grade.get("reasoning", "No reasoning provided"))
+                batch_applied += 1
+            retry_ids.extend(candidate_ids[len(results):])
+            flush()
+        else:
+            log("ERROR", f"Grading batch {batch['batch_name']} failed — returning {len(candidate_ids)} candidate(s) to the queue")
+
+        if retry_ids:
+            (
+                supabase.table("candidates")
+                .update({"status": "NEW_APPLICATION"})
+                .in_("id", retry_ids)
+                .eq("status", "GRADING_BATCHED")
+                .execute()
+            )
+        supabase.table("grading_batches").update({
+            "state": state,
+            "completed_at": datetime.now(timezone.utc).isoformat(),
+        }).eq("id", batch["id"]).execute()
+        log("INFO", f"Grading batch {batch['batch_name']} {state.lower()}: {batch_applied} grade(s) applied, {len(retry_ids)} requeued")
+        applied += batch_applied
+
+    return applied
+
+
+def requeue_stranded_candidates(supabase) -> int:
+    """
+    Return GRADING_BATCHED candidates that no pending batch job covers (the job finished
+    but their grade was never written, or the job row is gone) to NEW_APPLICATION.
+    Returns the number requeued.
+    """
+    pending = (
+        supabase.table("grading_batches")
+        .select("candidate_ids")
+        .eq("state", "PENDING")
+        .execute()
+    ).data or []
+    covered = {cid for batch in pending for cid in batch["candidate_ids"] or []}
+
+    stranded = []
+    last_id = None
+    while True:
+        query = (
+            supabase.table("candidates")
+            .select("id")
+            .eq("status", "GRADING_BATCHED")
+            .order("id")
+            .limit(1000)
+        )
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        rows = query.execute().data or []
+        if not rows:
+            break
+        stranded.extend(row["id"] for row in rows if row["id"] not in covered)
+        last_id = rows[-1]["id"]
+
+    for i in range(0, len(stranded), BATCH_MAX_REQUESTS):
+        (
+            supabase.table("candidates")
+            .update({"status": "NEW_APPLICATION"})
+            .in_("id", stranded[i:i + BATCH_MAX_REQUESTS])
+            .eq("status", "GRADING_BATCHED")
+            .execute()
+        )
+    if stranded:
+        log("WARN", f"Requeued {len(stranded)} GRADING_BATCHED candidate(s) with no pending batch job")
+    return len(stranded)
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""Per-job Gemini context caches for grading.
+
+Every candidate for a job is graded with the same prefix: the grading prompt with the
+job description filled in. Instead of re-sending that prefix as fresh input tokens on
+every call, the grader stores it once per job as a Gemini cached-content entry and
+each call sends only the resume.
+
+An entry is identified by (job, prompt kind) and fingerprinted by its exact content
+and model, so editing the job description or the cv_scoring prompt replaces it.
+Entries live for CONTEXT_CACHE_TTL_SECONDS and are renewed shortly before they expire;
+a replaced entry is left to lapse by its TTL, since in-flight calls may still use it.
+Entries are deleted once their job drops out of the grading queue and they have been
+idle for CONTEXT_CACHE_IDLE_SECONDS (ingest may still be grading with them).
+
+A prefix Gemini refuses outright (400 INVALID_ARGUMENT, e.g. too small to cache) is
+never tried again; any other creation error only pauses caching for that prefix for
+CONTEXT_CACHE_RETRY_SECONDS.
+"""
+
+import os
+import time
+import hashlib
+import threading
+
+from utils import log, call_gemini, error_status, error_reasons
+
+# --- Configuration ---
+CONTEXT_CACHE_ENABLED = os.getenv("GEMINI_CONTEXT_CACHE", "1") == "1"
+CONTEXT_CACHE_TTL_SECONDS = 60 * 60
+# Recreate an entry this long before it expires so in-flight calls don't hit a dead cache
+CONTEXT_CACHE_RENEW_MARGIN_SECONDS = 5 * 60
+# Gemini rejects explicit caches smaller than this (tokens; estimated as chars / 4)
+CONTEXT_CACHE_MIN_TOKENS = 1024
+# Only worth creating a cache when at least this many candidates share the job
+CONTEXT_CACHE_MIN_CANDIDATES = 2
+# After a transient creation failure, send full prompts for this long before retrying
+CONTEXT_CACHE_RETRY_SECONDS = 5 * 60
+# retain() keeps entries used this recently, since inline ingest grading shares the registry
+CONTEXT_CACHE_IDLE_SECONDS = 5 * 60
+
+
+def _fingerprint(model: str, prefix: str) -> str:
+    return hashlib.sha256(f"{model}\0{prefix}".encode("utf-8")).hexdigest()
+
+
+def _is_definitive_rejection(error: Exception) -> bool:
+    """Whether Gemini refused the content itself (retrying the same prefix can't succeed)."""
+    return error_status(error) == 400 or "INVALID_ARGUMENT" in error_reasons(error)
+
+
+class JobContextCaches:
+    """Thread-safe registry of Gemini cached-content entries, one per (job, kind, model)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._entries = {}  # (job_id, kind, model) -> {"name", "fingerprint", "expires_at", "last_used"}
+        self._rejected = set()  # fingerprints Gemini refused to cache
+        self._retry_at = {}  # fingerprint -> time.time() after which creation may be retried
+
+    def get(self, gemini_client, job_id, kind: str, model: str, prefix: str) -> str | None:
+        """Return the cached-content name holding `prefix` for this job, creating or
+        replacing the entry as needed. Returns None when caching isn't possible."""
+        if not CONTEXT_CACHE_ENABLED or job_id is None:
+            return None
+        if len(prefix) // 4 < CONTEXT_CACHE_MIN_TOKENS:
+            return None
+
+        fingerprint = _fingerprint(model, prefix)
+        if fingerprint in self._rejected or time.time() < self._retry_at.get(fingerprint, 0):
+            return None
+
+        key = (job_id, kind, model)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # One creation per job at a time; other workers wait and reuse it
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+            now = time.time()
+            if entry and entry["fingerprint"] == fingerprint and entry["expires_at"] - now > CONTEXT_CACHE_RENEW_MARGIN_SECONDS:
+                entry["last_used"] = now
+                return entry["name"]
+            if time.time() < self._retry_at.get(fingerprint, 0):
+                return None
+
+            if entry:
+                # The old entry isn't deleted: calls still in flight may reference it, and it expires on its own
+                reason = "changed" if entry["fingerprint"] != fingerprint else "expiring"
+                log("INFO", f"Context cache for job {job_id} ({kind}) {reason} — replacing")
+
+            try:
+                name = self._create(gemini_client, job_id, kind, model, prefix)
+            except Exception as e:
+                with self._lock:
+                    self._entries.pop(key, None)
+                if _is_definitive_rejection(e):
+                    log("WARN", f"Gemini won't cache the prompt for job {job_id} ({kind}), sending full prompts: {e}")
+                    self._rejected.add(fingerprint)
+                else:
+                    log("WARN", f"Could not create context cache for job {job_id} ({kind}), sending full prompts "
+                                f"for {CONTEXT_CACHE_RETRY_SECONDS}s: {e}")
+                    self._retry_at[fingerprint] = time.time() + CONTEXT_CACHE_RETRY_SECONDS
+                return None
+
+            self._retry_at.pop(fingerprint, None)
+            with self._lock:
+                self._entries[key] = {"name": name, "fingerprint": fingerprint,
+                                      "expires_at": now + CONTEXT_CACHE_TTL_SECONDS, "last_used": now}
+            log("INFO", f"Created context cache for job {job_id} ({kind}): {name}")
+            return name
+
+    def retain(self, gemini_client, job_ids: set):
+        """Delete entries for jobs that no longer have candidates waiting and haven't been used lately."""
+        idle_since = time.time() - CONTEXT_CACHE_IDLE_SECONDS
+        with self._lock:
+            stale = [
+                self._entries.pop(key) for key, entry in list(self._entries.items())
+                if key[0] not in job_ids and entry["last_used"] < idle_since
+            ]
+        for entry in stale:
+            self._delete(gemini_client, entry["name"])
+
+    @staticmethod
+    def _create(gemini_client, job_id, kind: str, model: str, prefix: str) -> str:
+        from google.genai import types
+
+        cache = call_gemini(lambda: gemini_client.caches.create(
+            model=model,
+            config=types.CreateCachedContentConfig(
+                display_name=f"grading-job-{job_id}-{kind}",
+                contents=[types.Content(role="user", parts=[types.Part(text=prefix)])],
+                ttl=f"{CONTEXT_CACHE_TTL_SECONDS}s",
+            ),
+        ), "Context cache create")
+        return cache.name
+
+    @staticmethod
+    def _delete(gemini_client, name: str):
+        try:
+            call_gemini(lambda: gemini_client.caches.delete(name=name), "Context cache delete")
+        except Exception as e:
+            # Already expired or deleted — nothing to clean up
+            log("DEBUG", f"Context cache {name} delete skipped: {e}")
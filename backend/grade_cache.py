@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""Persistent grade memoization for the grader.
+
+A grade is a pure function of (resume, job description, prompt, model), so repeat
+gradings - a row reset to NEW_APPLICATION, a duplicate application, a rerun job - can
+reuse the stored score and reasoning instead of paying for another Gemini call. This
+also makes regrades deterministic.
+
+Entries live in a local SQLite file; once it grows past GRADE_CACHE_MAX_BYTES the
+least recently used entries are evicted.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+
+from utils import log
+
+# --- Configuration ---
+GRADE_CACHE_PATH = Path(os.getenv("GRADE_CACHE_PATH", Path(__file__).parent.parent / "grade_cache.sqlite3"))
+GRADE_CACHE_MAX_BYTES = int(os.getenv("GRADE_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+# Set GRADE_CACHE=0 to always call Gemini
+GRADE_CACHE_ENABLED = os.getenv("GRADE_CACHE", "1") == "1"
+
+
+def grade_cache_key(resume: bytes | str, job_description: str, prompt: str, model: str) -> str:
+    """Hash of every input that determines a grade."""
+    digest = hashlib.sha256()
+    for part in (resume, job_description or "", prompt or "", model):
+        data = part if isinstance(part, bytes) else part.encode("utf-8")
+        # Length prefix keeps ("ab", "c") and ("a", "bc") from colliding
+        digest.update(len(data).to_bytes(8, "big"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class GradeCache:
+    """SQLite-backed {key: {"score", "reasoning"}} store with size-based LRU eviction."""
+
+    def __init__(self, path: Path = GRADE_CACHE_PATH, max_bytes: int = GRADE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS grades (
+                key TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )"""
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute("SELECT result FROM grades WHERE key = ?", (key,)).fetchone()
+            if not row:
+                return None
+            self._conn.execute("UPDATE grades SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def put(self, key: str, result: dict):
+        entry = json.dumps({"score": result.get("score"), "reasoning": result.get("reasoning")})
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO grades (key, result, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, entry, len(entry), time.time()),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM grades").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Trim to 90% so we don't evict on every insert once full
+        target = total - int(self.max_bytes * 0.9)
+        freed = 0
+        stale = []
+        for key, size in self._conn.execute("SELECT key, size FROM grades ORDER BY last_used"):
+            stale.append((key,))
+            freed += size
+            if freed >= target:
+                break
+        self._conn.executemany("DELETE FROM grades WHERE key = ?", stale)
+        log("INFO", f"Grade cache over {self.max_bytes} bytes — evicted {len(stale)} entries")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_grade_cache() -> GradeCache | None:
+    """Return the process-wide grade cache, or None if disabled/unavailable."""
+    global _cache, GRADE_CACHE_ENABLED
+    if not GRADE_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = GradeCache()
+            except sqlite3.Error as e:
+                log("WARN", f"Grade cache unavailable, grading without it: {e}")
+                GRADE_CACHE_ENABLED = False
+                return None
+    return _cache
+
+
+def cached_grade(key: str, grade) -> dict:
+    """Return the cached grade for key, or compute it with grade() and store it."""
+    cache = get_grade_cache()
+    if cache:
+        hit = cache.get(key)
+        if hit is not None:
+            log("INFO", f"Grade cache hit ({key[:12]})")
+            return hit
+
+    result = grade()
+    if cache and "score" in result:
+        cache.put(key, result)
+    return result
@@ -1,11 +1,37 @@
 #!/usr/bin/env python3
 """The Brain: Scores candidates against the job description using Gemini."""
 
+import os
 import json
+import time
+import threading
 import tempfile
 import httpx
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
-from utils import get_supabase_client, get_gemini_client, log
+from utils import (
+    get_supabase_client,
+    get_gemini_client,
+    log,
+    throttle_gemini,
+    AdaptiveLimiter,
+    CircuitOpenError,
+    call_gemini,
+    on_gemini_rate_limit,
+    delete_gemini_file,
+    gemini_available,
+)
+from grade_cache import grade_cache_key, cached_grade, get_grade_cache
+from context_cache import JobContextCaches, CONTEXT_CACHE_MIN_CANDIDATES
+from prescreen import prescreen_candidates, prescreen_reasoning
+import reference_data
+from batch_grading import (
+    BATCH_GRADING_MIN_CANDIDATES,
+    get_batch_backend,
+    poll_grading_batches,
+    requeue_stranded_candidates,
+    submit_grading_batches,
+)
 
 # --- Configuration ---
 GRADING_PROMPT_PDF = """You are a strict hiring manager evaluating candidates.
@@ -30,106 +56,473 @@ CANDIDATE RESUME:
 Rate this candidate from 0-100 based on how well they match the job description.
 Be strict in your evaluation. Only give high scores (80+) to truly exceptional matches."""
 
+# Added to the PDF prompt when the same call should also return the resume's text
+TRANSCRIBE_INSTRUCTION = """
+Also return the full text content of the resume in a clean, readable format as resume_text."""
+
+# Appended after the resumes when several candidates are graded in one request
+PACKED_INSTRUCTION = """
+The resumes above belong to {count} different candidates, each introduced by a
+=== CANDIDATE <id> === line. Grade every candidate independently against the job
+description, as if it were the only resume you had seen. Return exactly one entry per
+candidate, with candidate_id set to the id from its header."""
+
+PACKED_RESUME_HEADER = "\n=== CANDIDATE {candidate_id} ===\n"
+
+GRADING_MODEL = "gemini-2.5-flash"
+# Optional cheaper first-pass model. When set, only scores within CASCADE_BAND of
+# PASS_SCORE are re-graded with GRADING_MODEL; clear accepts and rejects stand.
+CASCADE_MODEL = os.getenv("GRADER_CASCADE_MODEL", "")
+CASCADE_BAND = int(os.getenv("GRADER_CASCADE_BAND", "15"))
+# Scores at or above this pass to the mailer; below are rejected
+PASS_SCORE = 50
+# Statuses a grade may be written over; anything else has moved on since it was queued
+GRADEABLE_STATUSES = ("NEW_APPLICATION", "GRADING_BATCHED")
+# Upper bound on candidates graded at once; the adaptive limiter works below this
+GRADER_CONCURRENCY = int(os.getenv("GRADER_CONCURRENCY", "8"))
+# In-flight limit the adaptive limiter starts from
+GRADER_INITIAL_CONCURRENCY = 4
+# Give up waiting on a single candidate after this long (it is retried next cycle)
+GRADER_CANDIDATE_TIMEOUT_SECONDS = 180
+# Candidates fetched per page of the NEW_APPLICATION queue (keep equal to prescreen.IDF_GROUP_SIZE)
+GRADER_PAGE_SIZE = 250
+# Grades buffered before a bulk write-back, and the longest a grade may sit unwritten
+GRADE_WRITE_BATCH_SIZE = 50
+GRADE_FLUSH_INTERVAL_SECONDS = 10
+# Failed grading attempts before a candidate is parked as GRADING_FAILED
+GRADING_MAX_ATTEMPTS = int(os.getenv("GRADING_MAX_ATTEMPTS", "5"))
+# Rough Gemini input size of one grading request, used for TPM throttling (tokens)
+GRADING_TOKEN_ESTIMATE = 4000
+# Pack short text resumes for the same job into one request (GRADER_PACKED=0 disables)
+PACKED_GRADING = os.getenv("GRADER_PACKED", "1") == "1"
+# Input token budget for the resumes in one packed request, and the most resumes per pack
+PACK_TOKEN_BUDGET = int(os.getenv("GRADER_PACK_TOKEN_BUDGET", "12000"))
+PACK_MAX_RESUMES = 10
+# Resumes longer than this (tokens) are always graded on their own
+PACK_MAX_RESUME_TOKENS = 2000
+
+_grader_pool = None
+_limiter = AdaptiveLimiter(GRADER_INITIAL_CONCURRENCY, GRADER_CONCURRENCY)
+# Every 429 lowers the limit as it happens, not only once call_gemini's retries are used up
+on_gemini_rate_limit(_limiter.on_rate_limit)
+_context_caches = JobContextCaches()
+# Candidates whose grading timed out but whose request is still running in the pool;
+# they're skipped when reading the queue until it returns, so no one is graded twice at once
+_straggling = set()
+_straggling_lock = threading.Lock()
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token)."""
+    return len(text) // 4
+
+
+def grading_schema(include_text: bool = False):
+    """Structured output schema for a grade, optionally with the transcribed resume text."""
+    from google.genai import types
+
+    properties = {
+        "score": types.Schema(type=types.Type.INTEGER),
+        "reasoning": types.Schema(type=types.Type.STRING),
+    }
+    required = ["score", "reasoning"]
+    if include_text:
+        properties["resume_text"] = types.Schema(type=types.Type.STRING)
+        required.append("resume_text")
+    return types.Schema(type=types.Type.OBJECT, properties=properties, required=required)
+
+
+def grade_status(score: int) -> str:
+    """Candidate status for a score (PASS_SCORE+ passes to mailer, below = rejected)."""
+    return "GRADED" if score >= PASS_SCORE else "CV_REJECTED"
+
+
+def grade_uploaded_pdf(gemini_client, uploaded_file, job_description: str, include_text: bool = False, job_id=None,
+                       model: str = GRADING_MODEL) -> dict:
+    """
+    Grade a resume PDF already uploaded to the Gemini Files API (optionally transcribing it too).
+    With a job_id, the prompt + job description come from that job's context cache.
+    """
+    from google.genai import types
+
+    # For PDF grading, use the PDF-specific prompt (DB prompt is text-based)
+    prompt = GRADING_PROMPT_PDF.format(job_description=job_description)
+    cache_name = _context_caches.get(gemini_client, job_id, "pdf", model, prompt)
+
+    contents = [uploaded_file] if cache_name else [uploaded_file, prompt]
+    if include_text:
+        contents.append(TRANSCRIBE_INSTRUCTION)
 
-def fetch_ungraded_candidates(supabase):
-    """Fetch candidates with status NEW_APPLICATION."""
+    result = call_gemini(lambda: gemini_client.models.generate_content(
+        model=model,
+        contents=contents,
+        config=types.GenerateContentConfig(
+            cached_content=cache_name,
+            response_mime_type="application/json",
+            response_schema=grading_schema(include_text),
+        ),
+    ), "PDF grading")
+    return json.loads(result.text.strip())
+
+
+def count_ungraded_candidates(supabase) -> int:
+    """Return the number of candidates waiting for the grader (also the ingest backpressure signal)."""
     result = (
         supabase.table("candidates")
-        .select("id, email, full_name, resume_text, resume_url, job_description, metadata")
+        .select("id", count="exact")
         .eq("status", "NEW_APPLICATION")
+        .limit(1)
         .execute()
     )
-    return result.data
+    return result.count or 0
 
 
-def grade_candidate_with_pdf(gemini_client, resume_url: str, job_description: str, cv_prompt: str | None = None) -> dict:
+def fetch_ungraded_pages(supabase, page_size: int = GRADER_PAGE_SIZE):
+    """
+    Yield NEW_APPLICATION candidates in pages, keyset-paginated on id. The per-row
+    job_description copy is not selected; see attach_job_descriptions. Candidates with a
+    timed-out request still running are left out.
+    """
+    last_id = None
+    while True:
+        query = (
+            supabase.table("candidates")
+            .select("id, email, full_name, resume_text, resume_url, job_id, metadata")
+            .eq("status", "NEW_APPLICATION")
+            .order("id")
+            .limit(page_size)
+        )
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        page = query.execute().data or []
+        if not page:
+            return
+        with _straggling_lock:
+            runnable = [c for c in page if c["id"] not in _straggling]
+        if runnable:
+            yield runnable
+        if len(page) < page_size:
+            return
+        last_id = page[-1]["id"]
+
+
+def attach_job_descriptions(supabase, page: list[dict], job_descriptions: dict):
+    """
+    Fill in each candidate's job_description from the cached jobs table, querying `jobs`
+    only for jobs the cache doesn't have yet (job_descriptions is the run's {job_id: description} memo).
+    Candidates without a job_id fall back to their own job_description column.
+    """
+    try:
+        known_jobs = reference_data.jobs.by(supabase, "id")
+    except Exception as e:
+        log("WARN", f"Job cache unavailable, querying job descriptions directly: {e}")
+        known_jobs = {}
+    for job_id in {c.get("job_id") for c in page} - job_descriptions.keys():
+        if job_id in known_jobs:
+            job_descriptions[job_id] = known_jobs[job_id].get("description")
+
+    # Jobs created since the cache last revalidated
+    missing = list({c["job_id"] for c in page if c.get("job_id") is not None and c["job_id"] not in job_descriptions})
+    if missing:
+        result = supabase.table("jobs").select("id, description").in_("id", missing).execute()
+        for job in result.data or []:
+            job_descriptions[job["id"]] = job.get("description")
+
+    orphans = [c["id"] for c in page if c.get("job_id") is None or not job_descriptions.get(c["job_id"])]
+    own = {}
+    if orphans:
+        result = supabase.table("candidates").select("id, job_description").in_("id", orphans).execute()
+        own = {row["id"]: row.get("job_description") for row in result.data or []}
+
+    for candidate in page:
+        description = job_descriptions.get(candidate.get("job_id")) or own.get(candidate["id"])
+        candidate["job_description"] = description or "General software engineering position"
+
+
+def grade_candidate_with_pdf(gemini_client, resume_url: str, job_description: str, cv_prompt: str | None = None, job_id=None,
+                             model: str = GRADING_MODEL) -> dict:
     """Grade by passing the original PDF directly to Gemini for richer analysis."""
-    from google.genai import types
+    pdf_bytes = download_pdf(resume_url)
+    key = grade_cache_key(pdf_bytes, job_description, GRADING_PROMPT_PDF, model)
+    return cached_grade(key, lambda: _grade_pdf_bytes(gemini_client, pdf_bytes, job_description, job_id, model))
+
 
-    # Download the PDF to a temp file
-    response = httpx.get(resume_url)
+def download_pdf(resume_url: str) -> bytes:
+    response = httpx.get(resume_url, timeout=60)
     response.raise_for_status()
+    return response.content
 
+
+def upload_pdf_bytes(gemini_client, pdf_bytes: bytes):
+    """Upload a PDF to the Gemini Files API; the caller deletes it with delete_gemini_file."""
     with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
-        tmp.write(response.content)
+        tmp.write(pdf_bytes)
         tmp_path = tmp.name
 
     try:
-        # Upload to Gemini's file API
-        uploaded_file = gemini_client.files.upload(
+        return call_gemini(lambda: gemini_client.files.upload(
             file=tmp_path,
             config={"mime_type": "application/pdf"},
-        )
+        ), "PDF upload")
+    finally:
+        Path(tmp_path).unlink(missing_ok=True)
 
-        # For PDF grading, use the PDF-specific prompt (DB prompt is text-based)
-        prompt = GRADING_PROMPT_PDF.format(job_description=job_description)
 
-        grading_schema = types.Schema(
-            type=types.Type.OBJECT,
-            properties={
-                "score": types.Schema(type=types.Type.INTEGER),
-                "reasoning": types.Schema(type=types.Type.STRING),
-            },
-            required=["score", "reasoning"],
-        )
+def grade_pdf_tiers(gemini_client, pdf_bytes: bytes, job_description: str, job_id=None,
+                    include_text: bool = False) -> tuple[dict, str]:
+    """
+    Grade a PDF with the first-tier model and re-grade a borderline score with
+    GRADING_MODEL. The PDF is uploaded at most once and shared by both calls, and each
+    model's grade goes through the grade cache. include_text also transcribes the PDF in
+    the first call, which is then not served from the cache. Returns (result, tier).
+    """
+    uploaded_file = None
 
-        result = gemini_client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=[uploaded_file, prompt],
-            config=types.GenerateContentConfig(
-                response_mime_type="application/json",
-                response_schema=grading_schema,
-            ),
-        )
+    def grade(model: str, transcribe: bool, cache_job_id) -> dict:
+        def compute() -> dict:
+            nonlocal uploaded_file
+            if uploaded_file is None:
+                uploaded_file = upload_pdf_bytes(gemini_client, pdf_bytes)
+            return grade_uploaded_pdf(gemini_client, uploaded_file, job_description, include_text=transcribe,
+                                      job_id=cache_job_id, model=model)
 
-        # Cleanup uploaded file from Gemini
-        gemini_client.files.delete(name=uploaded_file.name)
+        if transcribe:
+            return compute()
+        return cached_grade(grade_cache_key(pdf_bytes, job_description, GRADING_PROMPT_PDF, model), compute)
 
-        return json.loads(result.text.strip())
+    try:
+        result = grade(first_tier_model(), include_text, job_id)
+        tier = "fast" if CASCADE_MODEL else "strong"
+        if is_borderline(result.get("score", 0)):
+            log("INFO", f"Borderline score {result.get('score', 0)}, re-grading with {GRADING_MODEL}")
+            throttle_gemini(GRADING_TOKEN_ESTIMATE)
+            strong = grade(GRADING_MODEL, False, None)
+            result, tier = {**strong, "resume_text": result.get("resume_text")} if include_text else strong, "strong"
+        return result, tier
     finally:
-        Path(tmp_path).unlink(missing_ok=True)
+        if uploaded_file is not None:
+            delete_gemini_file(gemini_client, uploaded_file.name)
 
 
-def fetch_cv_scoring_prompt(supabase) -> str:
-    """Fetch the CV scoring prompt from the prompts table, falling back to the hardcoded default."""
+def _grade_pdf_bytes(gemini_client, pdf_bytes: bytes, job_description: str, job_id=None, model: str = GRADING_MODEL) -> dict:
+    # Upload to Gemini's file API once; retries of the grading call reuse the upload
+    uploaded_file = upload_pdf_bytes(gemini_client, pdf_bytes)
+    try:
+        return grade_uploaded_pdf(gemini_client, uploaded_file, job_description, job_id=job_id, model=model)
+    finally:
+        # Cleanup uploaded file from Gemini, whether or not grading succeeded
+        delete_gemini_file(gemini_client, uploaded_file.name)
+
+
+def fetch_cv_scoring_prompt(supabase) -> tuple[str, str]:
+    """
+    Return (CV scoring prompt, version) from the cached prompts table, falling back to
+    the hardcoded default (version "builtin").
+    """
     try:
-        result = supabase.table("prompts").select("system_prompt").eq("name", "cv_scoring").single().execute()
-        if result.data and result.data.get("system_prompt"):
-            return result.data["system_prompt"]
+        prompt, version = reference_data.get_prompt(supabase, "cv_scoring")
+        if prompt:
+            return prompt, version
     except Exception as e:
         log("WARN", f"Failed to fetch cv_scoring prompt from DB, using fallback: {e}")
-    return GRADING_PROMPT_TEXT
+    return GRADING_PROMPT_TEXT, "builtin"
 
 
-def grade_candidate_with_text(gemini_client, resume_text: str, job_description: str, cv_prompt: str | None = None) -> dict:
-    """Fallback: grade using extracted resume text when no PDF URL is available."""
-    from google.genai import types
-
+def build_text_prompt(cv_prompt: str | None, resume_text: str, job_description: str) -> str:
     template = cv_prompt or GRADING_PROMPT_TEXT
-    prompt = template.format(
+    return template.format(
         job_description=job_description,
         resume_text=resume_text,
     )
 
-    grading_schema = types.Schema(
+
+def split_text_prompt(cv_prompt: str | None, job_description: str) -> tuple[str, str] | None:
+    """
+    Split the text grading prompt around {resume_text} into (shared prefix, suffix), both
+    with the job description filled in. None if the template can't be split cleanly.
+    """
+    template = cv_prompt or GRADING_PROMPT_TEXT
+    if template.count("{resume_text}") != 1:
+        return None
+    before, after = template.split("{resume_text}")
+    return before.format(job_description=job_description), after.format(job_description=job_description)
+
+
+def grade_candidate_with_text(gemini_client, resume_text: str, job_description: str, cv_prompt: str | None = None, job_id=None,
+                              model: str = GRADING_MODEL) -> dict:
+    """
+    Fallback: grade using extracted resume text when no PDF URL is available.
+    With a job_id, the part of the prompt before the resume comes from that job's context cache.
+    """
+    from google.genai import types
+
+    prompt = build_text_prompt(cv_prompt, resume_text, job_description)
+
+    def grade():
+        contents, cache_name = prompt, None
+        parts = split_text_prompt(cv_prompt, job_description) if job_id is not None else None
+        if parts:
+            cache_name = _context_caches.get(gemini_client, job_id, "text", model, parts[0])
+            if cache_name:
+                contents = resume_text + parts[1]
+
+        response = call_gemini(lambda: gemini_client.models.generate_content(
+            model=model,
+            contents=contents,
+            config=types.GenerateContentConfig(
+                cached_content=cache_name,
+                response_mime_type="application/json",
+                response_schema=grading_schema(),
+            ),
+        ), "Text grading")
+        return json.loads(response.text.strip())
+
+    key = grade_cache_key(resume_text, job_description, cv_prompt or GRADING_PROMPT_TEXT, model)
+    return cached_grade(key, grade)
+
+
+def packed_grading_schema():
+    """Structured output schema for a packed request: one grade per candidate."""
+    from google.genai import types
+
+    item = types.Schema(
         type=types.Type.OBJECT,
         properties={
+            "candidate_id": types.Schema(type=types.Type.STRING),
             "score": types.Schema(type=types.Type.INTEGER),
             "reasoning": types.Schema(type=types.Type.STRING),
         },
-        required=["score", "reasoning"],
+        required=["candidate_id", "score", "reasoning"],
     )
+    return types.Schema(type=types.Type.ARRAY, items=item)
 
-    response = gemini_client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=prompt,
+
+def validate_packed_grades(candidates: list[dict], items) -> dict | None:
+    """
+    Map a packed response back to candidates: {candidate id: grade}. Returns None unless
+    every candidate got exactly one grade with a 0-100 score and nothing else came back.
+    """
+    expected = {str(c["id"]): c["id"] for c in candidates}
+    if not isinstance(items, list) or len(items) != len(expected):
+        return None
+    grades = {}
+    for item in items:
+        if not isinstance(item, dict):
+            return None
+        key = str(item.get("candidate_id", "")).strip()
+        score = item.get("score")
+        if key not in expected or expected[key] in grades:
+            return None
+        if not isinstance(score, int) or not 0 <= score <= 100:
+            return None
+        grades[expected[key]] = item
+    return grades
+
+
+def grade_candidates_packed(gemini_client, candidates: list[dict], job_description: str, cv_prompt: str | None,
+                            job_id=None, model: str = GRADING_MODEL) -> dict | None:
+    """
+    Grade several text resumes for the same job in one request. The prompt is the usual
+    text prompt with the resumes (each under its own header) in place of {resume_text},
+    so the prefix is shared with the job's context cache. Returns {candidate id: grade},
+    or None if the response doesn't map one-to-one onto the candidates. Validated grades
+    are stored in the grade cache under each candidate's single-request key, so a regrade
+    is served from the cache just like an unpacked one.
+    """
+    from google.genai import types
+
+    prefix, suffix = split_text_prompt(cv_prompt, job_description)
+    resumes = "".join(
+        PACKED_RESUME_HEADER.format(candidate_id=c["id"]) + c["resume_text"].strip() + "\n"
+        for c in candidates
+    )
+    body = resumes + suffix + PACKED_INSTRUCTION.format(count=len(candidates))
+
+    cache_name = _context_caches.get(gemini_client, job_id, "text", model, prefix) if job_id is not None else None
+    response = call_gemini(lambda: gemini_client.models.generate_content(
+        model=model,
+        contents=body if cache_name else prefix + body,
         config=types.GenerateContentConfig(
+            cached_content=cache_name,
             response_mime_type="application/json",
-            response_schema=grading_schema,
+            response_schema=packed_grading_schema(),
         ),
-    )
+    ), "Packed grading")
+    try:
+        items = json.loads(response.text.strip())
+    except (TypeError, ValueError):
+        return None
+    grades = validate_packed_grades(candidates, items)
 
-    return json.loads(response.text.strip())
+    cache = get_grade_cache()
+    if cache and grades:
+        for candidate in candidates:
+            key = grade_cache_key(candidate["resume_text"], job_description, cv_prompt or GRADING_PROMPT_TEXT, model)
+            cache.put(key, grades[candidate["id"]])
+    return grades
+
+
+def first_tier_model() -> str:
+    return CASCADE_MODEL or GRADING_MODEL
+
+
+def is_borderline(score: int) -> bool:
+    """Whether a first-tier score is close enough to PASS_SCORE to need the strong model."""
+    return bool(CASCADE_MODEL) and abs(score - PASS_SCORE) <= CASCADE_BAND
+
+
+def tier_metadata(tier: str) -> dict:
+    """Metadata recording which tier decided a grade: "fast", "strong" or "batch" (Batch API)."""
+    return {"grading_tier": tier, "grading_model": first_tier_model() if tier == "fast" else GRADING_MODEL}
+
+
+def grade_with_model(gemini_client, candidate: dict, cv_prompt: str, model: str, cache_job_id=None) -> dict:
+    """Grade one candidate with the given model, preferring the PDF and falling back to text."""
+    job_description = candidate.get("job_description", "General software engineering position")
+    if candidate.get("resume_url"):
+        return grade_candidate_with_pdf(gemini_client, candidate["resume_url"], job_description, job_id=cache_job_id, model=model)
+    return grade_candidate_with_text(gemini_client, candidate.get("resume_text", ""), job_description, cv_prompt,
+                                     job_id=cache_job_id, model=model)
+
+
+def plan_grading_units(candidates: list[dict], cv_prompt: str | None) -> list[list[dict]]:
+    """
+    Group candidates into units of work: packs of short text resumes for the same job,
+    bounded by PACK_TOKEN_BUDGET and PACK_MAX_RESUMES, and single candidates for the rest
+    (PDFs, long resumes, cached grades). Units for the same job are adjacent.
+    """
+    if not PACKED_GRADING:
+        return [[c] for c in sorted(candidates, key=lambda c: str(c.get("job_id")))]
+
+    cache = get_grade_cache()
+    by_job = {}
+    for candidate in candidates:
+        by_job.setdefault((str(candidate.get("job_id")), candidate["job_description"]), []).append(candidate)
+
+    units = []
+    for (_, job_description), group in sorted(by_job.items(), key=lambda item: item[0][0]):
+        packable = split_text_prompt(cv_prompt, job_description) is not None
+        pack, pack_tokens = [], 0
+        for candidate in group:
+            resume_text = candidate.get("resume_text") or ""
+            tokens = estimate_tokens(resume_text)
+            if (
+                not packable
+                or candidate.get("resume_url")
+                or not resume_text.strip()
+                or tokens > PACK_MAX_RESUME_TOKENS
+                or (cache and cache.get(grade_cache_key(resume_text, job_description, cv_prompt or GRADING_PROMPT_TEXT, first_tier_model())))
+            ):
+                units.append([candidate])
+                continue
+            if pack and (pack_tokens + tokens > PACK_TOKEN_BUDGET or len(pack) >= PACK_MAX_RESUMES):
+                units.append(pack)
+                pack, pack_tokens = [], 0
+            pack.append(candidate)
+            pack_tokens += tokens
+        if pack:
+            units.append(pack)
+    return units
 
 
 def update_candidate_grade(supabase, candidate_id: int, score: int, reasoning: str, existing_metadata: dict):
@@ -138,79 +531,455 @@ def update_candidate_grade(supabase, candidate_id: int, score: int, reasoning: s
     updated_metadata = existing_metadata or {}
     updated_metadata["grading_reasoning"] = reasoning
 
-    # Set status based on score (50+ passes to mailer, below = rejected)
-    status = "GRADED" if score >= 50 else "CV_REJECTED"
+    # Set status based on score (PASS_SCORE+ passes to mailer, below = rejected)
+    status = grade_status(score)
 
     supabase.table("candidates").update({
         "jd_match_score": score,
         "status": status,
         "metadata": updated_metadata
-    }).eq("id", candidate_id).execute()
+    }).eq("id", candidate_id).in_("status", GRADEABLE_STATUSES).execute()
 
 
-def run_grader() -> int:
+class GradeWriter:
     """
-    Main grader function - can be called from other modules.
-    Returns the number of candidates graded.
+    Buffers grades and writes them back in bulk through the apply_candidate_grades RPC,
+    which merges each metadata patch into the row's current metadata server-side.
+    Thread-safe; flushes when GRADE_WRITE_BATCH_SIZE grades are waiting. If the RPC
+    fails (e.g. migration 026 not applied yet) the flush falls back to per-row updates.
+    Once closed, late grades (from requests abandoned on timeout) are dropped; those
+    candidates are still NEW_APPLICATION and get graded again next cycle.
     """
-    log("INFO", "Starting candidate grading...")
 
-    supabase = get_supabase_client()
-    gemini_client = get_gemini_client()
+    def __init__(self, supabase, batch_size: int = GRADE_WRITE_BATCH_SIZE):
+        self.supabase = supabase
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._pending = []
+        self._oldest = None
+        self._closed = False
+        # Merged into every grade's metadata patch (e.g. the prompt version in use)
+        self.metadata = {}
+
+    def add(self, candidate: dict, score: int, reasoning: str, extra_metadata: dict | None = None):
+        patch = {"grading_reasoning": reasoning, **self.metadata, **(extra_metadata or {})}
+        with self._lock:
+            if self._closed:
+                log("WARN", f"Dropping late grade for {candidate.get('email', 'unknown')} — it will be graded again next cycle")
+                return
+            if not self._pending:
+                self._oldest = time.monotonic()
+            self._pending.append((candidate, score, patch))
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush_if_stale(self, max_age: float = GRADE_FLUSH_INTERVAL_SECONDS):
+        with self._lock:
+            stale = self._pending and time.monotonic() - self._oldest >= max_age
+        if stale:
+            self.flush()
+
+    def close(self) -> int:
+        """Write what is buffered and drop any grade added afterwards."""
+        with self._lock:
+            self._closed = True
+        return self.flush()
+
+    def flush(self) -> int:
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return 0
+
+        grades = [
+            {"id": candidate["id"], "score": score, "status": grade_status(score), "metadata": patch}
+            for candidate, score, patch in pending
+        ]
+        try:
+            self.supabase.rpc("apply_candidate_grades", {"grades": grades}).execute()
+            return len(pending)
+        except Exception as e:
+            log("WARN", f"Bulk grade write-back failed ({e}), saving {len(pending)} grade(s) one by one")
 
-    candidates = fetch_ungraded_candidates(supabase)
-    log("INFO", f"Found {len(candidates)} candidate(s) to grade")
+        written = 0
+        for candidate, score, patch in pending:
+            metadata = {**(candidate.get("metadata") or {}), **patch}
+            try:
+                update_candidate_grade(self.supabase, candidate["id"], score, patch["grading_reasoning"], metadata)
+                written += 1
+            except Exception as e:
+                log("ERROR", f"Failed to save grade for {candidate.get('email', 'unknown')}: {e}")
+        return written
 
-    if not candidates:
-        log("INFO", "No candidates to grade")
-        return 0
 
-    # Fetch configurable CV scoring prompt once for the batch
-    cv_prompt = fetch_cv_scoring_prompt(supabase)
+def grade_one(supabase, gemini_client, candidate: dict, cv_prompt: str, on_start=None, cache_job_id=None,
+              writer: GradeWriter | None = None) -> int | None:
+    """
+    Grade a single candidate and save the result. Returns the score, or None if skipped.
+    on_start is called once the limiter admits the request (i.e. when real work begins).
+    cache_job_id enables the job's Gemini context cache for the shared prompt prefix.
+    writer buffers the grade for bulk write-back; without one it is saved immediately.
+    """
+    email = candidate["email"]
+    resume_url = candidate.get("resume_url")
+    resume_text = candidate.get("resume_text", "")
 
-    success, failed = 0, 0
+    if not resume_url and not resume_text:
+        log("WARN", f"No resume for {email}, skipping")
+        return None
 
-    for candidate in candidates:
-        try:
-            email = candidate["email"]
-            resume_url = candidate.get("resume_url")
-            resume_text = candidate.get("resume_text", "")
+    log("INFO", f"Grading {email}...")
+
+    _limiter.acquire()
+    if on_start:
+        on_start()
+    error = None
+    try:
+        throttle_gemini(GRADING_TOKEN_ESTIMATE)
+        # Prefer PDF when available, fall back to text
+        log("INFO", f"Using PDF for {email}" if resume_url else f"No PDF URL, using text for {email}")
+        if resume_url:
+            # Downloaded and uploaded once for both tiers
             job_description = candidate.get("job_description", "General software engineering position")
+            result, tier = grade_pdf_tiers(gemini_client, download_pdf(resume_url), job_description, job_id=cache_job_id)
+        else:
+            result = grade_with_model(gemini_client, candidate, cv_prompt, first_tier_model(), cache_job_id)
+            tier = "fast" if CASCADE_MODEL else "strong"
+
+        if not resume_url and is_borderline(result.get("score", 0)):
+            log("INFO", f"Borderline score {result.get('score', 0)} for {email}, re-grading with {GRADING_MODEL}")
+            throttle_gemini(GRADING_TOKEN_ESTIMATE)
+            result = grade_with_model(gemini_client, candidate, cv_prompt, GRADING_MODEL)
+            tier = "strong"
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        _limiter.release(error)
+
+    score = result.get("score", 0)
+    reasoning = result.get("reasoning", "No reasoning provided")
+    save_grade(supabase, writer, candidate, score, reasoning, tier_metadata(tier))
+
+    log("INFO", f"Graded {email}: {score}/100 ({tier} tier)")
+    return score
+
+
+def save_grade(supabase, writer, candidate: dict, score: int, reasoning: str, extra_metadata: dict):
+    """Buffer the grade on writer, or save it right away when there is none."""
+    if writer:
+        writer.add(candidate, score, reasoning, extra_metadata)
+    else:
+        metadata = {**(candidate.get("metadata") or {}), **extra_metadata}
+        update_candidate_grade(supabase, candidate["id"], score, reasoning, metadata)
+
+
+def escalate_grade(gemini_client, candidate: dict, cv_prompt: str) -> dict:
+    """
+    Re-grade a borderline packed candidate with the strong model (takes its own limiter
+    slot). Packs only hold text resumes, so nothing is downloaded or uploaded here.
+    """
+    _limiter.acquire()
+    error = None
+    try:
+        throttle_gemini(GRADING_TOKEN_ESTIMATE)
+        return grade_with_model(gemini_client, candidate, cv_prompt, GRADING_MODEL)
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        _limiter.release(error)
+
+
+def grade_pack(supabase, gemini_client, candidates: list[dict], cv_prompt: str, on_start=None, cache_job_id=None,
+               writer: GradeWriter | None = None) -> tuple[int, list[dict]]:
+    """
+    Grade a pack of text resumes for one job in a single request and save the grades.
+    Returns (candidates graded, candidates to grade one by one instead): the whole pack
+    when the response doesn't map cleanly onto it. The caller schedules those separately
+    so they get their own timeouts.
+    """
+    job_description = candidates[0]["job_description"]
+    log("INFO", f"Grading {len(candidates)} candidates in one request...")
+
+    _limiter.acquire()
+    if on_start:
+        on_start()
+    error = None
+    try:
+        resumes_tokens = sum(estimate_tokens(c["resume_text"]) for c in candidates)
+        throttle_gemini(GRADING_TOKEN_ESTIMATE + resumes_tokens)
+        grades = grade_candidates_packed(gemini_client, candidates, job_description, cv_prompt, job_id=cache_job_id,
+                                         model=first_tier_model())
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        _limiter.release(error)
+
+    if grades is None:
+        log("WARN", f"Packed response didn't match its {len(candidates)} candidates — grading them one by one")
+        return 0, list(candidates)
 
-            if not resume_url and not resume_text:
-                log("WARN", f"No resume for {email}, skipping")
+    graded = 0
+    for candidate in candidates:
+        grade, tier = grades[candidate["id"]], "fast" if CASCADE_MODEL else "strong"
+        if is_borderline(grade["score"]):
+            log("INFO", f"Borderline score {grade['score']} for {candidate['email']}, re-grading with {GRADING_MODEL}")
+            try:
+                grade, tier = escalate_grade(gemini_client, candidate, cv_prompt), "strong"
+            except Exception as e:
+                log("ERROR", f"Failed to re-grade {candidate['email']}: {e}")
                 continue
+        score = grade.get("score", 0)
+        save_grade(supabase, writer, candidate, score, grade.get("reasoning") or "No reasoning provided", tier_metadata(tier))
+        log("INFO", f"Graded {candidate['email']}: {score}/100 (packed, {tier} tier)")
+        graded += 1
+    return graded, []
+
+
+def record_grading_failures(supabase, failures: list[tuple[dict, str]]) -> int:
+    """
+    Count a failed attempt against each (candidate, error) through the
+    record_grading_failures RPC; candidates reaching GRADING_MAX_ATTEMPTS move to
+    GRADING_FAILED. Returns the number dead-lettered.
+    """
+    if not failures:
+        return 0
+    payload = [{"id": candidate["id"], "error": error} for candidate, error in failures]
+    try:
+        result = supabase.rpc("record_grading_failures", {"failures": payload, "max_attempts": GRADING_MAX_ATTEMPTS}).execute()
+        dead = result.data or 0
+    except Exception as e:
+        log("WARN", f"Bulk failure recording failed ({e}), recording {len(failures)} failure(s) one by one")
+        dead = 0
+        for candidate, error in failures:
+            metadata = dict(candidate.get("metadata") or {})
+            metadata["grading_attempts"] = int(metadata.get("grading_attempts") or 0) + 1
+            metadata["last_grading_error"] = error[:500]
+            update = {"metadata": metadata}
+            if metadata["grading_attempts"] >= GRADING_MAX_ATTEMPTS:
+                update["status"] = "GRADING_FAILED"
+                dead += 1
+            try:
+                supabase.table("candidates").update(update).eq("id", candidate["id"]).eq("status", "NEW_APPLICATION").execute()
+            except Exception as e:
+                log("ERROR", f"Failed to record grading failure for {candidate.get('email', 'unknown')}: {e}")
+
+    if dead:
+        log("ERROR", f"{dead} candidate(s) failed grading {GRADING_MAX_ATTEMPTS} times — moved to GRADING_FAILED")
+    return dead
+
+
+def submit_backlog_batch(supabase, gemini_client, candidates: list[dict], cv_prompt: str) -> list[dict]:
+    """
+    Submit text-only candidates as Gemini batch jobs (graded from text with the
+    cv_scoring prompt). Returns the candidates left for synchronous grading: those with
+    a PDF (graded from the PDF, as grade_one would), without resume text or with a grade
+    already in the grade cache, plus any whose batch chunk failed to submit.
+    """
+    cache = get_grade_cache()
+    prompts = {}
+    remaining = []
+    for candidate in candidates:
+        resume_text = candidate.get("resume_text")
+        job_description = candidate.get("job_description", "General software engineering position")
+        if (
+            not resume_text
+            or candidate.get("resume_url")
+            or (cache and cache.get(grade_cache_key(resume_text, job_description, cv_prompt or GRADING_PROMPT_TEXT, first_tier_model())))
+        ):
+            remaining.append(candidate)
+        else:
+            prompts[candidate["id"]] = build_text_prompt(cv_prompt, resume_text, job_description)
+
+    if not prompts:
+        return candidates
+
+    try:
+        backend = get_batch_backend(gemini_client)
+    except Exception as e:
+        log("ERROR", f"Batch backend unavailable, grading synchronously: {e}")
+        return candidates
 
-            log("INFO", f"Grading {email}...")
+    submitted, unsubmitted = submit_grading_batches(supabase, backend, GRADING_MODEL, prompts, grading_schema())
+    unsubmitted = set(unsubmitted)
+    remaining.extend(c for c in candidates if c["id"] in unsubmitted)
+    log("INFO", f"Backlog of {len(candidates)}: {submitted} sent to batch grading, {len(remaining)} graded now")
+    return remaining
 
-            # Prefer PDF when available, fall back to text
-            if resume_url:
-                log("INFO", f"Using PDF for {email}")
-                result = grade_candidate_with_pdf(gemini_client, resume_url, job_description)
-            else:
-                log("INFO", f"No PDF URL, using text for {email}")
-                result = grade_candidate_with_text(gemini_client, resume_text, job_description, cv_prompt)
 
-            score = result.get("score", 0)
-            reasoning = result.get("reasoning", "No reasoning provided")
+def hold_until_done(future, unit: list[dict]):
+    """Keep the unit's candidates out of the queue until its abandoned request returns."""
+    ids = [candidate["id"] for candidate in unit]
+    with _straggling_lock:
+        _straggling.update(ids)
 
-            update_candidate_grade(
-                supabase,
-                candidate["id"],
-                score,
-                reasoning,
-                candidate.get("metadata", {})
-            )
+    def release(_):
+        with _straggling_lock:
+            _straggling.difference_update(ids)
 
-            log("INFO", f"Graded {email}: {score}/100")
-            success += 1
+    future.add_done_callback(release)
 
-        except Exception as e:
-            log("ERROR", f"Failed to grade {candidate.get('email', 'unknown')}: {e}")
-            failed += 1
 
-    log("INFO", f"Grading complete: {success} succeeded, {failed} failed")
-    return success
+def get_grader_pool() -> ThreadPoolExecutor:
+    global _grader_pool
+    if _grader_pool is None:
+        _grader_pool = ThreadPoolExecutor(max_workers=GRADER_CONCURRENCY, thread_name_prefix="grader")
+    return _grader_pool
+
+
+def run_grader() -> int:
+    """
+    Main grader function - can be called from other modules.
+    Returns the number of candidates graded.
+
+    The queue is read in keyset-paginated pages and each page is streamed into the
+    worker pool as it arrives, so memory stays bounded however deep the backlog is.
+    Candidates are graded concurrently; the in-flight count adapts to Gemini's
+    health (halving on 429/RESOURCE_EXHAUSTED, creeping back up on success), and any
+    candidate still running after GRADER_CANDIDATE_TIMEOUT_SECONDS is abandoned for
+    this cycle so one hung request can't stall the batch. An abandoned request that
+    finishes before the run ends is still saved; after that its grade is dropped and the
+    candidate is graded again once the request has returned, without counting a failed attempt.
+    """
+    log("INFO", "Starting candidate grading...")
+
+    supabase = get_supabase_client()
+    gemini_client = get_gemini_client()
+
+    writer = GradeWriter(supabase)
+
+    # Apply results from any Gemini batch jobs that finished since the last cycle
+    graded_outside_pool = 0
+    try:
+        graded_outside_pool = poll_grading_batches(
+            supabase,
+            get_batch_backend(gemini_client),
+            lambda candidate, score, reasoning: writer.add(candidate, score, reasoning, tier_metadata("batch")),
+            writer.flush,
+        )
+    except Exception as e:
+        log("ERROR", f"Failed to poll grading batches: {e}")
+    # Batch grades are written before anything else so a crash can't strand them
+    writer.flush()
+    try:
+        requeue_stranded_candidates(supabase)
+    except Exception as e:
+        log("ERROR", f"Failed to requeue stranded batch candidates: {e}")
+
+    backlog = count_ungraded_candidates(supabase)
+    log("INFO", f"Found {backlog} candidate(s) to grade")
+
+    if not backlog:
+        writer.flush()
+        log("INFO", "No candidates to grade")
+        return graded_outside_pool
+
+    # Fetch configurable CV scoring prompt once for the batch
+    cv_prompt, prompt_version = fetch_cv_scoring_prompt(supabase)
+    log("INFO", f"Grading with cv_scoring prompt version {prompt_version}")
+    writer.metadata["cv_prompt_version"] = prompt_version
+    # Large backlog: hand text resumes to the Gemini Batch API instead
+    use_batch = backlog >= BATCH_GRADING_MIN_CANDIDATES
+
+    success, failed = 0, 0
+    started_at = {}
+    job_descriptions = {}
+    job_counts = {}
+    # Jobs with several requests waiting share one Gemini context cache
+    cached_jobs = set()
+    futures = {}
+    failures = []
+    pool = get_grader_pool()
+
+    def task(unit):
+        def mark_started():
+            started_at[unit[0]["id"]] = time.monotonic()
+        cache_job_id = unit[0].get("job_id") if unit[0].get("job_id") in cached_jobs else None
+        if len(unit) > 1:
+            return grade_pack(supabase, gemini_client, unit, cv_prompt, on_start=mark_started,
+                              cache_job_id=cache_job_id, writer=writer)
+        score = grade_one(supabase, gemini_client, unit[0], cv_prompt, on_start=mark_started,
+                          cache_job_id=cache_job_id, writer=writer)
+        return (0 if score is None else 1), []
+
+    def describe(unit):
+        email = unit[0].get("email", "unknown")
+        return email if len(unit) == 1 else f"{email} and {len(unit) - 1} other(s)"
+
+    def drain(max_pending: int):
+        """Collect finished grades (and time out hung ones) until at most max_pending remain."""
+        nonlocal success, failed
+        while len(futures) > max_pending:
+            done, _ = wait(set(futures), timeout=5, return_when=FIRST_COMPLETED)
+            for future in done:
+                unit = futures.pop(future)
+                started_at.pop(unit[0]["id"], None)
+                try:
+                    graded, regrade = future.result()
+                    success += graded
+                    # A pack whose response didn't validate: each candidate becomes its own unit
+                    for candidate in regrade:
+                        futures[pool.submit(task, [candidate])] = [candidate]
+                except CircuitOpenError as e:
+                    # Not the candidate's fault: retried once Gemini recovers, without counting an attempt
+                    log("WARN", f"Skipped {describe(unit)}: {e}")
+                    failed += len(unit)
+                except Exception as e:
+                    log("ERROR", f"Failed to grade {describe(unit)}: {e}")
+                    failed += len(unit)
+                    failures.extend((candidate, str(e)) for candidate in unit)
+
+            now = time.monotonic()
+            for future, unit in list(futures.items()):
+                started = started_at.get(unit[0]["id"])
+                if not future.done() and started and now - started > GRADER_CANDIDATE_TIMEOUT_SECONDS:
+                    # Not counted as an attempt: the request may still succeed, and is retried next cycle if not
+                    log("ERROR", f"Grading {describe(unit)} timed out after {GRADER_CANDIDATE_TIMEOUT_SECONDS}s — will retry next cycle")
+                    futures.pop(future)
+                    started_at.pop(unit[0]["id"], None)
+                    failed += len(unit)
+                    hold_until_done(future, unit)
+            writer.flush_if_stale()
+
+    for page in fetch_ungraded_pages(supabase):
+        if not gemini_available():
+            break
+        attach_job_descriptions(supabase, page, job_descriptions)
+
+        # Reject obviously unrelated resumes locally before spending Gemini calls on them
+        page, rejected = prescreen_candidates(page)
+        for candidate, similarity in rejected:
+            writer.add(candidate, 0, prescreen_reasoning(similarity), {"prescreen_similarity": round(similarity, 4)})
+            graded_outside_pool += 1
+
+        if use_batch:
+            page = submit_backlog_batch(supabase, gemini_client, page, cv_prompt)
+
+        # Short text resumes for the same job are packed into shared requests
+        units = plan_grading_units(page, cv_prompt)
+        for unit in units:
+            job_id = unit[0].get("job_id")
+            job_counts[job_id] = job_counts.get(job_id, 0) + 1
+            if job_id is not None and job_counts[job_id] >= CONTEXT_CACHE_MIN_CANDIDATES:
+                cached_jobs.add(job_id)
+
+        # Units come job by job so each job's cache is created once and then reused back to back
+        for unit in units:
+            futures[pool.submit(task, unit)] = unit
+
+        # Don't page further ahead than one page of queued work
+        drain(GRADER_PAGE_SIZE)
+
+    drain(0)
+    writer.close()
+    record_grading_failures(supabase, failures)
+    _context_caches.retain(gemini_client, cached_jobs)
+
+    log("INFO", f"Grading complete: {success} succeeded, {failed} failed (concurrency limit now {_limiter.limit})")
+    return success + graded_outside_pool
 
 
 def main():
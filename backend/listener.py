@@ -3,26 +3,32 @@
 The Commander: Runs the full recruiting pipeline continuously.
 
 This is the main entry point for Railway deployment.
-It runs all scripts in sequence on a loop:
+Each pipeline stage runs as its own worker thread on its own schedule:
 1. Ingest new applications
 2. Grade candidates
 3. Send outreach emails
+4. Remux interview recordings
 
-Then sleeps and repeats.
+A slow stage (e.g. a large recording in the video fixer or a Gemini backlog in the
+grader) no longer delays the others. One supervisor starts the workers, restarts
+any that die, and backs off a stage that keeps failing.
 """
 
+import os
 import sys
 import time
+import signal
+import threading
 from pathlib import Path
 
 # Add read/ directory to path for importing ingest
 sys.path.insert(0, str(Path(__file__).parent.parent / "read"))
 
-from utils import get_supabase_client, get_gmail_service, log
+from utils import get_supabase_client, get_gmail_service, log, log_client_stats, gemini_available
 
 # Import the other modules' run functions
-from grader import run_grader
-from mailer import run_mailer
+from grader import run_grader, count_ungraded_candidates
+from mailer import run_mailer, seconds_until_next_email, shutdown_mailer_pool
 from video_fixer import run_video_fixer
 
 # For ingest, we need to handle the import differently since it's in a different folder
@@ -35,61 +41,160 @@ except ImportError:
         return 0
 
 # --- Configuration ---
-LOOP_INTERVAL_SECONDS = 60  # How often to run the pipeline
-
-
-def run_pipeline_cycle():
+# How often each stage runs (seconds between the end of one run and the start of the next)
+INGEST_INTERVAL_SECONDS = int(os.getenv("INGEST_INTERVAL_SECONDS", "60"))
+GRADER_INTERVAL_SECONDS = int(os.getenv("GRADER_INTERVAL_SECONDS", "60"))
+MAILER_INTERVAL_SECONDS = int(os.getenv("MAILER_INTERVAL_SECONDS", "60"))
+VIDEO_FIXER_INTERVAL_SECONDS = int(os.getenv("VIDEO_FIXER_INTERVAL_SECONDS", "120"))
+# A failing stage backs off exponentially, capped at this many seconds
+MAX_FAILURE_BACKOFF_SECONDS = 15 * 60
+# Backpressure: ingest pauses while more than this many candidates are waiting to be graded
+GRADER_QUEUE_HIGH_WATER = int(os.getenv("GRADER_QUEUE_HIGH_WATER", "300"))
+# How often the supervisor checks that every worker thread is still alive
+SUPERVISOR_CHECK_SECONDS = 30
+# A stage woken early for scheduled work never sleeps less than this
+MIN_WAKE_SECONDS = 5
+
+
+class Stage:
     """
-    Run one complete cycle of the recruiting pipeline.
+    One pipeline stage running in its own thread.
 
-    Order:
-    1. Ingest new applications from email
-    2. Grade new candidates with AI
-    3. Send outreach to graded candidates (Tally form for Dubai, direct invite for others)
+    A stage never overlaps with itself, so a run that takes longer than its interval
+    simply delays that stage's next run. Exceptions are contained to the stage: the
+    next run is pushed back exponentially while failures keep happening.
     """
-    log("INFO", "=" * 50)
-    log("INFO", "Starting pipeline cycle...")
-    log("INFO", "=" * 50)
-
-    # Step 1: Ingest new applications
-    try:
-        ingested = run_ingest()
-        log("INFO", f"Step 1 (Ingest): {ingested} applications ingested")
-    except Exception as e:
-        log("ERROR", f"Step 1 (Ingest) failed: {e}")
-
-    # Step 2: Grade candidates
-    try:
-        graded = run_grader()
-        log("INFO", f"Step 2 (Grader): {graded} candidates graded")
-    except Exception as e:
-        log("ERROR", f"Step 2 (Grader) failed: {e}")
-
-    # Step 3: Send outreach
-    try:
-        dubai, invites, reminders, round_2 = run_mailer()
-        log("INFO", f"Step 3 (Mailer): {dubai} eligibility forms, {invites} invites, {round_2} round 2 invites, {reminders} reminders sent")
-    except Exception as e:
-        log("ERROR", f"Step 3 (Mailer) failed: {e}")
 
-    # Step 4: Remux interview recordings for seekable downloads
+    def __init__(self, name: str, job, interval: int, describe, gate=None, next_wake=None):
+        self.name = name
+        self.job = job
+        self.interval = interval
+        self.describe = describe  # Turns the job's return value into a log message
+        self.gate = gate  # Optional callable returning False to skip a run (backpressure)
+        self.next_wake = next_wake  # Optional callable: seconds until work is next due (None = unknown)
+        self.consecutive_failures = 0
+        self.thread = None
+
+    def next_delay(self) -> float:
+        """Seconds to wait before the next run, including failure backoff."""
+        if not self.consecutive_failures:
+            return self.wake_delay()
+        return min(self.interval * 2 ** self.consecutive_failures, MAX_FAILURE_BACKOFF_SECONDS)
+
+    def wake_delay(self) -> float:
+        """The interval, shortened to when the stage's next scheduled work is due."""
+        if not self.next_wake:
+            return self.interval
+        try:
+            due_in = self.next_wake()
+        except Exception as e:
+            log("WARN", f"[{self.name}] Could not read next due time, sleeping the full interval: {e}")
+            return self.interval
+        if due_in is None:
+            return self.interval
+        return min(self.interval, max(due_in, MIN_WAKE_SECONDS))
+
+    def run_once(self):
+        """Run the stage a single time, logging its outcome."""
+        if self.gate and not self.gate():
+            return
+
+        started = time.monotonic()
+        try:
+            result = self.job()
+            self.consecutive_failures = 0
+            log("INFO", f"[{self.name}] {self.describe(result)} ({time.monotonic() - started:.1f}s)")
+        except Exception as e:
+            self.consecutive_failures += 1
+            log("ERROR", f"[{self.name}] Failed ({self.consecutive_failures} in a row): {e}")
+        finally:
+            log_client_stats(self.name)
+
+    def loop(self, stop_event: threading.Event):
+        """Run the stage until the supervisor asks everything to stop."""
+        log("INFO", f"[{self.name}] Worker started (interval: {self.interval}s)")
+        while not stop_event.is_set():
+            self.run_once()
+            delay = self.next_delay()
+            if self.consecutive_failures:
+                log("INFO", f"[{self.name}] Backing off for {delay:.0f}s")
+            stop_event.wait(delay)
+        log("INFO", f"[{self.name}] Worker stopped")
+
+    def start(self, stop_event: threading.Event):
+        self.thread = threading.Thread(target=self.loop, args=(stop_event,), name=self.name, daemon=True)
+        self.thread.start()
+
+
+def grader_has_capacity() -> bool:
+    """Backpressure gate for ingest: hold off while the grading queue is too deep."""
     try:
-        fixed = run_video_fixer()
-        log("INFO", f"Step 4 (VideoFixer): {fixed} recording(s) remuxed")
+        depth = count_ungraded_candidates(get_supabase_client())
     except Exception as e:
-        log("ERROR", f"Step 4 (VideoFixer) failed: {e}")
-
-    log("INFO", "Pipeline cycle complete!")
+        # Never let the gate itself stall ingestion
+        log("WARN", f"[Ingest] Could not read grader queue depth, ingesting anyway: {e}")
+        return True
+
+    if depth > GRADER_QUEUE_HIGH_WATER:
+        log("INFO", f"[Ingest] Grader queue at {depth} (> {GRADER_QUEUE_HIGH_WATER}) — pausing ingestion this round")
+        return False
+    return True
+
+
+def build_stages() -> list[Stage]:
+    """Define the pipeline stages and their schedules."""
+    return [
+        Stage(
+            "Ingest", run_ingest, INGEST_INTERVAL_SECONDS,
+            lambda ingested: f"{ingested} applications ingested",
+            gate=grader_has_capacity,
+        ),
+        Stage(
+            "Grader", run_grader, GRADER_INTERVAL_SECONDS,
+            lambda graded: f"{graded} candidates graded",
+            gate=gemini_available,
+        ),
+        Stage(
+            "Mailer", run_mailer, MAILER_INTERVAL_SECONDS,
+            lambda counts: "{} eligibility forms, {} invites, {} reminders, {} round 2 invites sent".format(*counts),
+            next_wake=seconds_until_next_email,
+        ),
+        Stage(
+            "VideoFixer", run_video_fixer, VIDEO_FIXER_INTERVAL_SECONDS,
+            lambda fixed: f"{fixed} recording(s) remuxed",
+        ),
+    ]
+
+
+def supervise(stages: list[Stage], stop_event: threading.Event):
+    """Start every stage and restart any worker thread that dies unexpectedly."""
+    for stage in stages:
+        stage.start(stop_event)
+
+    while not stop_event.wait(SUPERVISOR_CHECK_SECONDS):
+        for stage in stages:
+            if not stage.thread.is_alive():
+                log("ERROR", f"[{stage.name}] Worker thread died — restarting")
+                stage.start(stop_event)
+
+    # Emails already handed to Gmail must finish (and be recorded) before the process exits,
+    # or they are sent again after the restart; queued ones are cancelled and go next time
+    shutdown_mailer_pool()
+    for stage in stages:
+        stage.thread.join(timeout=SUPERVISOR_CHECK_SECONDS)
 
 
 def main():
     """
-    Main entry point - runs the pipeline continuously.
+    Main entry point - runs the pipeline stages continuously.
     This is what Railway will execute.
     """
+    stages = build_stages()
+
     log("INFO", "=" * 60)
     log("INFO", "RECRUITING BOT COMMANDER STARTING")
-    log("INFO", f"Loop interval: {LOOP_INTERVAL_SECONDS} seconds")
+    for stage in stages:
+        log("INFO", f"{stage.name} interval: {stage.interval} seconds")
     log("INFO", "=" * 60)
 
     # Test connections on startup
@@ -107,18 +212,18 @@ def main():
         log("ERROR", "Fix the above error and restart.")
         return
 
-    log("INFO", "All connections verified. Starting main loop...")
+    log("INFO", "All connections verified. Starting stage workers...")
 
-    # Main loop
-    while True:
-        try:
-            run_pipeline_cycle()
-        except Exception as e:
-            log("ERROR", f"Pipeline cycle crashed: {e}")
-            log("INFO", "Will retry on next cycle...")
+    # Stop cleanly on Railway redeploys (SIGTERM) as well as Ctrl+C
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+
+    try:
+        supervise(stages, stop_event)
+    except KeyboardInterrupt:
+        stop_event.set()
 
-        log("INFO", f"Sleeping for {LOOP_INTERVAL_SECONDS} seconds...")
-        time.sleep(LOOP_INTERVAL_SECONDS)
+    log("INFO", "Commander stopped")
 
 
 if __name__ == "__main__":
@@ -3,13 +3,19 @@
 Also sends reminder emails to candidates who haven't completed their interview after 3 days."""
 
 import os
+import time
+import random
 import base64
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime, timezone, timedelta
 from email.mime.text import MIMEText
 from urllib.parse import quote
 from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
-from utils import get_supabase_client, get_gmail_service, log
+from utils import get_supabase_client, get_gmail_service, log, throttle_gmail, is_rate_limit_error
+from email_templates import render_template
+import reference_data
+import scheduler
 
 # --- Configuration ---
 COMPANY_NAME = "Printerpix"
@@ -28,6 +34,20 @@ MAX_REMINDERS_PER_RUN = 10
 # Candidate's local business hours window for sending reminders
 REMINDER_LOCAL_START_HOUR = 8   # 8 AM local
 REMINDER_LOCAL_END_HOUR = 18    # 6 PM local
+# Emails sent at once; each worker thread uses its own Gmail service
+MAILER_CONCURRENCY = int(os.getenv("MAILER_CONCURRENCY", "4"))
+# Attempts per email when Gmail answers rateLimitExceeded, with jittered exponential backoff
+MAILER_SEND_ATTEMPTS = 5
+MAILER_RETRY_BASE_SECONDS = 2
+# Confirmed sends written back per candidates update
+STATUS_UPDATE_BATCH_SIZE = 100
+# ...or once the oldest unrecorded send is this old, so a crash can't lose many records
+STATUS_FLUSH_SECONDS = 2
+# Drive invites, Round 2 invites and reminders from the scheduled_actions queue
+# (MAILER_SCHEDULER=0 falls back to scanning candidates every cycle)
+MAILER_SCHEDULER = os.getenv("MAILER_SCHEDULER", "1") == "1"
+
+_mailer_pool = None
 
 # Map location keywords (lowercased) → IANA timezone name
 _LOCATION_TO_TZ: list[tuple[str, str]] = [
@@ -70,6 +90,21 @@ def is_local_business_hours(location: str) -> bool:
         local_now = datetime.now(timezone.utc)
     return REMINDER_LOCAL_START_HOUR <= local_now.hour < REMINDER_LOCAL_END_HOUR
 
+
+def next_business_time(after: datetime, location: str) -> datetime:
+    """The first moment at or after `after` that falls in business hours at the location (UTC)."""
+    try:
+        tz = ZoneInfo(get_timezone_for_location(location))
+    except ZoneInfoNotFoundError:
+        tz = timezone.utc
+    local = after.astimezone(tz)
+    start = local.replace(hour=REMINDER_LOCAL_START_HOUR, minute=0, second=0, microsecond=0)
+    if local.hour >= REMINDER_LOCAL_END_HOUR:
+        start += timedelta(days=1)
+    elif local.hour >= REMINDER_LOCAL_START_HOUR:
+        return after
+    return start.astimezone(timezone.utc)
+
 # Dubai eligibility email (HTML with Tally CTA button)
 DUBAI_EMAIL_SUBJECT = f"Your Application to {COMPANY_NAME}: Let's Explore a Fit"
 
@@ -518,25 +553,28 @@ ROUND2_EMAIL_HTML = """<!DOCTYPE html>
 
 
 def interpolate_template(template: str, vars: dict) -> str:
-    """Replace {variable} placeholders in a template string. Safer than str.format()."""
+    """Replace {variable} placeholders in a template string. Safer than str.format().
+    Reference implementation; emails are rendered with email_templates.render_template."""
     result = template
     for key, value in vars.items():
         result = result.replace(f'{{{key}}}', str(value))
     return result
 
 
+EMAIL_TEMPLATE_NAMES = ["email_round1_invite", "email_round2_invite", "email_reminder", "email_dubai_form"]
+
+
 def fetch_email_templates(supabase) -> dict:
-    """Fetch email HTML templates from the prompts table. Returns empty dict on failure."""
+    """Fetch email HTML templates from the cached prompts table and log the version of each
+    one this run uses. Returns empty dict on failure."""
     try:
-        result = (
-            supabase.table("prompts")
-            .select("name, system_prompt")
-            .in_("name", ["email_round1_invite", "email_round2_invite", "email_reminder", "email_dubai_form"])
-            .execute()
-        )
-        templates = {}
-        for row in (result.data or []):
-            templates[row["name"]] = row["system_prompt"]
+        templates, versions = {}, []
+        for name in EMAIL_TEMPLATE_NAMES:
+            template, version = reference_data.get_prompt(supabase, name)
+            if template:
+                templates[name] = template
+            versions.append(f"{name}@{version or 'builtin'}")
+        log("INFO", f"Email templates: {', '.join(versions)}")
         return templates
     except Exception as e:
         log("WARN", f"Failed to fetch email templates from DB, using hardcoded fallbacks: {e}")
@@ -579,43 +617,138 @@ def create_email(to_email: str, subject: str, body: str, html: bool = False) ->
     return {"raw": raw_message}
 
 
-def send_dubai_questionnaire(gmail_service, email: str, full_name: str, interview_token: str, role_title: str = "Open Position", template: str = ""):
-    """Send the Dubai eligibility form email with Tally CTA button."""
+def build_dubai_questionnaire(email: str, full_name: str, interview_token: str, role_title: str = "Open Position", template: str = "") -> dict:
+    """Build the Dubai eligibility form email with Tally CTA button."""
     encoded_name = quote(full_name)
     first_name = full_name.split()[0] if full_name else "there"
     tally_url = f"https://tally.so/r/{TALLY_FORM_ID}?interview_token={interview_token}&candidate_name={encoded_name}"
     html_template = template or DUBAI_EMAIL_HTML
-    body = interpolate_template(html_template, {
+    body = render_template(html_template, {
         "first_name": first_name,
         "role_title": role_title,
         "company_name": COMPANY_NAME,
         "tally_url": tally_url,
-    })
-    message = create_email(email, DUBAI_EMAIL_SUBJECT, body, html=True)
-    gmail_service.users().messages().send(userId="me", body=message).execute()
+    }, required=("tally_url",), name="email_dubai_form")
+    return create_email(email, DUBAI_EMAIL_SUBJECT, body, html=True)
 
 
-def send_interview_invite(gmail_service, email: str, full_name: str, interview_token: str, job_title: str = "Open Position", template: str = ""):
-    """Send direct interview invite with secure token link."""
+def build_interview_invite(email: str, full_name: str, interview_token: str, job_title: str = "Open Position", template: str = "") -> dict:
+    """Build direct interview invite with secure token link."""
     first_name = full_name.split()[0] if full_name else "there"
     interview_link = f"{INTERVIEW_BASE_URL}/{interview_token}"
     html_template = template or INVITE_EMAIL_HTML
-    body = interpolate_template(html_template, {
+    body = render_template(html_template, {
         "first_name": first_name,
         "interview_link": interview_link,
         "company_name": COMPANY_NAME,
-    })
+    }, required=("interview_link",), name="email_round1_invite")
     subject = INVITE_EMAIL_SUBJECT_TEMPLATE.format(job_title=job_title, company_name=COMPANY_NAME)
-    message = create_email(email, subject, body, html=True)
-    gmail_service.users().messages().send(userId="me", body=message).execute()
+    return create_email(email, subject, body, html=True)
 
 
 def update_candidate_status(supabase, candidate_id: int, status: str):
     """Update candidate status. Also sets invite_sent_at when sending invites."""
+    update_candidates_status(supabase, [candidate_id], status)
+
+
+def update_candidates_status(supabase, candidate_ids: list[int], status: str):
+    """Set the same status on many candidates (plus invite_sent_at for invites), one query per chunk."""
     update_data = {"status": status}
     if status in ("INVITE_SENT", "ROUND_2_INVITED"):
         update_data["invite_sent_at"] = datetime.now(timezone.utc).isoformat()
-    supabase.table("candidates").update(update_data).eq("id", candidate_id).execute()
+    for i in range(0, len(candidate_ids), STATUS_UPDATE_BATCH_SIZE):
+        supabase.table("candidates").update(update_data).in_("id", candidate_ids[i:i + STATUS_UPDATE_BATCH_SIZE]).execute()
+
+
+def mark_reminders_sent(supabase, candidate_ids: list[int]):
+    now = datetime.now(timezone.utc).isoformat()
+    for i in range(0, len(candidate_ids), STATUS_UPDATE_BATCH_SIZE):
+        (
+            supabase.table("candidates")
+            .update({"reminder_sent_at": now})
+            .in_("id", candidate_ids[i:i + STATUS_UPDATE_BATCH_SIZE])
+            .execute()
+        )
+
+
+# --- Sending ---
+def get_mailer_pool() -> ThreadPoolExecutor:
+    global _mailer_pool
+    if _mailer_pool is None:
+        _mailer_pool = ThreadPoolExecutor(max_workers=MAILER_CONCURRENCY, thread_name_prefix="mailer")
+    return _mailer_pool
+
+
+def shutdown_mailer_pool():
+    """Stop taking new sends, cancel queued ones and wait for those already in flight."""
+    if _mailer_pool is not None:
+        _mailer_pool.shutdown(wait=True, cancel_futures=True)
+
+
+def send_gmail_message(message: dict):
+    """
+    Send one message through the calling thread's Gmail service, within the per-user
+    send rate and quota. Gmail rejects rate-limited sends outright, so those (and only
+    those) are retried with backoff — never an ambiguous failure that may have sent.
+    """
+    gmail_service = get_gmail_service()
+    for attempt in range(1, MAILER_SEND_ATTEMPTS + 1):
+        throttle_gmail("messages.send")
+        try:
+            return gmail_service.users().messages().send(userId="me", body=message).execute()
+        except Exception as e:
+            if not is_rate_limit_error(e) or attempt == MAILER_SEND_ATTEMPTS:
+                raise
+            delay = random.uniform(0.5, 1) * MAILER_RETRY_BASE_SECONDS * 2 ** (attempt - 1)
+            log("WARN", f"Gmail send rate limited (attempt {attempt}/{MAILER_SEND_ATTEMPTS}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def send_messages(outgoing: list[tuple[dict, dict]], on_sent, label: str) -> tuple[int, int]:
+    """
+    Send (candidate, message) pairs on the mailer pool. Confirmed sends are handed to
+    on_sent(candidate_ids) as they complete, in batches of up to STATUS_UPDATE_BATCH_SIZE
+    and at most STATUS_FLUSH_SECONDS apart. Returns (sent, failed).
+    """
+    if not outgoing:
+        return 0, 0
+
+    pool = get_mailer_pool()
+    futures = {pool.submit(send_gmail_message, message): candidate for candidate, message in outgoing}
+    sent, failed, confirmed, oldest = 0, 0, [], None
+
+    def flush():
+        nonlocal confirmed
+        if not confirmed:
+            return
+        try:
+            on_sent(confirmed)
+        except Exception as e:
+            log("ERROR", f"Sent {len(confirmed)} {label}(s) but failed to record it: {e}")
+        confirmed = []
+
+    pending = set(futures)
+    while pending:
+        # Wake up when the oldest unrecorded send is due to be flushed, even if nothing completes
+        timeout = max(0.0, STATUS_FLUSH_SECONDS - (time.monotonic() - oldest)) if confirmed else None
+        done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            candidate = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                log("ERROR", f"Failed to send {label} to {candidate.get('email', 'unknown')}: {e}")
+                failed += 1
+                continue
+            log("SUCCESS", f"{label[0].upper()}{label[1:]} sent to {candidate['email']}")
+            if not confirmed:
+                oldest = time.monotonic()
+            confirmed.append(candidate["id"])
+            sent += 1
+        if confirmed and (len(confirmed) >= STATUS_UPDATE_BATCH_SIZE or time.monotonic() - oldest >= STATUS_FLUSH_SECONDS):
+            flush()
+    flush()
+    return sent, failed
 
 
 def fetch_form_completed_candidates(supabase):
@@ -632,57 +765,35 @@ def fetch_form_completed_candidates(supabase):
 
 def fetch_candidates_needing_reminder(supabase):
     """Fetch candidates who need a reminder: INVITE_SENT or ROUND_2_INVITED, job active,
-    invite sent 24+ hours ago, and last reminder was 5+ hours ago (or never sent)."""
-    result = (
-        supabase.table("candidates")
-        .select("id, email, full_name, interview_token, status, invite_sent_at, reminder_sent_at, current_stage, job_id, jobs(is_active, location)")
-        .in_("status", ["INVITE_SENT", "ROUND_2_INVITED"])
-        .not_.is_("invite_sent_at", "null")
-        .not_.is_("created_at", "null")
-        .execute()
-    )
-    now = datetime.now(timezone.utc)
-    eligible = []
-    for c in result.data:
-        job = c.get("jobs")
-        if not job or not job.get("is_active"):
-            continue
-
-        # Must be at least REMINDER_START_HOURS since invite was sent
-        invite_sent_at = c.get("invite_sent_at")
-        if not invite_sent_at:
-            continue
-        invite_dt = datetime.fromisoformat(invite_sent_at.replace("Z", "+00:00"))
-        if (now - invite_dt).total_seconds() / 3600 < REMINDER_START_HOURS:
-            continue
-
-        # Must be at least REMINDER_MIN_GAP_HOURS since last reminder
-        reminder_sent_at = c.get("reminder_sent_at")
-        if reminder_sent_at:
-            last_reminder_dt = datetime.fromisoformat(reminder_sent_at.replace("Z", "+00:00"))
-            if (now - last_reminder_dt).total_seconds() / 3600 < REMINDER_MIN_GAP_HOURS:
-                continue
-
-        eligible.append(c)
-    return eligible
-
-
-def send_reminder_email(gmail_service, email: str, full_name: str, interview_link: str, is_round_2: bool = False, template: str = ""):
-    """Send a reminder email to a candidate who hasn't completed their interview."""
+    invite sent 24+ hours ago, last reminder 5+ hours ago (or never sent), and currently
+    within business hours where the job is. Evaluated by the fetch_reminder_candidates
+    RPC; returns at most MAX_REMINDERS_PER_RUN rows, longest-waiting first."""
+    result = supabase.rpc("fetch_reminder_candidates", {
+        "start_hours": REMINDER_START_HOURS,
+        "min_gap_hours": REMINDER_MIN_GAP_HOURS,
+        "max_rows": MAX_REMINDERS_PER_RUN,
+        "location_timezones": [list(pair) for pair in _LOCATION_TO_TZ],
+        "local_start_hour": REMINDER_LOCAL_START_HOUR,
+        "local_end_hour": REMINDER_LOCAL_END_HOUR,
+    }).execute()
+    return result.data or []
+
+
+def build_reminder_email(email: str, full_name: str, interview_link: str, is_round_2: bool = False, template: str = "") -> dict:
+    """Build a reminder email to a candidate who hasn't completed their interview."""
     first_name = full_name.split()[0] if full_name else "there"
     duration = "30&ndash;40 minutes" if is_round_2 else "15&ndash;20 minutes"
     html_template = template or REMINDER_EMAIL_HTML
-    body = interpolate_template(html_template, {
+    body = render_template(html_template, {
         "first_name": first_name,
         "interview_link": interview_link,
         "duration": duration,
         "company_name": COMPANY_NAME,
-    })
-    message = create_email(email, REMINDER_EMAIL_SUBJECT, body, html=True)
-    gmail_service.users().messages().send(userId="me", body=message).execute()
+    }, required=("interview_link",), name="email_reminder")
+    return create_email(email, REMINDER_EMAIL_SUBJECT, body, html=True)
 
 
-def run_reminders(supabase, gmail_service, template: str = "") -> int:
+def run_reminders(supabase, template: str = "") -> int:
     """Send reminder emails twice daily (morning + afternoon) within the candidate's local
     business hours. Returns the number of reminders sent this run."""
     candidates = fetch_candidates_needing_reminder(supabase)
@@ -691,29 +802,22 @@ def run_reminders(supabase, gmail_service, template: str = "") -> int:
         return 0
 
     log("INFO", f"Found {len(candidates)} candidate(s) eligible for reminders (cap: {MAX_REMINDERS_PER_RUN}/run)")
-    sent = 0
+    outgoing = []
 
     for candidate in candidates:
-        if sent >= MAX_REMINDERS_PER_RUN:
-            log("INFO", f"Reminder cap reached ({MAX_REMINDERS_PER_RUN}/run) — deferring remaining to next run")
-            break
         try:
             email = candidate["email"]
             full_name = candidate.get("full_name", "Candidate")
             interview_token = candidate.get("interview_token")
-            candidate_id = candidate["id"]
             status = candidate.get("status", "")
 
             if not interview_token:
                 log("WARN", f"No interview_token for {email}, skipping reminder")
                 continue
 
-            # Only send if it's currently business hours in the candidate's location
+            # Business hours in the candidate's location were already checked by the query
             job = candidate.get("jobs") or {}
             location = job.get("location") or ""
-            if not is_local_business_hours(location):
-                log("INFO", f"Skipping reminder for {email} — outside business hours in '{location or 'unknown'}'")
-                continue
 
             interview_link = (
                 f"{ROUND2_BASE_URL}/{interview_token}"
@@ -723,18 +827,12 @@ def run_reminders(supabase, gmail_service, template: str = "") -> int:
             is_round_2 = status == "ROUND_2_INVITED"
 
             log("INFO", f"Sending reminder to {email} (status: {status}, location: {location or 'unknown'})")
-            send_reminder_email(gmail_service, email, full_name, interview_link, is_round_2=is_round_2, template=template)
-
-            supabase.table("candidates").update({
-                "reminder_sent_at": datetime.now(timezone.utc).isoformat()
-            }).eq("id", candidate_id).execute()
-
-            log("SUCCESS", f"Reminder sent to {email}")
-            sent += 1
+            outgoing.append((candidate, build_reminder_email(email, full_name, interview_link, is_round_2=is_round_2, template=template)))
 
         except Exception as e:
             log("ERROR", f"Failed to send reminder to {candidate.get('email', 'unknown')}: {e}")
 
+    sent, _ = send_messages(outgoing, lambda ids: mark_reminders_sent(supabase, ids), "reminder")
     return sent
 
 
@@ -753,23 +851,22 @@ def fetch_round_2_approved_candidates(supabase):
     return result.data
 
 
-def send_round_2_invite(gmail_service, email: str, full_name: str, interview_token: str, job_title: str, template: str = ""):
-    """Send Round 2 technical interview invite email."""
+def build_round_2_invite(email: str, full_name: str, interview_token: str, job_title: str, template: str = "") -> dict:
+    """Build Round 2 technical interview invite email."""
     first_name = full_name.split()[0] if full_name else "there"
     round2_link = f"{ROUND2_BASE_URL}/{interview_token}"
     subject = ROUND2_EMAIL_SUBJECT.format(job_title=job_title)
     html_template = template or ROUND2_EMAIL_HTML
-    body = interpolate_template(html_template, {
+    body = render_template(html_template, {
         "first_name": first_name,
         "round2_link": round2_link,
         "job_title": job_title,
         "company_name": COMPANY_NAME,
-    })
-    message = create_email(email, subject, body, html=True)
-    gmail_service.users().messages().send(userId="me", body=message).execute()
+    }, required=("round2_link",), name="email_round2_invite")
+    return create_email(email, subject, body, html=True)
 
 
-def run_round_2_invites(supabase, gmail_service, template: str = "") -> int:
+def run_round_2_invites(supabase, template: str = "") -> int:
     """Send Round 2 invite emails to candidates whose scheduled time has arrived.
     Returns the number of invites sent."""
     candidates = fetch_round_2_approved_candidates(supabase)
@@ -778,14 +875,13 @@ def run_round_2_invites(supabase, gmail_service, template: str = "") -> int:
         return 0
 
     log("INFO", f"Found {len(candidates)} Round 2 invite(s) ready to send")
-    sent = 0
+    outgoing = []
 
     for candidate in candidates:
         try:
             email = candidate["email"]
             full_name = candidate.get("full_name", "Candidate")
             interview_token = candidate.get("interview_token")
-            candidate_id = candidate["id"]
 
             if not interview_token:
                 log("WARN", f"No interview_token for {email}, skipping Round 2 invite")
@@ -796,17 +892,176 @@ def run_round_2_invites(supabase, gmail_service, template: str = "") -> int:
             job_title = job.get("title", "Open Position") if job else "Open Position"
 
             log("INFO", f"Sending Round 2 invite to {email} (job: {job_title})")
-            send_round_2_invite(gmail_service, email, full_name, interview_token, job_title, template=template)
-            update_candidate_status(supabase, candidate_id, "ROUND_2_INVITED")
-            log("SUCCESS", f"Round 2 invite sent to {email}")
-            sent += 1
+            outgoing.append((candidate, build_round_2_invite(email, full_name, interview_token, job_title, template=template)))
 
         except Exception as e:
             log("ERROR", f"Failed to send Round 2 invite to {candidate.get('email', 'unknown')}: {e}")
 
+    sent, _ = send_messages(outgoing, lambda ids: update_candidates_status(supabase, ids, "ROUND_2_INVITED"), "Round 2 invite")
     return sent
 
 
+# --- Scheduled sending ---
+def fetch_action_candidates(supabase, actions: list[dict]) -> dict:
+    """Current candidate rows for a set of scheduled actions, by candidate id."""
+    ids = list({action["candidate_id"] for action in actions})
+    rows = {}
+    for i in range(0, len(ids), STATUS_UPDATE_BATCH_SIZE):
+        result = (
+            supabase.table("candidates")
+            .select("id, email, full_name, status, jd_match_score, interview_token, created_at, invite_sent_at, "
+                    "round_2_invite_after, job_id, jobs(title, location, is_active)")
+            .in_("id", ids[i:i + STATUS_UPDATE_BATCH_SIZE])
+            .execute()
+        )
+        rows.update((row["id"], row) for row in result.data or [])
+    return rows
+
+
+def action_still_valid(action: dict, candidate: dict | None) -> bool:
+    """
+    Whether the candidate is still in the state the action was scheduled for.
+    Must match the eligibility in reconcile_scheduled_actions (migration 030), or cancelled
+    actions are enqueued again by the next sweep.
+    """
+    if not candidate or not candidate.get("interview_token"):
+        return False
+    status = candidate.get("status")
+    if action["action"] == scheduler.ACTION_INVITE:
+        if status == "FORM_COMPLETED":
+            return True
+        return (
+            status == "GRADED"
+            and (candidate.get("jd_match_score") or 0) >= MIN_SCORE
+            and candidate.get("created_at") is not None
+        )
+    if action["action"] == scheduler.ACTION_ROUND_2_INVITE:
+        return status == "ROUND_2_APPROVED" and candidate.get("round_2_invite_after") is not None
+    if action["action"] == scheduler.ACTION_REMINDER:
+        return (
+            status in ("INVITE_SENT", "ROUND_2_INVITED")
+            and candidate.get("invite_sent_at") is not None
+            and bool((candidate.get("jobs") or {}).get("is_active"))
+        )
+    return False
+
+
+def schedule_reminders(supabase, candidates: list[dict], after_hours: int):
+    """Enqueue each candidate's next reminder after_hours from now, moved into their local business hours."""
+    base = datetime.now(timezone.utc) + timedelta(hours=after_hours)
+    scheduler.schedule(supabase, [
+        (c["id"], scheduler.ACTION_REMINDER, next_business_time(base, (c.get("jobs") or {}).get("location") or ""))
+        for c in candidates
+    ])
+
+
+def build_scheduled_message(action: dict, candidate: dict, templates: dict) -> dict:
+    email = candidate["email"]
+    full_name = candidate.get("full_name") or "Candidate"
+    token = candidate["interview_token"]
+    job = candidate.get("jobs") or {}
+    job_title = job.get("title") or "Open Position"
+    if action["action"] == scheduler.ACTION_INVITE:
+        return build_interview_invite(email, full_name, token, job_title=job_title, template=templates.get("email_round1_invite", ""))
+    if action["action"] == scheduler.ACTION_ROUND_2_INVITE:
+        return build_round_2_invite(email, full_name, token, job_title, template=templates.get("email_round2_invite", ""))
+    is_round_2 = candidate.get("status") == "ROUND_2_INVITED"
+    link = f"{ROUND2_BASE_URL}/{token}" if is_round_2 else f"{INTERVIEW_BASE_URL}/{token}"
+    return build_reminder_email(email, full_name, link, is_round_2=is_round_2, template=templates.get("email_reminder", ""))
+
+
+def on_scheduled_sent(supabase, kind: str, actions: list[dict], candidates: list[dict]):
+    """Record confirmed sends: close their actions first (so nothing is re-sent), then update candidates."""
+    scheduler.complete(supabase, [a["id"] for a in actions])
+    ids = [c["id"] for c in candidates]
+    if kind == scheduler.ACTION_INVITE:
+        update_candidates_status(supabase, ids, "INVITE_SENT")
+        schedule_reminders(supabase, candidates, REMINDER_START_HOURS)
+    elif kind == scheduler.ACTION_ROUND_2_INVITE:
+        update_candidates_status(supabase, ids, "ROUND_2_INVITED")
+        schedule_reminders(supabase, candidates, REMINDER_START_HOURS)
+    else:
+        mark_reminders_sent(supabase, ids)
+        schedule_reminders(supabase, candidates, REMINDER_MIN_GAP_HOURS)
+
+
+def run_scheduled_actions(supabase, templates: dict) -> tuple[int, int, int]:
+    """
+    Send everything in the scheduled_actions queue that has come due.
+    Returns (interview_invites_sent, reminders_sent, round_2_invites_sent).
+    """
+    try:
+        scheduler.reconcile(supabase, MIN_SCORE, INVITE_DELAY_HOURS, REMINDER_START_HOURS, REMINDER_MIN_GAP_HOURS)
+    except Exception as e:
+        log("ERROR", f"Scheduled action reconcile failed: {e}")
+
+    due = scheduler.fetch_due(supabase)
+    if not due:
+        log("INFO", "No scheduled emails due")
+        return 0, 0, 0
+
+    candidates = fetch_action_candidates(supabase, due)
+    now = datetime.now(timezone.utc)
+    by_kind, cancelled, reminders = {}, [], 0
+    for action in due:
+        candidate = candidates.get(action["candidate_id"])
+        if not action_still_valid(action, candidate):
+            cancelled.append(action["id"])
+            continue
+        if action["action"] == scheduler.ACTION_REMINDER:
+            location = (candidate.get("jobs") or {}).get("location") or ""
+            # Reconciled reminders aren't business-hours adjusted yet; cap the rest per run
+            if not is_local_business_hours(location) or reminders >= MAX_REMINDERS_PER_RUN:
+                scheduler.postpone(supabase, action, next_business_time(now + timedelta(minutes=1), location))
+                continue
+            reminders += 1
+        by_kind.setdefault(action["action"], []).append((action, candidate))
+
+    if cancelled:
+        log("INFO", f"Cancelling {len(cancelled)} scheduled email(s) for candidates that moved on")
+        scheduler.complete(supabase, cancelled, status="CANCELLED")
+
+    labels = {
+        scheduler.ACTION_INVITE: "interview invite",
+        scheduler.ACTION_ROUND_2_INVITE: "Round 2 invite",
+        scheduler.ACTION_REMINDER: "reminder",
+    }
+    sent_counts = {}
+    for kind, items in by_kind.items():
+        log("INFO", f"{len(items)} scheduled {labels[kind]}(s) due")
+        action_for = {candidate["id"]: action for action, candidate in items}
+        candidate_for = {candidate["id"]: candidate for _, candidate in items}
+        outgoing = []
+        for action, candidate in items:
+            try:
+                outgoing.append((candidate, build_scheduled_message(action, candidate, templates)))
+            except Exception as e:
+                log("ERROR", f"Failed to build {labels[kind]} for {candidate.get('email', 'unknown')}: {e}")
+
+        confirmed = set()
+
+        def on_sent(ids, kind=kind, action_for=action_for, candidate_for=candidate_for, confirmed=confirmed):
+            confirmed.update(ids)
+            on_scheduled_sent(supabase, kind, [action_for[i] for i in ids], [candidate_for[i] for i in ids])
+
+        sent, _ = send_messages(outgoing, on_sent, labels[kind])
+        sent_counts[kind] = sent
+        scheduler.retry_later(supabase, [action for cid, action in action_for.items() if cid not in confirmed])
+
+    return (
+        sent_counts.get(scheduler.ACTION_INVITE, 0),
+        sent_counts.get(scheduler.ACTION_REMINDER, 0),
+        sent_counts.get(scheduler.ACTION_ROUND_2_INVITE, 0),
+    )
+
+
+def seconds_until_next_email() -> float | None:
+    """Seconds until the next scheduled email is due, for the listener's sleep (None = unknown)."""
+    if not MAILER_SCHEDULER:
+        return None
+    return scheduler.seconds_until_next_due(get_supabase_client())
+
+
 def run_mailer() -> tuple[int, int, int, int]:
     """
     Main mailer function - can be called from other modules.
@@ -815,7 +1070,6 @@ def run_mailer() -> tuple[int, int, int, int]:
     log("INFO", "Starting outreach to top candidates...")
 
     supabase = get_supabase_client()
-    gmail_service = get_gmail_service()
 
     # Fetch email templates from DB (fallback to hardcoded if unavailable)
     templates = fetch_email_templates(supabase)
@@ -824,7 +1078,14 @@ def run_mailer() -> tuple[int, int, int, int]:
     tmpl_reminder = templates.get("email_reminder", "")
     # tmpl_dubai = templates.get("email_dubai_form", "")  # Eligibility form disabled
 
+    if MAILER_SCHEDULER:
+        invites_sent, reminders_sent, round_2_sent = run_scheduled_actions(supabase, templates)
+        log("INFO", f"Outreach complete: {invites_sent} interview invites, {round_2_sent} round 2 invites, {reminders_sent} reminders")
+        return (0, invites_sent, reminders_sent, round_2_sent)
+
     dubai_sent, invites_sent, failed = 0, 0, 0
+    # Interview invites from phases 1 and 2, sent together once both are built
+    invites = []
 
     # --- Phase 1: Send interview invites to candidates who previously passed the Tally form ---
     # (Eligibility form is now disabled for new candidates; this drains any existing FORM_COMPLETED queue)
@@ -837,7 +1098,6 @@ def run_mailer() -> tuple[int, int, int, int]:
             email = candidate["email"]
             full_name = candidate.get("full_name", "Candidate")
             interview_token = candidate.get("interview_token")
-            candidate_id = candidate["id"]
 
             if not interview_token:
                 log("WARN", f"No interview_token for {email}, skipping")
@@ -847,10 +1107,7 @@ def run_mailer() -> tuple[int, int, int, int]:
             dubai_job = candidate.get("jobs") or {}
             dubai_job_title = dubai_job.get("title", "Open Position") if isinstance(dubai_job, dict) else "Open Position"
             log("INFO", f"Sending interview invite to eligible Dubai candidate {email}")
-            send_interview_invite(gmail_service, email, full_name, interview_token, job_title=dubai_job_title, template=tmpl_invite)
-            update_candidate_status(supabase, candidate_id, "INVITE_SENT")
-            log("SUCCESS", f"Interview invite sent to {email}")
-            invites_sent += 1
+            invites.append((candidate, build_interview_invite(email, full_name, interview_token, job_title=dubai_job_title, template=tmpl_invite)))
 
         except Exception as e:
             log("ERROR", f"Failed to process {candidate.get('email', 'unknown')}: {e}")
@@ -866,7 +1123,6 @@ def run_mailer() -> tuple[int, int, int, int]:
             full_name = candidate.get("full_name", "Candidate")
             score = candidate.get("jd_match_score", 0)
             interview_token = candidate.get("interview_token")
-            candidate_id = candidate["id"]
 
             if not interview_token:
                 log("WARN", f"No interview_token for {email}, skipping")
@@ -881,33 +1137,32 @@ def run_mailer() -> tuple[int, int, int, int]:
             #     job = candidate.get("jobs")
             #     job_title = job.get("title", "Open Position") if job else "Open Position"
             #     log("INFO", f"Dubai role detected for {email} (score: {score})")
-            #     send_dubai_questionnaire(gmail_service, email, full_name, interview_token, job_title, template=tmpl_dubai)
-            #     update_candidate_status(supabase, candidate_id, "QUESTIONNAIRE_SENT")
-            #     log("SUCCESS", f"Dubai eligibility form sent to {email}")
-            #     dubai_sent += 1
+            #     questionnaires.append((candidate, build_dubai_questionnaire(email, full_name, interview_token, job_title, template=tmpl_dubai)))
             # else:
             job = candidate.get("jobs") or {}
             job_title = job.get("title", "Open Position") if isinstance(job, dict) else "Open Position"
             log("INFO", f"Sending interview invite to {email} (score: {score})")
-            send_interview_invite(gmail_service, email, full_name, interview_token, job_title=job_title, template=tmpl_invite)
-            update_candidate_status(supabase, candidate_id, "INVITE_SENT")
-            log("SUCCESS", f"Interview invite sent to {email}")
-            invites_sent += 1
+            invites.append((candidate, build_interview_invite(email, full_name, interview_token, job_title=job_title, template=tmpl_invite)))
 
         except Exception as e:
             log("ERROR", f"Failed to process {candidate.get('email', 'unknown')}: {e}")
             failed += 1
 
+    # Questionnaires would go out the same way, recorded as QUESTIONNAIRE_SENT
+    sent, send_failed = send_messages(invites, lambda ids: update_candidates_status(supabase, ids, "INVITE_SENT"), "interview invite")
+    invites_sent += sent
+    failed += send_failed
+
     # --- Phase 3: Send delayed Round 2 invites (scheduled after "human review" period) ---
     try:
-        round_2_sent = run_round_2_invites(supabase, gmail_service, template=tmpl_round2)
+        round_2_sent = run_round_2_invites(supabase, template=tmpl_round2)
     except Exception as e:
         log("ERROR", f"Round 2 invite phase failed: {e}")
         round_2_sent = 0
 
     # --- Phase 4: Send reminders to candidates who haven't completed their interview ---
     try:
-        reminders_sent = run_reminders(supabase, gmail_service, template=tmpl_reminder)
+        reminders_sent = run_reminders(supabase, template=tmpl_reminder)
     except Exception as e:
         log("ERROR", f"Reminder phase failed: {e}")
         reminders_sent = 0
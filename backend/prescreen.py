@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""Cheap local relevance pre-screen that runs before LLM grading.
+
+Scores each resume against its job description with TF-IDF cosine similarity (hashed
+vocabulary, NumPy), so applications from an entirely different profession can be
+rejected without a Gemini call.
+
+PRESCREEN_MODE:
+    off     - disabled (default)
+    report  - log what would be rejected, but grade everyone with Gemini
+    enforce - reject candidates below PRESCREEN_THRESHOLD as CV_REJECTED
+
+IDF is computed per group of up to IDF_GROUP_SIZE consecutive candidates (together with
+their job descriptions), the size of one grader page. Live screening sees one page at a
+time, and the tuning report scores its sample in groups of the same size, so a
+threshold tuned from the report means the same thing in production.
+
+Run this file directly to tune the threshold: it scores already-graded candidates and
+shows, per threshold, how many would have been rejected and how many of those the LLM
+actually passed.
+"""
+
+import os
+import re
+import zlib
+
+# numpy is optional - without it the pre-screen is skipped
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from utils import get_supabase_client, log
+
+# --- Configuration ---
+PRESCREEN_MODE = os.getenv("PRESCREEN_MODE", "off")
+# Resumes whose similarity to the job description is below this are considered unrelated
+PRESCREEN_THRESHOLD = float(os.getenv("PRESCREEN_THRESHOLD", "0.05"))
+# Hashed vocabulary size
+HASH_DIM = 2 ** 15
+# Resumes vectorized per matrix chunk (bounds memory: CHUNK x HASH_DIM float32)
+CHUNK_SIZE = 256
+# Candidates sharing one IDF; matches the grader's page size (grader.GRADER_PAGE_SIZE)
+IDF_GROUP_SIZE = 250
+# Thresholds shown by the tuning report
+REPORT_THRESHOLDS = [0.02, 0.03, 0.05, 0.08, 0.10, 0.15]
+
+_TOKEN_RE = re.compile(r"[a-z][a-z0-9+#]{1,30}")
+_STOPWORDS = frozenset(
+    "the and for with you your our are will this that from have has who all can not but "
+    "was were been into out about their they them its any per via etc also able more most "
+    "such other than then who what when where which while within work working years year".split()
+)
+
+
+def _tokens(text: str) -> list[str]:
+    return [t for t in _TOKEN_RE.findall((text or "").lower()) if t not in _STOPWORDS]
+
+
+def has_tokens(text: str) -> bool:
+    """Whether the text has any token the vectorizer understands (e.g. not a CV in Arabic script)."""
+    return bool(_tokens(text))
+
+
+def _hashed_tokens(text: str):
+    tokens = _tokens(text)
+    return np.fromiter((zlib.crc32(t.encode()) % HASH_DIM for t in tokens), dtype=np.int64, count=len(tokens))
+
+
+def _vectorize(token_lists, idf):
+    """Rows of L2-normalized, sublinear-TF x IDF vectors."""
+    matrix = np.zeros((len(token_lists), HASH_DIM), dtype=np.float32)
+    for row, tokens in enumerate(token_lists):
+        np.add.at(matrix[row], tokens, 1.0)
+    np.log1p(matrix, out=matrix)
+    matrix *= idf
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def relevance_scores(pairs: list[tuple[str, str]]):
+    """
+    Cosine similarity for each (resume_text, job_description) pair, as a NumPy array.
+    Pairs are scored in groups of IDF_GROUP_SIZE, each with its own IDF.
+    """
+    if len(pairs) > IDF_GROUP_SIZE:
+        return np.concatenate([
+            _group_relevance_scores(pairs[start:start + IDF_GROUP_SIZE])
+            for start in range(0, len(pairs), IDF_GROUP_SIZE)
+        ])
+    return _group_relevance_scores(pairs)
+
+
+def _group_relevance_scores(pairs: list[tuple[str, str]]):
+    job_texts = list(dict.fromkeys(jd for _, jd in pairs))
+    job_index = {jd: i for i, jd in enumerate(job_texts)}
+
+    job_tokens = [_hashed_tokens(jd) for jd in job_texts]
+    resume_tokens = [_hashed_tokens(resume) for resume, _ in pairs]
+
+    # IDF over every document in this group (jobs + resumes)
+    df = np.zeros(HASH_DIM, dtype=np.float32)
+    for tokens in job_tokens + resume_tokens:
+        df[np.unique(tokens)] += 1
+    n_docs = len(job_tokens) + len(resume_tokens)
+    idf = (np.log((1 + n_docs) / (1 + df)) + 1).astype(np.float32)
+
+    job_vectors = _vectorize(job_tokens, idf)
+    job_rows = np.array([job_index[jd] for _, jd in pairs], dtype=np.int64)
+
+    scores = np.empty(len(pairs), dtype=np.float32)
+    for start in range(0, len(pairs), CHUNK_SIZE):
+        end = start + CHUNK_SIZE
+        resumes = _vectorize(resume_tokens[start:end], idf)
+        scores[start:end] = np.einsum("ij,ij->i", resumes, job_vectors[job_rows[start:end]])
+    return scores
+
+
+def prescreen_candidates(candidates: list[dict]) -> tuple[list[dict], list[tuple[dict, float]]]:
+    """
+    Split candidates into (to_grade, to_reject). to_reject holds (candidate, similarity)
+    pairs and is only non-empty in enforce mode; report mode just logs them.
+    Candidates whose resume or job description has no usable tokens are never screened:
+    a similarity of 0 would say nothing about them, so they go to Gemini.
+    """
+    if PRESCREEN_MODE not in ("report", "enforce"):
+        return candidates, []
+    if np is None:
+        log("WARN", "PRESCREEN_MODE is set but numpy is not installed — skipping pre-screen")
+        return candidates, []
+
+    screenable = [c for c in candidates if has_tokens(c.get("resume_text")) and has_tokens(c.get("job_description"))]
+    if not screenable:
+        return candidates, []
+
+    scores = relevance_scores([(c["resume_text"], c["job_description"]) for c in screenable])
+    below = [(c, float(score)) for c, score in zip(screenable, scores) if score < PRESCREEN_THRESHOLD]
+
+    if PRESCREEN_MODE == "report":
+        for candidate, score in below:
+            log("INFO", f"[Pre-screen report] Would reject {candidate.get('email')} (similarity {score:.3f} < {PRESCREEN_THRESHOLD})")
+        log("INFO", f"[Pre-screen report] {len(below)}/{len(screenable)} would be rejected at threshold {PRESCREEN_THRESHOLD}")
+        return candidates, []
+
+    rejected_ids = {c["id"] for c, _ in below}
+    log("INFO", f"Pre-screen: {len(below)}/{len(screenable)} rejected below similarity {PRESCREEN_THRESHOLD}")
+    return [c for c in candidates if c["id"] not in rejected_ids], below
+
+
+def prescreen_reasoning(similarity: float) -> str:
+    return (
+        f"Auto-rejected by relevance pre-screen: resume/job description similarity "
+        f"{similarity:.3f} is below the {PRESCREEN_THRESHOLD} threshold. Not graded by AI."
+    )
+
+
+def main():
+    """
+    Tuning report: how the pre-screen would have treated already-graded candidates.
+    Candidates the pre-screen itself rejected (metadata.prescreen_similarity) have no LLM
+    grade and are left out.
+    """
+    if np is None:
+        print("numpy is required for the pre-screen report")
+        return
+    from mailer import MIN_SCORE
+
+    supabase = get_supabase_client()
+    result = (
+        supabase.table("candidates")
+        .select("id, email, resume_text, job_description, jd_match_score, metadata")
+        .in_("status", ["GRADED", "CV_REJECTED", "INVITE_SENT", "INTERVIEWED"])
+        .not_.is_("jd_match_score", "null")
+        .order("id", desc=True)
+        .limit(2000)
+        .execute()
+    )
+    graded = [
+        c for c in result.data or []
+        if has_tokens(c.get("resume_text")) and has_tokens(c.get("job_description"))
+        and "prescreen_similarity" not in (c.get("metadata") or {})
+    ]
+    if not graded:
+        print("No graded candidates with resume text to report on")
+        return
+
+    # Oldest first, like the grader's queue, so groups resemble live pages
+    graded.sort(key=lambda c: c["id"])
+    scores = relevance_scores([(c["resume_text"], c["job_description"]) for c in graded])
+    llm_scores = np.array([c["jd_match_score"] for c in graded])
+    passed = llm_scores >= MIN_SCORE
+
+    print(f"Pre-screen tuning report over {len(graded)} graded candidates (IDF per {IDF_GROUP_SIZE})")
+    print(f"{'threshold':>10} {'rejected':>9} {'of which LLM passed':>20}")
+    for threshold in REPORT_THRESHOLDS:
+        rejected = scores < threshold
+        print(f"{threshold:>10.2f} {int(rejected.sum()):>9} {int((rejected & passed).sum()):>20}")
+
+
+if __name__ == "__main__":
+    main()
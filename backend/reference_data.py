@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Versioned in-process cache of small, rarely-changing reference tables.
+
+Prompts and jobs change a few times a month but are read by every stage,
+every cycle. Each table is held in memory and revalidated at most once per
+REFERENCE_REVALIDATE_SECONDS with a cheap (row count, max updated_at) query; the rows
+are only re-fetched when that version changes, or after REFERENCE_MAX_AGE_SECONDS to
+pick up anything the check can miss (e.g. a delete plus an insert of an older row).
+
+If Supabase is unreachable, the last copy that loaded successfully keeps being served.
+"""
+
+import os
+import time
+import threading
+
+from utils import log
+
+# --- Configuration ---
+REFERENCE_REVALIDATE_SECONDS = int(os.getenv("REFERENCE_REVALIDATE_SECONDS", "60"))
+REFERENCE_MAX_AGE_SECONDS = 60 * 60
+
+
+class ReferenceTable:
+    """In-memory copy of one table, tagged with the version it was loaded at."""
+
+    def __init__(self, table: str, columns: str, version_column: str = "updated_at"):
+        self.table = table
+        self.columns = columns
+        self.version_column = version_column
+        self.version = None
+        self._rows = None
+        self._indexes = {}
+        self._loaded_at = 0.0
+        self._checked_at = 0.0
+        self._lock = threading.RLock()
+
+    def _fetch_version(self, supabase) -> str:
+        result = (
+            supabase.table(self.table)
+            .select(self.version_column, count="exact")
+            .order(self.version_column, desc=True)
+            .limit(1)
+            .execute()
+        )
+        latest = result.data[0][self.version_column] if result.data else None
+        return f"{result.count}@{latest}"
+
+    def rows(self, supabase) -> list[dict]:
+        """
+        Current rows, revalidated if the last check is older than REFERENCE_REVALIDATE_SECONDS.
+        Raises only if the table has never loaded; otherwise failures serve the cached copy.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._rows is not None and now - self._checked_at < REFERENCE_REVALIDATE_SECONDS:
+                return self._rows
+
+            try:
+                version = self._fetch_version(supabase)
+                stale = now - self._loaded_at >= REFERENCE_MAX_AGE_SECONDS
+                if self._rows is None or version != self.version or stale:
+                    result = supabase.table(self.table).select(self.columns).execute()
+                    self._rows = result.data or []
+                    self._indexes = {}
+                    self._loaded_at = now
+                    if version != self.version:
+                        log("INFO", f"Loaded {self.table}: {len(self._rows)} row(s), version {version}")
+                    self.version = version
+            except Exception as e:
+                if self._rows is None:
+                    raise
+                log("WARN", f"Could not revalidate {self.table} ({e}) — serving version {self.version} "
+                            f"from {(now - self._loaded_at) / 60:.0f} min ago")
+            self._checked_at = now
+            return self._rows
+
+    def by(self, supabase, key: str) -> dict:
+        """Rows indexed by a column, e.g. by(supabase, "name"); rebuilt once per version."""
+        with self._lock:
+            rows = self.rows(supabase)
+            index = self._indexes.get(key)
+            if index is None:
+                index = {row[key]: row for row in rows}
+                self._indexes[key] = index
+            return index
+
+
+prompts = ReferenceTable("prompts", "name, system_prompt, updated_at")
+jobs = ReferenceTable("jobs", "id, title, description, location, is_active, updated_at")
+
+
+def get_prompt(supabase, name: str) -> tuple[str | None, str | None]:
+    """Return (system_prompt, version) for a prompts row; the version is its updated_at."""
+    row = prompts.by(supabase, "name").get(name)
+    if not row or not row.get("system_prompt"):
+        return None, None
+    return row["system_prompt"], row.get("updated_at")
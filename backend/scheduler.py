@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""Persistent delayed-action queue for the mailer (the scheduled_actions table).
+
+Each pending action is one row with an absolute due_at: an interview invite, a Round 2
+invite or a reminder for one candidate. Invites are enqueued by a database trigger as
+candidates change status; reminders are enqueued by the mailer, already moved into the
+candidate's local business hours. The mailer only ever reads due rows (an indexed range
+scan) and the listener sleeps until the next due_at.
+
+reconcile() is the safety net: periodically (and on startup) it publishes the mailer's
+thresholds for the trigger and enqueues any action the candidates' current states call
+for but the queue is missing.
+"""
+
+import os
+import time
+from datetime import datetime, timezone, timedelta
+
+from utils import log
+
+# --- Configuration ---
+# Due actions handled per mailer run
+SCHEDULER_FETCH_LIMIT = 200
+# How often the reconcile sweep runs
+SCHEDULER_RECONCILE_SECONDS = int(os.getenv("SCHEDULER_RECONCILE_SECONDS", "3600"))
+# A failed send is retried after this delay, doubling per attempt, up to the attempt limit
+SCHEDULER_RETRY_DELAY_SECONDS = 5 * 60
+SCHEDULER_MAX_ATTEMPTS = 5
+
+ACTION_INVITE = "invite"
+ACTION_ROUND_2_INVITE = "round_2_invite"
+ACTION_REMINDER = "reminder"
+
+_last_reconcile = None  # monotonic time of the last sweep; None = never run, so due
+
+
+def _parse_time(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def fetch_due(supabase, limit: int = SCHEDULER_FETCH_LIMIT) -> list[dict]:
+    """Pending actions whose due_at has passed, oldest first."""
+    now = datetime.now(timezone.utc).isoformat()
+    result = (
+        supabase.table("scheduled_actions")
+        .select("id, candidate_id, action, due_at, attempts")
+        .eq("status", "PENDING")
+        .lte("due_at", now)
+        .order("due_at")
+        .limit(limit)
+        .execute()
+    )
+    return result.data or []
+
+
+def next_due_at(supabase) -> datetime | None:
+    """due_at of the earliest pending action, or None when the queue is empty."""
+    result = (
+        supabase.table("scheduled_actions")
+        .select("due_at")
+        .eq("status", "PENDING")
+        .order("due_at")
+        .limit(1)
+        .execute()
+    )
+    return _parse_time(result.data[0]["due_at"]) if result.data else None
+
+
+def seconds_until_next_due(supabase) -> float | None:
+    due_at = next_due_at(supabase)
+    if due_at is None:
+        return None
+    return (due_at - datetime.now(timezone.utc)).total_seconds()
+
+
+def schedule(supabase, actions: list[tuple[int, str, datetime]]):
+    """Enqueue (candidate_id, action, due_at) items; an already pending action is moved to the new due_at."""
+    if not actions:
+        return
+    payload = [
+        {"candidate_id": candidate_id, "action": action, "due_at": due_at.isoformat()}
+        for candidate_id, action, due_at in actions
+    ]
+    supabase.rpc("schedule_actions", {"actions": payload}).execute()
+
+
+def complete(supabase, action_ids: list[int], status: str = "DONE"):
+    """Mark actions DONE (or CANCELLED when the candidate no longer qualifies)."""
+    if not action_ids:
+        return
+    (
+        supabase.table("scheduled_actions")
+        .update({"status": status, "completed_at": datetime.now(timezone.utc).isoformat()})
+        .in_("id", action_ids)
+        .execute()
+    )
+
+
+def postpone(supabase, action: dict, due_at: datetime):
+    supabase.table("scheduled_actions").update({"due_at": due_at.isoformat()}).eq("id", action["id"]).execute()
+
+
+def retry_later(supabase, actions: list[dict]):
+    """Push failed actions back with exponential delay; give up after SCHEDULER_MAX_ATTEMPTS."""
+    now = datetime.now(timezone.utc)
+    for action in actions:
+        attempts = (action.get("attempts") or 0) + 1
+        update = {"attempts": attempts}
+        if attempts >= SCHEDULER_MAX_ATTEMPTS:
+            update.update({"status": "FAILED", "completed_at": now.isoformat()})
+            log("ERROR", f"Giving up on {action['action']} for candidate {action['candidate_id']} after {attempts} attempts")
+        else:
+            update["due_at"] = (now + timedelta(seconds=SCHEDULER_RETRY_DELAY_SECONDS * 2 ** (attempts - 1))).isoformat()
+        try:
+            supabase.table("scheduled_actions").update(update).eq("id", action["id"]).execute()
+        except Exception as e:
+            log("ERROR", f"Failed to reschedule {action['action']} for candidate {action['candidate_id']}: {e}")
+
+
+def reconcile(supabase, min_score: int, invite_delay_hours: int, reminder_start_hours: int,
+              reminder_gap_hours: int, force: bool = False) -> int:
+    """
+    Run the reconcile sweep on the first call and then every SCHEDULER_RECONCILE_SECONDS
+    (or when forced). Returns actions enqueued.
+    """
+    global _last_reconcile
+    if not force and _last_reconcile is not None and time.monotonic() - _last_reconcile < SCHEDULER_RECONCILE_SECONDS:
+        return 0
+    result = supabase.rpc("reconcile_scheduled_actions", {
+        "min_score": min_score,
+        "invite_delay_hours": invite_delay_hours,
+        "reminder_start_hours": reminder_start_hours,
+        "reminder_gap_hours": reminder_gap_hours,
+    }).execute()
+    _last_reconcile = time.monotonic()
+    enqueued = result.data or 0
+    if enqueued:
+        log("WARN", f"Reconcile sweep enqueued {enqueued} missing scheduled action(s)")
+    return enqueued
@@ -0,0 +1,34 @@
+"""Shared fixtures for the backend tests. Run from the repo root: python -m pytest backend/tests"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# Backend modules import each other by bare name (e.g. `from utils import log`)
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+class FakeClock:
+    """Stands in for time.monotonic/time.sleep so time-based logic runs instantly."""
+
+    def __init__(self, start: float = 1000.0):
+        self.now = start
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    import utils
+
+    fake = FakeClock()
+    monkeypatch.setattr(utils.time, "monotonic", fake.monotonic)
+    monkeypatch.setattr(utils.time, "sleep", fake.sleep)
+    return fake
@@ -0,0 +1,127 @@
+import batch_grading
+from batch_grading import LocalBatchBackend, poll_grading_batches, submit_grading_batches
+
+
+class FakeQuery:
+    """The slice of the supabase query builder batch_grading uses, over in-memory rows."""
+
+    def __init__(self, rows: list):
+        self.rows = rows
+        self.filters = []
+        self.op = ("select", None)
+
+    def select(self, *_):
+        return self
+
+    def insert(self, row):
+        self.op = ("insert", row)
+        return self
+
+    def update(self, values):
+        self.op = ("update", values)
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def in_(self, column, values):
+        values = set(values)
+        self.filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def order(self, *_):
+        return self
+
+    def execute(self):
+        kind, payload = self.op
+        if kind == "insert":
+            self.rows.append({"id": len(self.rows) + 1, "state": "PENDING", **payload})
+            return FakeResult([])
+        matched = [row for row in self.rows if all(f(row) for f in self.filters)]
+        if kind == "update":
+            for row in matched:
+                row.update(payload)
+        return FakeResult(matched)
+
+
+class FakeResult:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeSupabase:
+    def __init__(self, **tables):
+        self.tables = tables
+
+    def table(self, name):
+        return FakeQuery(self.tables.setdefault(name, []))
+
+
+JOB = "We need Python and PostgreSQL experience."
+
+
+def submit(supabase, backend, prompts):
+    return submit_grading_batches(supabase, backend, "test-model", prompts, {"type": "object"})
+
+
+def test_poll_applies_finished_local_batch_grades(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch_grading, "LOCAL_BATCH_DELAY_SECONDS", 0)
+    supabase = FakeSupabase(candidates=[
+        {"id": 1, "email": "a@example.com", "status": "NEW_APPLICATION"},
+        {"id": 2, "email": "b@example.com", "status": "NEW_APPLICATION"},
+    ])
+    backend = LocalBatchBackend(tmp_path)
+    submit(supabase, backend, {
+        1: f"{JOB}\nCANDIDATE RESUME:\nPython and PostgreSQL experience",
+        2: f"{JOB}\nCANDIDATE RESUME:\nWatercolour painting",
+    })
+    assert {c["status"] for c in supabase.tables["candidates"]} == {"GRADING_BATCHED"}
+
+    applied, events = {}, []
+    assert poll_grading_batches(
+        supabase,
+        backend,
+        lambda candidate, score, reasoning: (applied.__setitem__(candidate["id"], score), events.append("apply")),
+        lambda: events.append("flush"),
+    ) == 2
+    assert applied[1] > applied[2]
+    assert events == ["apply", "apply", "flush"]
+    assert supabase.tables["grading_batches"][0]["state"] == "SUCCEEDED"
+
+
+def test_poll_leaves_unfinished_batches_pending(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch_grading, "LOCAL_BATCH_DELAY_SECONDS", 3600)
+    supabase = FakeSupabase(candidates=[{"id": 1, "email": "a@example.com", "status": "NEW_APPLICATION"}])
+    backend = LocalBatchBackend(tmp_path)
+    submit(supabase, backend, {1: f"{JOB}\nCANDIDATE RESUME:\nPython"})
+
+    assert poll_grading_batches(supabase, backend, lambda *_: None, lambda: None) == 0
+    assert supabase.tables["grading_batches"][0]["state"] == "PENDING"
+    assert supabase.tables["candidates"][0]["status"] == "GRADING_BATCHED"
+
+
+def test_poll_requeues_candidates_of_a_missing_batch(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch_grading, "LOCAL_BATCH_DELAY_SECONDS", 0)
+    supabase = FakeSupabase(candidates=[{"id": 1, "email": "a@example.com", "status": "NEW_APPLICATION"}])
+    backend = LocalBatchBackend(tmp_path)
+    submit(supabase, backend, {1: f"{JOB}\nCANDIDATE RESUME:\nPython"})
+    for job_file in tmp_path.iterdir():
+        job_file.unlink()
+
+    assert poll_grading_batches(supabase, backend, lambda *_: None, lambda: None) == 0
+    assert supabase.tables["grading_batches"][0]["state"] == "FAILED"
+    assert supabase.tables["candidates"][0]["status"] == "NEW_APPLICATION"
+
+
+def test_poll_skips_candidates_that_moved_on(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch_grading, "LOCAL_BATCH_DELAY_SECONDS", 0)
+    supabase = FakeSupabase(candidates=[{"id": 1, "email": "a@example.com", "status": "NEW_APPLICATION"}])
+    backend = LocalBatchBackend(tmp_path)
+    submit(supabase, backend, {1: f"{JOB}\nCANDIDATE RESUME:\nPython"})
+    supabase.tables["candidates"][0]["status"] = "REJECTED"
+
+    applied = []
+    assert poll_grading_batches(supabase, backend, lambda *args: applied.append(args), lambda: None) == 0
+    assert applied == []
+    assert supabase.tables["candidates"][0]["status"] == "REJECTED"
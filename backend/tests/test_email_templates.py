@@ -0,0 +1,36 @@
+import pytest
+
+from email_templates import compile_template, render_template
+from mailer import INVITE_EMAIL_HTML, REMINDER_EMAIL_HTML, interpolate_template
+
+VARIABLES = {"first_name": "Alex", "company_name": "Acme", "interview_link": "https://example.com/i/abc",
+             "duration": "20 minutes"}
+
+
+@pytest.mark.parametrize("template", [INVITE_EMAIL_HTML, REMINDER_EMAIL_HTML])
+def test_render_template_matches_interpolate_template_for_builtin_emails(template):
+    assert render_template(template, VARIABLES) == interpolate_template(template, VARIABLES)
+
+
+def test_render_template_leaves_unknown_placeholders_and_css_braces():
+    template = "<style>p { color: red; }</style>Hi {first_name}, {unknown} {not-an-identifier}"
+    assert render_template(template, {"first_name": "Alex"}) == (
+        "<style>p { color: red; }</style>Hi Alex, {unknown} {not-an-identifier}"
+    )
+
+
+def test_render_template_does_not_substitute_into_values():
+    # interpolate_template replaces one variable at a time, so a later one lands inside an earlier value
+    variables = {"first_name": "{company_name}", "company_name": "Acme"}
+    assert render_template("Hi {first_name}", variables) == "Hi {company_name}"
+    assert interpolate_template("Hi {first_name}", variables) == "Hi Acme"
+
+
+def test_render_template_stringifies_values():
+    assert render_template("Score: {score}", {"score": 87}) == "Score: 87"
+
+
+def test_compile_template_is_cached_per_content_and_variables():
+    template = "Hello {first_name}"
+    assert compile_template(template, ["first_name"]) is compile_template(template, ["first_name"])
+    assert compile_template(template, ["first_name"]) is not compile_template(template, ["company_name"])
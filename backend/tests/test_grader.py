@@ -0,0 +1,95 @@
+import pytest
+
+import grade_cache
+import grader
+from grader import grade_pdf_tiers, is_borderline, tier_metadata, validate_packed_grades
+
+PACK = [{"id": 7}, {"id": 9}]
+
+
+def test_validate_packed_grades_maps_items_to_candidates():
+    items = [
+        {"candidate_id": "9", "score": 40, "reasoning": "b"},
+        {"candidate_id": " 7 ", "score": 80, "reasoning": "a"},
+    ]
+    grades = validate_packed_grades(PACK, items)
+    assert grades[7]["score"] == 80
+    assert grades[9]["score"] == 40
+
+
+def test_validate_packed_grades_rejects_missing_or_extra_items():
+    assert validate_packed_grades(PACK, [{"candidate_id": "7", "score": 80}]) is None
+    assert validate_packed_grades(PACK, [
+        {"candidate_id": "7", "score": 80},
+        {"candidate_id": "9", "score": 40},
+        {"candidate_id": "11", "score": 60},
+    ]) is None
+
+
+def test_validate_packed_grades_rejects_duplicates_and_unknown_ids():
+    assert validate_packed_grades(PACK, [{"candidate_id": "7", "score": 80}, {"candidate_id": "7", "score": 30}]) is None
+    assert validate_packed_grades(PACK, [{"candidate_id": "7", "score": 80}, {"candidate_id": "8", "score": 30}]) is None
+
+
+def test_validate_packed_grades_rejects_bad_scores_and_shapes():
+    for score in (101, -1, "80", 80.0, None):
+        assert validate_packed_grades(PACK, [{"candidate_id": "7", "score": score}, {"candidate_id": "9", "score": 40}]) is None
+    assert validate_packed_grades(PACK, {"candidate_id": "7", "score": 80}) is None
+    assert validate_packed_grades(PACK, ["7", "9"]) is None
+
+
+def test_is_borderline_only_near_pass_score_with_a_cascade(monkeypatch):
+    monkeypatch.setattr(grader, "CASCADE_MODEL", "fast-model")
+    monkeypatch.setattr(grader, "PASS_SCORE", 50)
+    monkeypatch.setattr(grader, "CASCADE_BAND", 15)
+    assert is_borderline(35)
+    assert is_borderline(65)
+    assert not is_borderline(34)
+    assert not is_borderline(90)
+
+    monkeypatch.setattr(grader, "CASCADE_MODEL", "")
+    assert not is_borderline(50)
+
+
+def test_tier_metadata_names_the_model_that_decided(monkeypatch):
+    monkeypatch.setattr(grader, "CASCADE_MODEL", "fast-model")
+    assert tier_metadata("fast") == {"grading_tier": "fast", "grading_model": "fast-model"}
+    assert tier_metadata("strong")["grading_model"] == grader.GRADING_MODEL
+
+
+@pytest.fixture
+def gemini_calls(monkeypatch):
+    """Record PDF uploads, grading calls and deletions; every grade scores 50."""
+    calls = []
+
+    class Uploaded:
+        name = "files/resume"
+
+    def grade_uploaded_pdf(gemini_client, uploaded_file, job_description, include_text=False, job_id=None, model=None):
+        calls.append(("grade", model))
+        return {"score": 50, "reasoning": model, **({"resume_text": "transcribed"} if include_text else {})}
+
+    monkeypatch.setattr(grade_cache, "GRADE_CACHE_ENABLED", False)
+    monkeypatch.setattr(grader, "CASCADE_MODEL", "fast-model")
+    monkeypatch.setattr(grader, "throttle_gemini", lambda *_: None)
+    monkeypatch.setattr(grader, "upload_pdf_bytes", lambda *_: calls.append(("upload",)) or Uploaded())
+    monkeypatch.setattr(grader, "delete_gemini_file", lambda _, name: calls.append(("delete", name)))
+    monkeypatch.setattr(grader, "grade_uploaded_pdf", grade_uploaded_pdf)
+    return calls
+
+
+def test_grade_pdf_tiers_escalates_on_the_same_upload(gemini_calls):
+    result, tier = grade_pdf_tiers(None, b"%PDF", "job", include_text=True)
+    assert tier == "strong"
+    assert result == {"score": 50, "reasoning": grader.GRADING_MODEL, "resume_text": "transcribed"}
+    assert gemini_calls == [
+        ("upload",), ("grade", "fast-model"), ("grade", grader.GRADING_MODEL), ("delete", "files/resume"),
+    ]
+
+
+def test_grade_pdf_tiers_keeps_a_clear_first_tier_grade(gemini_calls, monkeypatch):
+    monkeypatch.setattr(grader, "CASCADE_BAND", 0)
+    monkeypatch.setattr(grader, "PASS_SCORE", 80)
+    _, tier = grade_pdf_tiers(None, b"%PDF", "job")
+    assert tier == "fast"
+    assert [call[0] for call in gemini_calls] == ["upload", "grade", "delete"]
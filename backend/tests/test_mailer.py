@@ -0,0 +1,69 @@
+from datetime import datetime, timezone
+
+import pytest
+
+import scheduler
+from mailer import MIN_SCORE, action_still_valid, next_business_time
+
+
+def utc(day, hour, minute=0):
+    return datetime(2026, 3, day, hour, minute, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize("after, location, expected", [
+    # Dubai is UTC+4: 10:00 local is inside business hours
+    (utc(2, 6), "Dubai, UAE", utc(2, 6)),
+    # 06:00 local waits for 08:00 the same day
+    (utc(2, 2), "Dubai, UAE", utc(2, 4)),
+    # 19:00 local waits for 08:00 the next day
+    (utc(2, 15), "Dubai, UAE", utc(3, 4)),
+    # Unknown locations use UTC
+    (utc(2, 20, 30), "Remote", utc(3, 8)),
+    (utc(2, 9, 15), "", utc(2, 9, 15)),
+])
+def test_next_business_time(after, location, expected):
+    assert next_business_time(after, location) == expected
+
+
+def candidate(**fields):
+    return {"interview_token": "tok", "created_at": "2026-03-01T00:00:00Z", **fields}
+
+
+def action(kind):
+    return {"action": kind}
+
+
+def test_action_still_valid_requires_a_candidate_with_a_token():
+    assert not action_still_valid(action(scheduler.ACTION_INVITE), None)
+    assert not action_still_valid(
+        action(scheduler.ACTION_INVITE), candidate(status="FORM_COMPLETED", interview_token=None)
+    )
+
+
+def test_invite_is_valid_for_passing_graded_or_form_completed_candidates():
+    invite = action(scheduler.ACTION_INVITE)
+    assert action_still_valid(invite, candidate(status="GRADED", jd_match_score=MIN_SCORE))
+    assert action_still_valid(invite, candidate(status="FORM_COMPLETED"))
+    assert not action_still_valid(invite, candidate(status="GRADED", jd_match_score=MIN_SCORE - 1))
+    assert not action_still_valid(invite, candidate(status="INVITE_SENT", jd_match_score=90))
+
+
+def test_round_2_invite_needs_approval_and_a_send_time():
+    round_2 = action(scheduler.ACTION_ROUND_2_INVITE)
+    assert action_still_valid(round_2, candidate(status="ROUND_2_APPROVED", round_2_invite_after="2026-03-02T00:00:00Z"))
+    assert not action_still_valid(round_2, candidate(status="ROUND_2_APPROVED"))
+    assert not action_still_valid(round_2, candidate(status="ROUND_2_INVITED", round_2_invite_after="2026-03-02T00:00:00Z"))
+
+
+def test_reminder_needs_a_sent_invite_for_an_active_job():
+    reminder = action(scheduler.ACTION_REMINDER)
+    sent = {"invite_sent_at": "2026-03-02T00:00:00Z", "jobs": {"is_active": True}}
+    assert action_still_valid(reminder, candidate(status="INVITE_SENT", **sent))
+    assert action_still_valid(reminder, candidate(status="ROUND_2_INVITED", **sent))
+    assert not action_still_valid(reminder, candidate(status="INTERVIEW_COMPLETED", **sent))
+    assert not action_still_valid(reminder, candidate(status="INVITE_SENT", **{**sent, "jobs": {"is_active": False}}))
+    assert not action_still_valid(reminder, candidate(status="INVITE_SENT", jobs={"is_active": True}))
+
+
+def test_unknown_actions_are_never_valid():
+    assert not action_still_valid(action("follow_up"), candidate(status="GRADED", jd_match_score=100))
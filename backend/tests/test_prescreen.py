@@ -0,0 +1,68 @@
+import pytest
+
+import prescreen
+from prescreen import has_tokens, prescreen_candidates, relevance_scores
+
+# numpy is optional for the app, but the pre-screen does nothing without it
+pytest.importorskip("numpy")
+
+JOB = "Backend engineer: Python, PostgreSQL, Kubernetes and distributed systems"
+MATCHING = "Senior backend engineer, eight years of Python, PostgreSQL and Kubernetes"
+UNRELATED = "Pastry chef specialising in croissants, sourdough and wedding cakes"
+
+
+def candidate(candidate_id, resume_text, job_description=JOB):
+    return {"id": candidate_id, "email": f"c{candidate_id}@example.com", "resume_text": resume_text,
+            "job_description": job_description}
+
+
+def test_has_tokens_ignores_stopwords_and_unknown_scripts():
+    assert has_tokens(MATCHING)
+    assert not has_tokens("the and for with")
+    assert not has_tokens("مهندس برمجيات")
+    assert not has_tokens(None)
+
+
+def test_relevance_scores_rank_matching_resume_above_unrelated():
+    matching, unrelated = relevance_scores([(MATCHING, JOB), (UNRELATED, JOB)])
+    assert matching > unrelated
+    assert unrelated == pytest.approx(0.0)
+
+
+def test_relevance_scores_are_computed_per_idf_group(monkeypatch):
+    pairs = [(MATCHING, JOB), (UNRELATED, JOB), (MATCHING, JOB)]
+    monkeypatch.setattr(prescreen, "IDF_GROUP_SIZE", 1)
+    grouped = relevance_scores(pairs)
+    assert len(grouped) == 3
+    assert grouped[0] == pytest.approx(grouped[2])
+
+
+def test_prescreen_off_grades_everyone(monkeypatch):
+    monkeypatch.setattr(prescreen, "PRESCREEN_MODE", "off")
+    candidates = [candidate(1, UNRELATED)]
+    assert prescreen_candidates(candidates) == (candidates, [])
+
+
+def test_prescreen_enforce_rejects_unrelated_resumes(monkeypatch):
+    monkeypatch.setattr(prescreen, "PRESCREEN_MODE", "enforce")
+    to_grade, to_reject = prescreen_candidates([candidate(1, MATCHING), candidate(2, UNRELATED)])
+    assert [c["id"] for c in to_grade] == [1]
+    assert [c["id"] for c, _ in to_reject] == [2]
+
+
+def test_prescreen_report_only_logs(monkeypatch):
+    monkeypatch.setattr(prescreen, "PRESCREEN_MODE", "report")
+    candidates = [candidate(1, MATCHING), candidate(2, UNRELATED)]
+    assert prescreen_candidates(candidates) == (candidates, [])
+
+
+def test_prescreen_never_rejects_resumes_or_jobs_without_tokens(monkeypatch):
+    monkeypatch.setattr(prescreen, "PRESCREEN_MODE", "enforce")
+    candidates = [
+        candidate(1, "مهندس برمجيات، خبرة عشر سنوات"),
+        candidate(2, MATCHING, job_description="مهندس برمجيات"),
+        candidate(3, ""),
+    ]
+    to_grade, to_reject = prescreen_candidates(candidates)
+    assert to_grade == candidates
+    assert to_reject == []
@@ -0,0 +1,119 @@
+import threading
+
+from utils import AdaptiveLimiter, CircuitBreaker, TokenBucket
+
+
+class RateLimited(Exception):
+    code = 429
+
+
+def test_token_bucket_allows_a_burst_up_to_capacity(clock):
+    bucket = TokenBucket(rate=2, capacity=5)
+    for _ in range(5):
+        bucket.acquire()
+    assert clock.sleeps == []
+
+
+def test_token_bucket_waits_for_the_refill(clock):
+    bucket = TokenBucket(rate=2, capacity=5)
+    bucket.acquire(5)
+    bucket.acquire(3)
+    assert sum(clock.sleeps) == 1.5
+
+
+def test_token_bucket_refills_no_further_than_capacity(clock):
+    bucket = TokenBucket(rate=2, capacity=5)
+    bucket.acquire(5)
+    clock.now += 60
+    bucket.acquire(5)
+    bucket.acquire(1)
+    assert sum(clock.sleeps) == 0.5
+
+
+def test_token_bucket_caps_a_request_at_capacity(clock):
+    bucket = TokenBucket(rate=1, capacity=4)
+    bucket.acquire(10)
+    assert clock.sleeps == []
+
+
+def test_adaptive_limiter_halves_on_rate_limit_down_to_minimum():
+    limiter = AdaptiveLimiter(initial=8, maximum=16, minimum=2)
+    for expected in (4, 2, 2):
+        limiter.acquire()
+        limiter.release(RateLimited())
+        assert limiter.limit == expected
+
+
+def test_adaptive_limiter_grows_after_consecutive_successes_up_to_maximum():
+    limiter = AdaptiveLimiter(initial=2, maximum=3, increase_after=3)
+    for _ in range(9):
+        limiter.acquire()
+        limiter.release()
+    assert limiter.limit == 3
+
+
+def test_adaptive_limiter_ignores_other_errors():
+    limiter = AdaptiveLimiter(initial=4, maximum=8, increase_after=2)
+    limiter.acquire()
+    limiter.release()
+    limiter.acquire()
+    limiter.release(ValueError("bad response"))
+    limiter.acquire()
+    limiter.release()
+    assert limiter.limit == 5
+
+
+def test_adaptive_limiter_on_rate_limit_reduces_while_requests_are_in_flight():
+    limiter = AdaptiveLimiter(initial=4, maximum=8)
+    limiter.acquire()
+    limiter.on_rate_limit()
+    assert limiter.limit == 2
+    limiter.release()
+
+
+def test_adaptive_limiter_blocks_beyond_the_limit():
+    limiter = AdaptiveLimiter(initial=1, maximum=1)
+    limiter.acquire()
+    admitted = threading.Event()
+    waiter = threading.Thread(target=lambda: (limiter.acquire(), admitted.set()))
+    waiter.start()
+    assert not admitted.wait(0.05)
+    limiter.release()
+    assert admitted.wait(1)
+    waiter.join()
+
+
+def breaker():
+    return CircuitBreaker("Test", failure_ratio=0.5, window=4, min_calls=4, cooldown=30)
+
+
+def test_circuit_breaker_stays_closed_below_min_calls(clock):
+    circuit = breaker()
+    for _ in range(3):
+        circuit.record(False)
+    assert circuit.allow()
+
+
+def test_circuit_breaker_opens_at_the_failure_ratio_and_closes_after_cooldown(clock):
+    circuit = breaker()
+    for ok in (True, False, True, False):
+        circuit.record(ok)
+    assert not circuit.allow()
+    assert circuit.retry_after() == 30
+
+    clock.now += 30
+    assert circuit.allow()
+    # The window starts fresh after the cooldown
+    for _ in range(3):
+        circuit.record(False)
+    assert circuit.allow()
+
+
+def test_circuit_breaker_only_counts_the_last_window_calls(clock):
+    circuit = breaker()
+    for ok in (False, True, True, True, True):
+        circuit.record(ok)
+    circuit.record(False)
+    assert circuit.allow()
+    circuit.record(False)
+    assert not circuit.allow()
@@ -3,6 +3,10 @@
 
 import os
 import json
+import time
+import random
+import threading
+from datetime import datetime, timedelta
 from pathlib import Path
 
 # dotenv is optional - Railway provides env vars directly
@@ -42,14 +46,407 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GOOGLE_TOKEN_JSON = os.getenv("GOOGLE_TOKEN_JSON")
 GOOGLE_CREDENTIALS_JSON = os.getenv("GOOGLE_CREDENTIALS_JSON")
 
+# Refresh the Gmail access token this long before it actually expires
+GMAIL_TOKEN_REFRESH_MARGIN = timedelta(minutes=5)
+
+# --- Rate Limits ---
+# Gmail per-user quota: 250 quota units per second (shared by every stage in the process)
+GMAIL_QUOTA_UNITS_PER_SECOND = int(os.getenv("GMAIL_QUOTA_UNITS_PER_SECOND", "250"))
+# Messages one user may send per minute, on top of quota units (Gmail throttles bursts of sends)
+GMAIL_SENDS_PER_MINUTE = int(os.getenv("GMAIL_SENDS_PER_MINUTE", "60"))
+# Quota units charged per Gmail API method
+GMAIL_QUOTA_COST = {
+    "messages.get": 5,
+    "messages.list": 5,
+    "messages.send": 100,
+    "messages.batchModify": 50,
+    "attachments.get": 5,
+    "history.list": 2,
+    "labels.list": 1,
+    "getProfile": 1,
+}
+# Gemini per-project limits (set to match the API key's tier)
+GEMINI_REQUESTS_PER_MINUTE = int(os.getenv("GEMINI_RPM", "1000"))
+GEMINI_TOKENS_PER_MINUTE = int(os.getenv("GEMINI_TPM", "1000000"))
+# Per-request HTTP timeout for Gemini calls, so a hung request fails instead of stalling a worker
+GEMINI_HTTP_TIMEOUT_SECONDS = int(os.getenv("GEMINI_HTTP_TIMEOUT_SECONDS", "120"))
+# Attempts per Gemini call on transient errors (429/5xx/timeouts), with jittered exponential backoff
+GEMINI_MAX_ATTEMPTS = int(os.getenv("GEMINI_MAX_ATTEMPTS", "4"))
+GEMINI_RETRY_BASE_SECONDS = 2
+GEMINI_RETRY_MAX_SECONDS = 60
+# Open the Gemini circuit when at least this share of the recent calls failed transiently
+GEMINI_CIRCUIT_FAILURE_RATIO = 0.5
+GEMINI_CIRCUIT_WINDOW = 20
+GEMINI_CIRCUIT_MIN_CALLS = 6
+GEMINI_CIRCUIT_COOLDOWN_SECONDS = int(os.getenv("GEMINI_CIRCUIT_COOLDOWN_SECONDS", "120"))
+
 
 def log(level: str, msg: str):
     """Print a formatted log message."""
     print(f"[{level}] {msg}")
 
 
+# --- Rate Limiting ---
+class TokenBucket:
+    """
+    Thread-safe token bucket. acquire(n) blocks until n tokens are available.
+
+    Tokens refill continuously at `rate` per second up to `capacity`, which is
+    the largest burst allowed after a quiet period.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0):
+        tokens = min(tokens, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+_gmail_quota = TokenBucket(GMAIL_QUOTA_UNITS_PER_SECOND, GMAIL_QUOTA_UNITS_PER_SECOND)
+_gmail_sends = TokenBucket(GMAIL_SENDS_PER_MINUTE / 60, max(1, GMAIL_SENDS_PER_MINUTE / 6))
+_gemini_requests = TokenBucket(GEMINI_REQUESTS_PER_MINUTE / 60, max(1, GEMINI_REQUESTS_PER_MINUTE / 6))
+_gemini_tokens = TokenBucket(GEMINI_TOKENS_PER_MINUTE / 60, GEMINI_TOKENS_PER_MINUTE / 6)
+
+
+def throttle_gmail(method: str, count: int = 1):
+    """Block until `count` calls of a Gmail API method fit in the per-user quota."""
+    if method == "messages.send":
+        _gmail_sends.acquire(count)
+    _gmail_quota.acquire(GMAIL_QUOTA_COST[method] * count)
+
+
+def throttle_gemini(estimated_tokens: int = 0):
+    """Block until one more Gemini request (of roughly estimated_tokens) fits in RPM/TPM."""
+    _gemini_requests.acquire()
+    if estimated_tokens:
+        _gemini_tokens.acquire(estimated_tokens)
+
+
+# Reasons on a 403 that mean "slow down" (Gmail reports per-user send limits this way)
+RATE_LIMIT_403_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+# Error reasons/statuses for server-side failures worth retrying
+TRANSIENT_REASONS = {"UNAVAILABLE", "DEADLINE_EXCEEDED", "INTERNAL", "backendError"}
+
+
+def error_status(error: Exception) -> int | None:
+    """HTTP status of a Gemini (google.genai APIError.code) or Google API (HttpError.resp.status) error."""
+    code = getattr(error, "code", None)
+    if isinstance(code, int):
+        return code
+    status = getattr(getattr(error, "resp", None), "status", None)
+    try:
+        return int(status) if status is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def error_reasons(error: Exception) -> set:
+    """
+    Structured reasons attached to an API error: the google.genai status (e.g.
+    "RESOURCE_EXHAUSTED") and the reasons in an HttpError body (e.g. "userRateLimitExceeded").
+    """
+    reasons = set()
+    status = getattr(error, "status", None)
+    if isinstance(status, str):
+        reasons.add(status)
+    for detail in getattr(error, "error_details", None) or []:
+        if isinstance(detail, dict) and detail.get("reason"):
+            reasons.add(detail["reason"])
+    content = getattr(error, "content", None)
+    if isinstance(content, (bytes, str)):
+        try:
+            body = json.loads(content).get("error", {})
+        except (ValueError, AttributeError):
+            body = {}
+        if isinstance(body, dict):
+            if isinstance(body.get("status"), str):
+                reasons.add(body["status"])
+            reasons.update(e["reason"] for e in body.get("errors") or [] if isinstance(e, dict) and e.get("reason"))
+    return reasons
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """True for 429s, RESOURCE_EXHAUSTED, and Gmail's 403 rateLimitExceeded/userRateLimitExceeded."""
+    status = error_status(error)
+    if status == 429:
+        return True
+    reasons = error_reasons(error)
+    if status == 403:
+        return bool(reasons & RATE_LIMIT_403_REASONS)
+    return "RESOURCE_EXHAUSTED" in reasons
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit that adapts to upstream health (additive increase, multiplicative
+    decrease): the limit halves on a rate-limit error and grows by one after
+    `increase_after` consecutive successes, always staying within [minimum, maximum].
+    """
+
+    def __init__(self, initial: int, maximum: int, minimum: int = 1, increase_after: int = 10):
+        self.limit = max(minimum, min(initial, maximum))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase_after = increase_after
+        self._in_flight = 0
+        self._successes = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self._in_flight >= self.limit:
+                self._cond.wait()
+            self._in_flight += 1
+
+    def on_rate_limit(self):
+        """Halve the limit for a rate-limit error seen mid-request (e.g. before a retry)."""
+        with self._cond:
+            self._decrease()
+
+    def _decrease(self):
+        self._successes = 0
+        new_limit = max(self.minimum, self.limit // 2)
+        if new_limit != self.limit:
+            log("WARN", f"Rate limited — reducing concurrency {self.limit} → {new_limit}")
+        self.limit = new_limit
+
+    def release(self, error: Exception | None = None):
+        with self._cond:
+            self._in_flight -= 1
+            if error is not None and is_rate_limit_error(error):
+                self._decrease()
+            elif error is None:
+                self._successes += 1
+                if self._successes >= self.increase_after and self.limit < self.maximum:
+                    self._successes = 0
+                    self.limit += 1
+            self._cond.notify_all()
+
+
+def is_transient_error(error: Exception) -> bool:
+    """True for errors worth retrying: rate limits, 5xx/UNAVAILABLE, timeouts and dropped connections."""
+    if is_rate_limit_error(error):
+        return True
+    if error_status(error) in (500, 502, 503, 504):
+        return True
+    if error_reasons(error) & TRANSIENT_REASONS:
+        return True
+    name = type(error).__name__
+    return isinstance(error, (TimeoutError, ConnectionError)) or "Timeout" in name or "ConnectError" in name
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling an upstream whose circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Failure-rate circuit breaker over the last `window` calls. When at least
+    `failure_ratio` of them failed (and there were `min_calls`), the circuit opens
+    for `cooldown` seconds; afterwards calls are let through again on a fresh window.
+    """
+
+    def __init__(self, name: str, failure_ratio: float, window: int, min_calls: int, cooldown: float):
+        self.name = name
+        self.failure_ratio = failure_ratio
+        self.window = window
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self._outcomes = []
+        self._open_until = 0.0
+        self._lock = threading.Lock()
+
+    def retry_after(self) -> float:
+        """Seconds until the circuit closes again (0 when closed)."""
+        return max(0.0, self._open_until - time.monotonic())
+
+    def allow(self) -> bool:
+        return self.retry_after() == 0
+
+    def record(self, ok: bool):
+        with self._lock:
+            self._outcomes.append(ok)
+            del self._outcomes[:-self.window]
+            calls, failures = len(self._outcomes), self._outcomes.count(False)
+            if calls >= self.min_calls and failures / calls >= self.failure_ratio:
+                self._open_until = time.monotonic() + self.cooldown
+                self._outcomes.clear()
+                log("ERROR", f"{self.name} circuit open: {failures} of the last {calls} calls failed — pausing for {self.cooldown:.0f}s")
+
+
+_gemini_circuit = CircuitBreaker(
+    "Gemini", GEMINI_CIRCUIT_FAILURE_RATIO, GEMINI_CIRCUIT_WINDOW, GEMINI_CIRCUIT_MIN_CALLS, GEMINI_CIRCUIT_COOLDOWN_SECONDS
+)
+
+
+def gemini_available() -> bool:
+    """False while the Gemini circuit is open (usable as a stage gate)."""
+    if _gemini_circuit.allow():
+        return True
+    log("INFO", f"Gemini circuit open — skipping for another {_gemini_circuit.retry_after():.0f}s")
+    return False
+
+
+_gemini_rate_limit_listeners = []
+
+
+def on_gemini_rate_limit(callback):
+    """Register callback() to run on every rate-limit error call_gemini is about to retry
+    (e.g. AdaptiveLimiter.on_rate_limit, so concurrency drops without waiting for retries to run out)."""
+    _gemini_rate_limit_listeners.append(callback)
+
+
+def call_gemini(fn, description: str = "Gemini call"):
+    """
+    Run fn() (one Gemini API call) with retries on transient errors, using jittered
+    exponential backoff, and report each outcome to the Gemini circuit breaker.
+    Rate-limit errors that will be retried are also reported to on_gemini_rate_limit
+    listeners; the final error is left to the caller.
+    Raises CircuitOpenError without calling fn while the circuit is open.
+    """
+    for attempt in range(1, GEMINI_MAX_ATTEMPTS + 1):
+        if not _gemini_circuit.allow():
+            raise CircuitOpenError(f"{description} skipped: Gemini circuit open for {_gemini_circuit.retry_after():.0f}s")
+        try:
+            result = fn()
+        except Exception as e:
+            transient = is_transient_error(e)
+            # Only upstream trouble counts towards opening the circuit, not bad input
+            _gemini_circuit.record(not transient)
+            if not transient or attempt == GEMINI_MAX_ATTEMPTS:
+                raise
+            if is_rate_limit_error(e):
+                for callback in _gemini_rate_limit_listeners:
+                    callback()
+            delay = min(GEMINI_RETRY_MAX_SECONDS, GEMINI_RETRY_BASE_SECONDS * 2 ** (attempt - 1))
+            delay = random.uniform(delay / 2, delay)
+            log("WARN", f"{description} failed (attempt {attempt}/{GEMINI_MAX_ATTEMPTS}), retrying in {delay:.1f}s: {e}")
+            time.sleep(delay)
+            continue
+        _gemini_circuit.record(True)
+        return result
+
+
+def delete_gemini_file(gemini_client, name: str):
+    """Delete an uploaded file from the Gemini Files API; failures are logged, never raised."""
+    try:
+        gemini_client.files.delete(name=name)
+    except Exception as e:
+        log("WARN", f"Failed to delete Gemini file {name}: {e}")
+
+
+# --- Client Registry ---
+class ClientRegistry:
+    """
+    Process-wide store of long-lived API clients.
+
+    Clients are built once and handed out again on every call, so their HTTP
+    connection pools (and TLS sessions) survive across pipeline cycles instead of
+    being rebuilt by every stage run. Thread-safe: shared clients are created under
+    a lock, and clients that are not safe to share (the httplib2-based Gmail service)
+    are kept one per thread.
+
+    Usage is counted per thread, so each stage worker can log its own reuse and
+    setup time with log_client_stats().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._shared = {}
+        self._local = threading.local()
+
+    def _thread_stats(self) -> dict:
+        if not hasattr(self._local, "stats"):
+            self._local.stats = {}
+        return self._local.stats
+
+    def _record(self, name: str, created: bool, seconds: float = 0.0):
+        entry = self._thread_stats().setdefault(name, {"created": 0, "reused": 0, "setup_seconds": 0.0})
+        if created:
+            entry["created"] += 1
+            entry["setup_seconds"] += seconds
+        else:
+            entry["reused"] += 1
+
+    def get_shared(self, name: str, factory):
+        """Return the process-wide client for `name`, building it on first use."""
+        client = self._shared.get(name)
+        if client is not None:
+            self._record(name, created=False)
+            return client
+
+        with self._lock:
+            client = self._shared.get(name)
+            if client is None:
+                started = time.monotonic()
+                client = factory()
+                self._shared[name] = client
+                self._record(name, created=True, seconds=time.monotonic() - started)
+                log("INFO", f"Created shared {name} client")
+            else:
+                self._record(name, created=False)
+        return client
+
+    def get_per_thread(self, name: str, factory):
+        """Return this thread's client for `name`, building it on first use."""
+        clients = getattr(self._local, "clients", None)
+        if clients is None:
+            clients = self._local.clients = {}
+
+        client = clients.get(name)
+        if client is not None:
+            self._record(name, created=False)
+            return client
+
+        started = time.monotonic()
+        client = factory()
+        clients[name] = client
+        self._record(name, created=True, seconds=time.monotonic() - started)
+        return client
+
+    def pop_stats(self) -> dict:
+        """Return and reset the calling thread's usage counters."""
+        stats = self._thread_stats()
+        self._local.stats = {}
+        return stats
+
+
+_registry = ClientRegistry()
+
+
+def log_client_stats(label: str):
+    """Log how many clients the calling thread reused vs built since the last call."""
+    stats = _registry.pop_stats()
+    if not stats:
+        return
+    parts = []
+    setup_total = 0.0
+    for name, entry in sorted(stats.items()):
+        parts.append(f"{name} reused {entry['reused']}x, created {entry['created']}x")
+        setup_total += entry["setup_seconds"]
+    log("INFO", f"[{label}] Clients: {'; '.join(parts)} | setup time {setup_total:.2f}s")
+
+
 def get_supabase_client():
-    """Initialize and return the Supabase client (anon key)."""
+    """Return the shared Supabase client (anon key)."""
+    return _registry.get_shared("supabase", _create_supabase_client)
+
+
+def _create_supabase_client():
     if not SUPABASE_URL or not SUPABASE_KEY:
         raise ValueError("Missing SUPABASE_URL or SUPABASE_KEY environment variables")
     return create_client(SUPABASE_URL, SUPABASE_KEY)
@@ -57,10 +454,14 @@ def get_supabase_client():
 
 def get_supabase_service_client():
     """
-    Initialize and return a Supabase client using the service role key.
+    Return the shared Supabase client using the service role key.
     Bypasses RLS — use only for trusted server-side operations like storage writes.
     Falls back to anon key if service role key is not set.
     """
+    return _registry.get_shared("supabase_service", _create_supabase_service_client)
+
+
+def _create_supabase_service_client():
     if not SUPABASE_URL:
         raise ValueError("Missing SUPABASE_URL environment variable")
     key = SUPABASE_SERVICE_ROLE_KEY or SUPABASE_KEY
@@ -69,9 +470,14 @@ def get_supabase_service_client():
     return create_client(SUPABASE_URL, key)
 
 
-def get_gmail_service():
+# Gmail credentials are loaded once and shared by every thread's Gmail service
+_gmail_creds = None
+_gmail_creds_lock = threading.Lock()
+
+
+def load_gmail_credentials():
     """
-    Authenticate with Gmail and return the service resource.
+    Load Gmail OAuth credentials, refreshing or re-authenticating as needed.
     
     Production Mode (Railway):
         - Reads GOOGLE_TOKEN_JSON env var for access/refresh tokens
@@ -149,14 +555,56 @@ def get_gmail_service():
         elif not creds and is_production:
             raise RuntimeError("No valid credentials in production. Check GOOGLE_TOKEN_JSON and GOOGLE_CREDENTIALS_JSON env vars.")
     
-    return build("gmail", "v1", credentials=creds)
+    return creds
+
+
+def _gmail_token_expiring(creds) -> bool:
+    """True if the access token is missing, expired, about to expire, or of unknown age."""
+    if not creds.token or not creds.expiry:
+        # Tokens loaded from GOOGLE_TOKEN_JSON carry no expiry; refresh once to learn it
+        return True
+    # google-auth stores expiry as a naive UTC datetime
+    return creds.expiry - GMAIL_TOKEN_REFRESH_MARGIN <= datetime.utcnow()
+
+
+def _get_gmail_credentials():
+    """Return the shared Gmail credentials, refreshing them shortly before expiry."""
+    global _gmail_creds
+    with _gmail_creds_lock:
+        if _gmail_creds is None:
+            _gmail_creds = load_gmail_credentials()
+        if _gmail_creds.refresh_token and _gmail_token_expiring(_gmail_creds):
+            log("INFO", "Gmail token expires soon, refreshing proactively...")
+            _gmail_creds.refresh(Request())
+        return _gmail_creds
+
+
+def get_gmail_service():
+    """
+    Return this thread's Gmail service resource.
+
+    The discovery-based service (and its httplib2 connection) is built once per
+    thread, since httplib2 is not thread-safe; the OAuth credentials behind it are
+    shared process-wide and refreshed before they expire.
+    """
+    creds = _get_gmail_credentials()
+    return _registry.get_per_thread(
+        "gmail", lambda: build("gmail", "v1", credentials=creds, cache_discovery=False)
+    )
 
 
 def get_gemini_client():
-    """Configure and return the Google GenAI client."""
+    """Return the shared Google GenAI client."""
+    return _registry.get_shared("gemini", _create_gemini_client)
+
+
+def _create_gemini_client():
     if not GEMINI_API_KEY:
         raise ValueError("Missing GEMINI_API_KEY environment variable")
-    return genai.Client(api_key=GEMINI_API_KEY)
+    return genai.Client(
+        api_key=GEMINI_API_KEY,
+        http_options={"timeout": GEMINI_HTTP_TIMEOUT_SECONDS * 1000},
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,8 @@
+-- Durable cursors for the backend pipeline.
+-- Ingest stores the Gmail historyId here so each cycle only fetches messages
+-- added since the last sync instead of re-running the full label search.
+CREATE TABLE IF NOT EXISTS sync_state (
+  name TEXT PRIMARY KEY,
+  value TEXT NOT NULL,
+  updated_at TIMESTAMPTZ DEFAULT now()
+);
@@ -0,0 +1,14 @@
+-- Content-addressed resume store.
+-- Ingest keys each resume file by the SHA-256 of its bytes. The file lives once in
+-- the resumes bucket under sha256/<hash>.<ext>, and the extracted text is cached
+-- here, so a repeat application with the same CV skips both the upload and the
+-- Gemini text extraction.
+CREATE TABLE IF NOT EXISTS resume_blobs (
+  sha256 TEXT PRIMARY KEY,
+  storage_path TEXT,
+  resume_url TEXT,
+  content_type TEXT,
+  size_bytes INTEGER,
+  resume_text TEXT,
+  created_at TIMESTAMPTZ DEFAULT now()
+);
@@ -0,0 +1,19 @@
+-- Gemini Batch API grading jobs.
+-- When the NEW_APPLICATION backlog is large, the grader submits it as one or more
+-- Gemini batch jobs and moves those candidates to GRADING_BATCHED. Later cycles poll
+-- each pending job and apply its grades (or return the candidates to NEW_APPLICATION
+-- if the job fails).
+CREATE TABLE IF NOT EXISTS grading_batches (
+  id BIGSERIAL PRIMARY KEY,
+  batch_name TEXT UNIQUE NOT NULL,       -- Gemini batch job name (or local stand-in ID)
+  backend TEXT NOT NULL DEFAULT 'gemini', -- 'gemini' | 'local'
+  model TEXT NOT NULL,
+  candidate_ids JSONB NOT NULL,          -- candidate IDs in request order
+  state TEXT NOT NULL DEFAULT 'PENDING', -- PENDING | SUCCEEDED | FAILED
+  created_at TIMESTAMPTZ DEFAULT now(),
+  completed_at TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS grading_batches_pending_idx
+  ON grading_batches (created_at)
+  WHERE state = 'PENDING';
@@ -0,0 +1,22 @@
+-- Bulk grade write-back.
+-- The grader buffers grades and applies them in one call per flush. Each grade's
+-- metadata patch is merged into the row's current metadata server-side, so keys
+-- written concurrently by other stages are not lost. Only candidates still waiting
+-- for a grade are updated, so a late or duplicate grade can't overwrite one that has
+-- already moved on (e.g. to INVITE_SENT).
+--
+-- grades: [{"id": 1, "score": 72, "status": "GRADED", "metadata": {"grading_reasoning": "..."}}, ...]
+CREATE OR REPLACE FUNCTION apply_candidate_grades(grades JSONB)
+RETURNS INTEGER AS $$
+  WITH updated AS (
+    UPDATE candidates c
+    SET jd_match_score = g.score,
+        status = g.status,
+        metadata = COALESCE(c.metadata, '{}'::jsonb) || COALESCE(g.metadata, '{}'::jsonb)
+    FROM jsonb_to_recordset(grades) AS g(id BIGINT, score INTEGER, status TEXT, metadata JSONB)
+    WHERE c.id = g.id
+      AND c.status IN ('NEW_APPLICATION', 'GRADING_BATCHED')
+    RETURNING 1
+  )
+  SELECT count(*)::integer FROM updated;
+$$ LANGUAGE sql;
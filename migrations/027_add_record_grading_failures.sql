@@ -0,0 +1,25 @@
+-- Grading dead-letter queue.
+-- Each failed grading attempt bumps metadata.grading_attempts and records the error.
+-- After max_attempts failures the candidate moves to GRADING_FAILED, so a resume that
+-- can't be graded stops being retried (and re-uploaded to Gemini) every cycle.
+--
+-- failures: [{"id": 1, "error": "..."}, ...]
+-- Returns the number of candidates moved to GRADING_FAILED.
+CREATE OR REPLACE FUNCTION record_grading_failures(failures JSONB, max_attempts INTEGER)
+RETURNS INTEGER AS $$
+  WITH updated AS (
+    UPDATE candidates c
+    SET metadata = COALESCE(c.metadata, '{}'::jsonb) || jsonb_build_object(
+          'grading_attempts', COALESCE((c.metadata->>'grading_attempts')::integer, 0) + 1,
+          'last_grading_error', left(f.error, 500)
+        ),
+        status = CASE
+          WHEN COALESCE((c.metadata->>'grading_attempts')::integer, 0) + 1 >= max_attempts THEN 'GRADING_FAILED'
+          ELSE c.status
+        END
+    FROM jsonb_to_recordset(failures) AS f(id BIGINT, error TEXT)
+    WHERE c.id = f.id AND c.status = 'NEW_APPLICATION'
+    RETURNING c.status
+  )
+  SELECT count(*)::integer FROM updated WHERE status = 'GRADING_FAILED';
+$$ LANGUAGE sql;
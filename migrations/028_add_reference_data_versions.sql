@@ -0,0 +1,11 @@
+-- Version tracking for reference data cached by the backend (backend/reference_data.py).
+-- The cache revalidates each table with a (row count, max updated_at) check, so every
+-- table it caches needs an updated_at that moves on every edit.
+
+-- prompts already has updated_at, but nothing kept it current on UPDATE
+DROP TRIGGER IF EXISTS update_prompts_updated_at ON prompts;
+
+CREATE TRIGGER update_prompts_updated_at
+    BEFORE UPDATE ON prompts
+    FOR EACH ROW
+    EXECUTE FUNCTION update_updated_at_column();
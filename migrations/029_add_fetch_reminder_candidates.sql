@@ -0,0 +1,55 @@
+-- Reminder eligibility evaluated in the database.
+-- The mailer used to pull every INVITE_SENT / ROUND_2_INVITED candidate each cycle and
+-- filter job activity, invite age, reminder gap and local business hours in Python.
+-- fetch_reminder_candidates returns only the eligible rows, longest-waiting first,
+-- capped at max_rows, in the shape the mailer already uses (job fields under "jobs").
+--
+-- location_timezones: [["dubai", "Asia/Dubai"], ...] - the first keyword found in the
+-- lowercased job location picks the timezone; no match means UTC.
+
+-- Walk the invited candidates in waiting order and stop at LIMIT
+CREATE INDEX IF NOT EXISTS candidates_reminder_queue_idx
+  ON candidates ((COALESCE(reminder_sent_at, invite_sent_at)), invite_sent_at)
+  WHERE status IN ('INVITE_SENT', 'ROUND_2_INVITED') AND invite_sent_at IS NOT NULL;
+
+CREATE OR REPLACE FUNCTION fetch_reminder_candidates(
+  start_hours INTEGER,
+  min_gap_hours INTEGER,
+  max_rows INTEGER,
+  location_timezones JSONB DEFAULT '[]'::jsonb,
+  local_start_hour INTEGER DEFAULT 0,
+  local_end_hour INTEGER DEFAULT 24
+)
+RETURNS SETOF JSONB AS $$
+  SELECT jsonb_build_object(
+    'id', c.id,
+    'email', c.email,
+    'full_name', c.full_name,
+    'interview_token', c.interview_token,
+    'status', c.status,
+    'invite_sent_at', c.invite_sent_at,
+    'reminder_sent_at', c.reminder_sent_at,
+    'current_stage', c.current_stage,
+    'job_id', c.job_id,
+    'jobs', jsonb_build_object('is_active', j.is_active, 'location', j.location)
+  )
+  FROM candidates c
+  JOIN jobs j ON j.id = c.job_id AND j.is_active
+  LEFT JOIN LATERAL (
+    SELECT t.pair->>1 AS name
+    FROM jsonb_array_elements(location_timezones) WITH ORDINALITY AS t(pair, position)
+    WHERE lower(COALESCE(j.location, '')) LIKE '%' || (t.pair->>0) || '%'
+    ORDER BY t.position
+    LIMIT 1
+  ) tz ON true
+  WHERE c.status IN ('INVITE_SENT', 'ROUND_2_INVITED')
+    AND c.invite_sent_at IS NOT NULL
+    AND c.created_at IS NOT NULL
+    AND c.interview_token IS NOT NULL
+    AND c.invite_sent_at <= now() - make_interval(hours => start_hours)
+    AND (c.reminder_sent_at IS NULL OR c.reminder_sent_at <= now() - make_interval(hours => min_gap_hours))
+    AND extract(hour FROM now() AT TIME ZONE COALESCE(tz.name, 'UTC')) >= local_start_hour
+    AND extract(hour FROM now() AT TIME ZONE COALESCE(tz.name, 'UTC')) < local_end_hour
+  ORDER BY COALESCE(c.reminder_sent_at, c.invite_sent_at)
+  LIMIT max_rows;
+$$ LANGUAGE sql STABLE;
@@ -0,0 +1,174 @@
+-- Persistent delayed-action queue for the mailer.
+-- Every time-based send (interview invite, Round 2 invite, reminder) is a row with an
+-- absolute due_at. The mailer fetches only due PENDING rows and sleeps until the next
+-- due_at, instead of re-evaluating time predicates over whole tables every cycle.
+--
+-- Invites and Round 2 invites are enqueued by the trigger below as candidates change
+-- status, using the thresholds the mailer last published to scheduler_settings.
+-- Reminders are enqueued by the mailer (backend/scheduler.py) after each invite or
+-- reminder it sends, with due_at already moved into the candidate's local business
+-- hours. reconcile_scheduled_actions() re-enqueues anything missing (rows that predate
+-- this migration, or edits that bypassed the trigger).
+--
+-- Eligibility here must stay identical to action_still_valid() in backend/mailer.py:
+-- anything the mailer would cancel must not be enqueued again.
+CREATE TABLE IF NOT EXISTS scheduled_actions (
+  id BIGSERIAL PRIMARY KEY,
+  candidate_id BIGINT NOT NULL REFERENCES candidates(id) ON DELETE CASCADE,
+  action TEXT NOT NULL,                   -- 'invite' | 'round_2_invite' | 'reminder'
+  due_at TIMESTAMPTZ NOT NULL,
+  status TEXT NOT NULL DEFAULT 'PENDING', -- PENDING | DONE | CANCELLED | FAILED
+  attempts INTEGER NOT NULL DEFAULT 0,
+  created_at TIMESTAMPTZ DEFAULT now(),
+  completed_at TIMESTAMPTZ
+);
+
+-- The due queue: next due_at and everything due, in order
+CREATE INDEX IF NOT EXISTS scheduled_actions_due_idx
+  ON scheduled_actions (due_at)
+  WHERE status = 'PENDING';
+
+-- At most one pending action of each kind per candidate
+CREATE UNIQUE INDEX IF NOT EXISTS scheduled_actions_pending_uniq
+  ON scheduled_actions (candidate_id, action)
+  WHERE status = 'PENDING';
+
+-- Enqueue pending actions, or move the due_at of ones already pending.
+-- actions: [{"candidate_id": 1, "action": "reminder", "due_at": "2026-01-01T09:00:00Z"}, ...]
+CREATE OR REPLACE FUNCTION schedule_actions(actions JSONB)
+RETURNS VOID AS $$
+  INSERT INTO scheduled_actions (candidate_id, action, due_at)
+  SELECT a.candidate_id, a.action, a.due_at
+  FROM jsonb_to_recordset(actions) AS a(candidate_id BIGINT, action TEXT, due_at TIMESTAMPTZ)
+  ON CONFLICT (candidate_id, action) WHERE status = 'PENDING'
+  DO UPDATE SET due_at = EXCLUDED.due_at;
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION schedule_action(p_candidate_id BIGINT, p_action TEXT, p_due_at TIMESTAMPTZ)
+RETURNS VOID AS $$
+  SELECT schedule_actions(jsonb_build_array(
+    jsonb_build_object('candidate_id', p_candidate_id, 'action', p_action, 'due_at', p_due_at)
+  ));
+$$ LANGUAGE sql;
+
+-- Thresholds for the trigger, published by the mailer (backend/mailer.py MIN_SCORE,
+-- INVITE_DELAY_HOURS) on every reconcile_scheduled_actions() call. Single row.
+CREATE TABLE IF NOT EXISTS scheduler_settings (
+  id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+  min_score INTEGER NOT NULL,
+  invite_delay_hours INTEGER NOT NULL,
+  updated_at TIMESTAMPTZ DEFAULT now()
+);
+
+CREATE OR REPLACE FUNCTION enqueue_candidate_actions()
+RETURNS TRIGGER AS $$
+DECLARE
+  settings scheduler_settings%ROWTYPE;
+BEGIN
+  IF TG_OP = 'UPDATE'
+     AND OLD.status IS NOT DISTINCT FROM NEW.status
+     AND OLD.round_2_invite_after IS NOT DISTINCT FROM NEW.round_2_invite_after
+     AND OLD.interview_token IS NOT DISTINCT FROM NEW.interview_token THEN
+    RETURN NEW;
+  END IF;
+
+  SELECT * INTO settings FROM scheduler_settings;
+  -- Until the mailer has published its settings, its first reconcile picks these up
+  IF NOT FOUND OR NEW.interview_token IS NULL THEN
+    RETURN NEW;
+  END IF;
+
+  IF NEW.status = 'GRADED' AND COALESCE(NEW.jd_match_score, 0) >= settings.min_score AND NEW.created_at IS NOT NULL THEN
+    PERFORM schedule_action(NEW.id, 'invite', NEW.created_at + make_interval(hours => settings.invite_delay_hours));
+  ELSIF NEW.status = 'FORM_COMPLETED' THEN
+    PERFORM schedule_action(NEW.id, 'invite', now());
+  ELSIF NEW.status = 'ROUND_2_APPROVED' AND NEW.round_2_invite_after IS NOT NULL THEN
+    PERFORM schedule_action(NEW.id, 'round_2_invite', NEW.round_2_invite_after);
+  END IF;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS candidates_enqueue_actions ON candidates;
+
+CREATE TRIGGER candidates_enqueue_actions
+    AFTER INSERT OR UPDATE OF status, round_2_invite_after, interview_token ON candidates
+    FOR EACH ROW
+    EXECUTE FUNCTION enqueue_candidate_actions();
+
+-- Safety net, run periodically by the mailer: publish the mailer's thresholds for the
+-- trigger, then enqueue every action the current candidate states call for but the queue
+-- lacks. What is already in the queue is respected:
+--   * invites and Round 2 invites happen once: any DONE or FAILED row for the candidate
+--     blocks them (DONE covers a send whose status update was lost, so nobody is emailed
+--     twice; FAILED keeps the attempt cap);
+--   * reminders recur, so only a FAILED or CANCELLED reminder completed since the
+--     candidate's current invite (invite_sent_at) and the job's last edit (jobs.updated_at,
+--     e.g. reactivation) blocks them.
+-- A CANCELLED invite doesn't block: eligibility here matches the mailer's, so anything
+-- wanted now would not be cancelled again. Reminder due times here are not business-hours
+-- adjusted; the mailer moves them into business hours when they come due.
+-- Returns the number of actions enqueued.
+DROP FUNCTION IF EXISTS reconcile_scheduled_actions(INTEGER, INTEGER);
+
+CREATE OR REPLACE FUNCTION reconcile_scheduled_actions(
+  min_score INTEGER,
+  invite_delay_hours INTEGER,
+  reminder_start_hours INTEGER,
+  reminder_gap_hours INTEGER
+)
+RETURNS INTEGER AS $$
+DECLARE
+  enqueued INTEGER;
+BEGIN
+  INSERT INTO scheduler_settings (id, min_score, invite_delay_hours, updated_at)
+  VALUES (TRUE, reconcile_scheduled_actions.min_score, reconcile_scheduled_actions.invite_delay_hours, now())
+  ON CONFLICT (id) DO UPDATE
+  SET min_score = EXCLUDED.min_score,
+      invite_delay_hours = EXCLUDED.invite_delay_hours,
+      updated_at = EXCLUDED.updated_at;
+
+  WITH wanted AS (
+    SELECT c.id, 'invite' AS action,
+           c.created_at + make_interval(hours => reconcile_scheduled_actions.invite_delay_hours) AS due_at,
+           NULL::timestamptz AS blocked_since
+    FROM candidates c
+    WHERE c.status = 'GRADED' AND COALESCE(c.jd_match_score, 0) >= reconcile_scheduled_actions.min_score
+      AND c.created_at IS NOT NULL AND c.interview_token IS NOT NULL
+    UNION ALL
+    SELECT c.id, 'invite', now(), NULL
+    FROM candidates c
+    WHERE c.status = 'FORM_COMPLETED' AND c.interview_token IS NOT NULL
+    UNION ALL
+    SELECT c.id, 'round_2_invite', c.round_2_invite_after, NULL
+    FROM candidates c
+    WHERE c.status = 'ROUND_2_APPROVED' AND c.round_2_invite_after IS NOT NULL AND c.interview_token IS NOT NULL
+    UNION ALL
+    SELECT c.id, 'reminder', GREATEST(
+      c.invite_sent_at + make_interval(hours => reminder_start_hours),
+      COALESCE(c.reminder_sent_at + make_interval(hours => reminder_gap_hours), '-infinity')
+    ), GREATEST(c.invite_sent_at, j.updated_at)
+    FROM candidates c
+    JOIN jobs j ON j.id = c.job_id AND j.is_active
+    WHERE c.status IN ('INVITE_SENT', 'ROUND_2_INVITED') AND c.invite_sent_at IS NOT NULL AND c.interview_token IS NOT NULL
+  ),
+  inserted AS (
+    INSERT INTO scheduled_actions (candidate_id, action, due_at)
+    SELECT w.id, w.action, w.due_at
+    FROM wanted w
+    WHERE NOT EXISTS (
+      SELECT 1 FROM scheduled_actions s
+      WHERE s.candidate_id = w.id AND s.action = w.action
+        AND (
+          s.status = 'PENDING'
+          OR (w.action <> 'reminder' AND s.status IN ('DONE', 'FAILED'))
+          OR (w.action = 'reminder' AND s.status IN ('FAILED', 'CANCELLED') AND s.completed_at >= w.blocked_since)
+        )
+    )
+    ON CONFLICT DO NOTHING
+    RETURNING 1
+  )
+  SELECT count(*)::integer INTO enqueued FROM inserted;
+  RETURN enqueued;
+END;
+$$ LANGUAGE plpgsql;
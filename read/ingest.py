@@ -4,7 +4,13 @@
 import os
 import sys
 import base64
+import hashlib
 import re
+import time
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timezone
 from pathlib import Path
 from email.utils import parseaddr
 
@@ -17,17 +23,60 @@ except ImportError:
 
 from supabase import create_client
 from google import genai
+from googleapiclient.errors import HttpError
 
 # Add parent directory to path so we can import from backend/utils.py
 sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
 
-from utils import get_gmail_service, get_supabase_client, get_gemini_client, log
+from utils import (
+    get_gmail_service,
+    get_supabase_client,
+    get_gemini_client,
+    log,
+    throttle_gmail,
+    throttle_gemini,
+    call_gemini,
+    delete_gemini_file,
+)
+from resume_text import extract_text, extract_text_from_docx, MIN_QUALITY_SCORE
+from grader import grade_pdf_tiers, grade_status, tier_metadata, fetch_cv_scoring_prompt
+from context_cache import CONTEXT_CACHE_MIN_CANDIDATES
+import reference_data
 
 load_dotenv()
 
 # --- Configuration ---
-GMAIL_QUERY = "label:Applications is:unread"
+GMAIL_LABEL_NAME = "Applications"
+GMAIL_QUERY = f"label:{GMAIL_LABEL_NAME} is:unread"
 DOWNLOADS_DIR = Path(__file__).parent / "downloads"
+# "incremental" follows the Gmail historyId cursor; "full" re-runs GMAIL_QUERY every cycle
+SYNC_MODE = os.getenv("INGEST_SYNC_MODE", "incremental")
+# sync_state row holding the last synced Gmail historyId
+HISTORY_CURSOR_NAME = "gmail_ingest_history_id"
+# Even in incremental mode, rescan the whole unread queue this often so messages that
+# were left unread (e.g. job not created yet) are still retried
+FULL_SCAN_INTERVAL_SECONDS = 60 * 60
+# Incremental passes that retry a message which failed to ingest; after that it waits
+# for the next full scan (it is still unread)
+MESSAGE_RETRY_ATTEMPTS = 5
+LIST_PAGE_SIZE = 500
+# Messages fetched per Gmail batch HTTP request (Gmail recommends at most 50)
+GMAIL_BATCH_SIZE = 50
+# Gmail batchModify accepts at most 1000 message IDs per call
+GMAIL_MODIFY_BATCH_SIZE = 1000
+# Emails per candidates.in_() existence query (keeps the request URL short)
+EXISTS_QUERY_CHUNK = 100
+# Applications whose resumes are downloaded, stored and parsed in parallel
+INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", "10"))
+# Rough Gemini input size of a resume PDF, used for TPM throttling (tokens)
+PDF_TOKEN_ESTIMATE = 3000
+# Grade PDF resumes during ingest, in the same Gemini call/upload used to read them,
+# so the grader never has to re-download and re-upload them
+INLINE_GRADING = os.getenv("INGEST_INLINE_GRADING", "0") == "1"
+# Fall back to trigram similarity when no job title matches exactly after normalization
+JOB_FUZZY_MATCH = os.getenv("JOB_FUZZY_MATCH", "1") == "1"
+# Minimum trigram (Jaccard) similarity for a fuzzy job title match
+JOB_FUZZY_MATCH_THRESHOLD = 0.8
 
 # Get Gemini client (will be initialized when needed)
 _gemini_client = None
@@ -41,32 +90,201 @@ def get_gemini():
     return _gemini_client
 
 
+_label_id = None
+_last_full_scan = None  # monotonic time of the last full scan; None = none yet, so one is due
+# Message id -> failed attempts, for messages the history cursor has already moved past
+_retry_message_ids = {}
+# Long-lived pool so worker threads keep their Gmail connections between cycles
+_ingest_pool = None
+
+
 # --- Gmail ---
 def fetch_unread_emails(gmail):
-    result = gmail.users().messages().list(userId="me", q=GMAIL_QUERY).execute()
-    return result.get("messages", [])
+    """Full scan: list every message matching GMAIL_QUERY, following all pages."""
+    messages = []
+    page_token = None
+    while True:
+        throttle_gmail("messages.list")
+        result = gmail.users().messages().list(
+            userId="me", q=GMAIL_QUERY, maxResults=LIST_PAGE_SIZE, pageToken=page_token
+        ).execute()
+        messages.extend(result.get("messages", []))
+        page_token = result.get("nextPageToken")
+        if not page_token:
+            return messages
 
 
-def get_sender(gmail, msg_id):
-    msg = gmail.users().messages().get(
-        userId="me", id=msg_id, format="metadata", metadataHeaders=["From"]
-    ).execute()
-    from_header = next(
-        (h["value"] for h in msg["payload"]["headers"] if h["name"] == "From"), ""
-    )
-    name, email = parseaddr(from_header)
+def get_label_id(gmail) -> str:
+    """Resolve the Applications label name to its Gmail label ID (cached)."""
+    global _label_id
+    if _label_id is None:
+        throttle_gmail("labels.list")
+        labels = gmail.users().labels().list(userId="me").execute().get("labels", [])
+        _label_id = next((l["id"] for l in labels if l["name"] == GMAIL_LABEL_NAME), None)
+        if not _label_id:
+            raise ValueError(f"Gmail label '{GMAIL_LABEL_NAME}' not found")
+    return _label_id
+
+
+def fetch_new_emails(gmail, start_history_id: str):
+    """
+    Incremental sync: return (messages, latest_history_id) for unread Applications
+    messages added since start_history_id. Returns None if the cursor has expired.
+    """
+    label_id = get_label_id(gmail)
+    messages = {}
+    latest_history_id = start_history_id
+    page_token = None
+
+    while True:
+        throttle_gmail("history.list")
+        try:
+            result = gmail.users().history().list(
+                userId="me",
+                startHistoryId=start_history_id,
+                labelId=label_id,
+                historyTypes=["messageAdded", "labelAdded"],
+                maxResults=LIST_PAGE_SIZE,
+                pageToken=page_token,
+            ).execute()
+        except HttpError as e:
+            # Gmail only keeps about a week of history; older cursors return 404
+            if e.resp.status == 404:
+                return None
+            raise
+
+        for record in result.get("history", []):
+            added = record.get("messagesAdded", []) + record.get("labelsAdded", [])
+            for item in added:
+                msg = item["message"]
+                labels = msg.get("labelIds", [])
+                if label_id in labels and "UNREAD" in labels:
+                    messages[msg["id"]] = {"id": msg["id"], "threadId": msg.get("threadId")}
+
+        latest_history_id = result.get("historyId", latest_history_id)
+        page_token = result.get("nextPageToken")
+        if not page_token:
+            return list(messages.values()), latest_history_id
+
+
+def load_history_cursor(supabase) -> str | None:
+    """Return the stored Gmail historyId, or None (forcing a full scan) if there is none or it can't be read."""
+    try:
+        result = supabase.table("sync_state").select("value").eq("name", HISTORY_CURSOR_NAME).execute()
+    except Exception as e:
+        log("WARN", f"Could not read Gmail history cursor, doing a full scan: {e}")
+        return None
+    return result.data[0]["value"] if result.data else None
+
+
+def save_history_cursor(supabase, history_id: str):
+    supabase.table("sync_state").upsert({
+        "name": HISTORY_CURSOR_NAME,
+        "value": str(history_id),
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+    }).execute()
+
+
+def fetch_messages_to_ingest(gmail, supabase):
+    """
+    Return (messages, history_cursor) for this cycle.
+
+    Uses the stored historyId to fetch only newly added messages, falling back to a
+    paginated full scan when there is no cursor, the cursor has expired, or the
+    periodic rescan is due. The returned cursor should be saved once the cycle ends.
+    """
+    global _last_full_scan
+
+    full_scan_due = _last_full_scan is None or time.monotonic() - _last_full_scan >= FULL_SCAN_INTERVAL_SECONDS
+    if SYNC_MODE == "incremental" and not full_scan_due:
+        cursor = load_history_cursor(supabase)
+        if cursor:
+            result = fetch_new_emails(gmail, cursor)
+            if result is not None:
+                messages, latest = result
+                log("INFO", f"Incremental sync from historyId {cursor}: {len(messages)} new message(s)")
+                # Earlier failures are behind the cursor now, so they're fetched by id
+                new_ids = {m["id"] for m in messages}
+                retries = [{"id": msg_id} for msg_id in _retry_message_ids if msg_id not in new_ids]
+                if retries:
+                    log("INFO", f"Retrying {len(retries)} message(s) that failed to ingest earlier")
+                return messages + retries, latest
+            log("WARN", f"Gmail history cursor {cursor} expired — falling back to full scan")
+
+    # Take the cursor before scanning so nothing that arrives mid-scan is missed
+    throttle_gmail("getProfile")
+    history_id = gmail.users().getProfile(userId="me").execute().get("historyId")
+    messages = fetch_unread_emails(gmail)
+    _last_full_scan = time.monotonic()
+    # Failed messages are still unread, so the scan already covers them
+    _retry_message_ids.clear()
+    log("INFO", f"Full scan: {len(messages)} unread message(s)")
+    return messages, history_id
+
+
+def remember_failed_messages(failed_ids: set):
+    """
+    Queue this cycle's failed messages for the next incremental pass, which would
+    otherwise skip them until the next full scan. Messages that got through (or were
+    skipped on purpose) are dropped; each is retried MESSAGE_RETRY_ATTEMPTS times at most.
+    """
+    attempts = {msg_id: _retry_message_ids.get(msg_id, 0) + 1 for msg_id in failed_ids}
+    _retry_message_ids.clear()
+    for msg_id, count in attempts.items():
+        if count <= MESSAGE_RETRY_ATTEMPTS:
+            _retry_message_ids[msg_id] = count
+        else:
+            log("WARN", f"Message {msg_id} failed {count} times — leaving it for the next full scan")
+
+
+def load_messages(gmail, msg_ids: list[str]) -> dict:
+    """
+    Fetch each message once in format=full, many per round-trip via the Gmail batch
+    endpoint. Returns {msg_id: message}; messages that fail to load are logged and omitted.
+    """
+    loaded = {}
+
+    def on_response(request_id, response, exception):
+        if exception is not None:
+            log("ERROR", f"Failed to fetch message {request_id}: {exception}")
+            return
+        loaded[request_id] = response
+
+    for i in range(0, len(msg_ids), GMAIL_BATCH_SIZE):
+        chunk = msg_ids[i:i + GMAIL_BATCH_SIZE]
+        throttle_gmail("messages.get", len(chunk))
+        batch = gmail.new_batch_http_request(callback=on_response)
+        for msg_id in chunk:
+            batch.add(
+                gmail.users().messages().get(userId="me", id=msg_id, format="full"),
+                request_id=msg_id,
+            )
+        batch.execute()
+
+    return loaded
+
+
+def get_header(msg: dict, name: str) -> str:
+    """Return a header value from a loaded message, or empty string."""
+    headers = msg.get("payload", {}).get("headers", [])
+    return next((h["value"] for h in headers if h["name"].lower() == name.lower()), "")
+
+
+def iter_parts(payload: dict):
+    """Yield every MIME part of a message payload, depth-first (including nested multiparts)."""
+    yield payload
+    for part in payload.get("parts", []):
+        yield from iter_parts(part)
+
+
+def get_sender(msg: dict):
+    name, email = parseaddr(get_header(msg, "From"))
     return email, name or "Unknown"
 
 
-def get_email_subject(gmail, msg_id) -> str:
+def get_email_subject(msg: dict) -> str:
     """Extract the subject line from an email."""
-    msg = gmail.users().messages().get(
-        userId="me", id=msg_id, format="metadata", metadataHeaders=["Subject"]
-    ).execute()
-    subject = next(
-        (h["value"] for h in msg["payload"]["headers"] if h["name"] == "Subject"), ""
-    )
-    return subject
+    return get_header(msg, "Subject")
 
 
 def parse_job_title_from_subject(subject: str) -> str | None:
@@ -97,21 +315,9 @@ def parse_name_from_subject(subject: str) -> str | None:
     return None
 
 
-def get_email_body(gmail, msg_id) -> str:
+def get_email_body(msg: dict) -> str:
     """Extract the plain text body from an email."""
-    msg = gmail.users().messages().get(userId="me", id=msg_id, format="full").execute()
-    
-    payload = msg.get("payload", {})
-    
-    # Check for plain text body directly
-    if payload.get("mimeType") == "text/plain":
-        data = payload.get("body", {}).get("data", "")
-        if data:
-            return base64.urlsafe_b64decode(data).decode("utf-8")
-    
-    # Check parts for multipart messages
-    parts = payload.get("parts", [])
-    for part in parts:
+    for part in iter_parts(msg.get("payload", {})):
         if part.get("mimeType") == "text/plain":
             data = part.get("body", {}).get("data", "")
             if data:
@@ -148,55 +354,68 @@ def parse_candidate_email_from_body(body: str) -> str | None:
     return None
 
 
-def download_resume(gmail, msg_id, filename_prefix):
-    """Download resume attachment (PDF, DOCX, DOC)."""
-    msg = gmail.users().messages().get(userId="me", id=msg_id, format="full").execute()
-    parts = msg.get("payload", {}).get("parts", [])
-    
+def download_resume(gmail, msg: dict, filename_prefix):
+    """Download resume attachment (PDF, DOCX, DOC) from an already-loaded message."""
     # Supported resume formats
     valid_extensions = ('.pdf', '.docx', '.doc')
 
-    for part in parts:
+    for part in iter_parts(msg.get("payload", {})):
         filename = part.get("filename", "")
         if not filename.lower().endswith(valid_extensions):
             continue
 
-        att_id = part.get("body", {}).get("attachmentId")
-        if not att_id:
-            continue
-
-        attachment = gmail.users().messages().attachments().get(
-            userId="me", messageId=msg_id, id=att_id
-        ).execute()
+        body = part.get("body", {})
+        data = body.get("data")
+        if not data:
+            att_id = body.get("attachmentId")
+            if not att_id:
+                continue
+            throttle_gmail("attachments.get")
+            data = gmail.users().messages().attachments().get(
+                userId="me", messageId=msg["id"], id=att_id
+            ).execute()["data"]
 
         # Keep original extension
         ext = Path(filename).suffix.lower()
         safe_name = re.sub(r"[^\w\-_.]", "_", filename_prefix)
-        filepath = DOWNLOADS_DIR / f"{safe_name}_resume{ext}"
-        filepath.write_bytes(base64.urlsafe_b64decode(attachment["data"]))
+        # Message ID keeps parallel downloads for candidates with the same name apart
+        filepath = DOWNLOADS_DIR / f"{safe_name}_{msg['id']}_resume{ext}"
+        filepath.write_bytes(base64.urlsafe_b64decode(data))
         return filepath
 
     return None
 
 
-def mark_as_read(gmail, msg_id):
-    gmail.users().messages().modify(
-        userId="me", id=msg_id, body={"removeLabelIds": ["UNREAD"]}
-    ).execute()
+def mark_as_read(gmail, msg_ids: list[str]):
+    """Clear UNREAD on many messages at once via batchModify."""
+    for i in range(0, len(msg_ids), GMAIL_MODIFY_BATCH_SIZE):
+        throttle_gmail("messages.batchModify")
+        gmail.users().messages().batchModify(
+            userId="me",
+            body={"ids": msg_ids[i:i + GMAIL_MODIFY_BATCH_SIZE], "removeLabelIds": ["UNREAD"]},
+        ).execute()
 
 
-# --- Resume Parsing with Gemini ---
-def extract_text_from_docx(filepath):
-    """Extract text from a DOCX file using python-docx."""
-    from docx import Document
-    doc = Document(filepath)
-    full_text = []
-    for para in doc.paragraphs:
-        full_text.append(para.text)
-    return '\n'.join(full_text)
+# --- Resume Parsing ---
+def extract_resume_text_locally(filepath) -> str | None:
+    """Return locally extracted resume text if it's good enough to skip Gemini, else None."""
+    try:
+        text, score = extract_text(filepath)
+        if score >= MIN_QUALITY_SCORE:
+            log("INFO", f"Extracted {len(text)} chars locally (quality {score:.2f}): {filepath}")
+            return text
+        log("INFO", f"Local extraction quality {score:.2f} < {MIN_QUALITY_SCORE} — using Gemini")
+    except Exception as e:
+        log("WARN", f"Local text extraction failed, using Gemini: {e}")
+    return None
 
 
 def parse_resume(filepath):
+    """Return resume text: extracted locally when the text layer is good, otherwise via Gemini."""
+    text = extract_resume_text_locally(filepath)
+    if text:
+        return text
+
     log("INFO", f"Parsing resume with Gemini: {filepath}")
     
     gemini_client = get_gemini()
@@ -209,10 +428,11 @@ def parse_resume(filepath):
             log("INFO", f"Extracted {len(raw_text)} chars from {ext} file")
             
             # Use Gemini to clean up and structure the text
-            response = gemini_client.models.generate_content(
+            throttle_gemini(len(raw_text) // 4)
+            response = call_gemini(lambda: gemini_client.models.generate_content(
                 model="gemini-2.5-flash",
                 contents=f"Clean up and format this resume text. Return it in a readable format:\n\n{raw_text}"
-            )
+            ), "Resume cleanup")
             return response.text
         except Exception as e:
             log("ERROR", f"Failed to extract text from {ext}: {e}")
@@ -220,79 +440,203 @@ def parse_resume(filepath):
     
     # Handle PDF files - upload to Gemini
     elif ext == ".pdf":
-        uploaded_file = gemini_client.files.upload(file=filepath, config={"mime_type": "application/pdf"})
-        
-        response = gemini_client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=[
-                uploaded_file,
-                "Extract all text content from this resume PDF. Return the full text in a clean, readable format."
-            ]
+        uploaded_file = call_gemini(
+            lambda: gemini_client.files.upload(file=filepath, config={"mime_type": "application/pdf"}), "PDF upload"
         )
-        
-        # Clean up uploaded file
-        gemini_client.files.delete(name=uploaded_file.name)
+        try:
+            throttle_gemini(PDF_TOKEN_ESTIMATE)
+            response = call_gemini(lambda: gemini_client.models.generate_content(
+                model="gemini-2.5-flash",
+                contents=[
+                    uploaded_file,
+                    "Extract all text content from this resume PDF. Return the full text in a clean, readable format."
+                ]
+            ), "Resume transcription")
+        finally:
+            # Clean up uploaded file, even when transcription failed
+            delete_gemini_file(gemini_client, uploaded_file.name)
         return response.text
     
     else:
         raise ValueError(f"Unsupported file type: {ext}")
 
 
+def parse_and_grade_resume(filepath, job_description: str, job_id=None) -> tuple[str, dict, str]:
+    """
+    Read and grade a PDF resume the way the grader does (model cascade, grade cache and,
+    with job_id, the job's context cache), with a single Gemini upload. The text is
+    transcribed by Gemini only when the local text layer isn't usable.
+    Returns (resume_text, {"score", "reasoning"}, grading tier).
+    """
+    local_text = extract_resume_text_locally(filepath)
+
+    log("INFO", f"Grading resume with Gemini during ingest: {filepath}")
+    throttle_gemini(PDF_TOKEN_ESTIMATE)
+    result, tier = grade_pdf_tiers(
+        get_gemini(), Path(filepath).read_bytes(), job_description, job_id=job_id, include_text=not local_text
+    )
+    return local_text or result["resume_text"], result, tier
+
+
 # --- Supabase ---
-def candidate_exists(supabase, email):
-    result = supabase.table("candidates").select("id").eq("email", email).execute()
-    return len(result.data) > 0
+def find_existing_emails(supabase, emails: list[str]) -> set[str]:
+    """Return the subset of emails that already have a candidate row."""
+    existing = set()
+    unique = list(dict.fromkeys(emails))
+    for i in range(0, len(unique), EXISTS_QUERY_CHUNK):
+        result = (
+            supabase.table("candidates")
+            .select("email")
+            .in_("email", unique[i:i + EXISTS_QUERY_CHUNK])
+            .execute()
+        )
+        existing.update(row["email"] for row in result.data or [])
+    return existing
+
+
+def normalize_title(title: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace: 'Sr. Designer\n(Dubai)' -> 'sr designer dubai'."""
+    return " ".join(re.sub(r"[^\w\s]", " ", (title or "").lower()).split())
+
+
+def title_trigrams(normalized: str) -> set[str]:
+    padded = f"  {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class JobIndex:
+    """
+    In-memory normalized-title → job index for routing applications.
+
+    Built from the shared jobs reference cache (see reference_data), and rebuilt only
+    when that cache has loaded a new copy of the jobs table.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_title = {}
+        self._trigrams = []
+        self._rows = None
+        self._built_at = 0.0
+
+    def refresh(self, supabase):
+        """Rebuild the index if the cached jobs table changed."""
+        with self._lock:
+            rows = reference_data.jobs.rows(supabase)
+            if rows is self._rows:
+                return
+
+            by_title = {}
+            for job in rows:
+                normalized = normalize_title(job.get("title", ""))
+                if normalized:
+                    by_title.setdefault(normalized, job)
+
+            self._by_title = by_title
+            self._trigrams = [(title_trigrams(t), job) for t, job in by_title.items()]
+            self._rows = rows
+            self._built_at = time.monotonic()
+            log("INFO", f"Job index built: {len(by_title)} job title(s) (jobs version {reference_data.jobs.version})")
+
+    def ensure_built(self, supabase):
+        """Build the index on first use; later refreshes happen once per ingest cycle."""
+        if not self._built_at:
+            self.refresh(supabase)
+
+    def lookup(self, job_title: str) -> dict | None:
+        normalized = normalize_title(job_title)
+        job = self._by_title.get(normalized)
+        if job or not JOB_FUZZY_MATCH or not normalized:
+            return job
+
+        wanted = title_trigrams(normalized)
+        best_job, best_score = None, 0.0
+        for grams, candidate_job in self._trigrams:
+            score = len(wanted & grams) / len(wanted | grams)
+            if score > best_score:
+                best_job, best_score = candidate_job, score
+
+        if best_score >= JOB_FUZZY_MATCH_THRESHOLD:
+            log("INFO", f"Fuzzy-matched '{job_title}' to '{best_job['title'].strip()}' (similarity {best_score:.2f})")
+            return best_job
+        return None
+
+
+_job_index = JobIndex()
 
 
 def lookup_job(supabase, job_title: str) -> dict | None:
-    """Query jobs table and match title with whitespace/case normalization."""
-    # Normalize the extracted title
-    normalized_email_title = job_title.strip().lower()
-    
+    """Match an extracted job title against the jobs table via the cached title index."""
     log("DEBUG", f"Looking up job: '{job_title}'")
-    
-    # Fetch all jobs and match in Python (handles newlines, whitespace, case)
-    result = supabase.table("jobs").select("id, description, title").execute()
-    
-    if not result.data:
-        log("DEBUG", "No jobs found in database")
-        return None
-    
-    for job in result.data:
-        db_title = job.get("title", "")
-        normalized_db_title = db_title.strip().lower()
-        
-        if normalized_db_title == normalized_email_title:
-            log("DEBUG", f"Matched: '{db_title.strip()}'")
-            return job
-    
-    log("DEBUG", f"Extracted: '{job_title}' | No matching job in DB")
-    return None
 
+    _job_index.ensure_built(supabase)
 
-def upload_resume_to_storage(supabase, filepath, candidate_email):
-    """Upload the original resume file to Supabase Storage and return the public URL."""
-    import time
-    ext = Path(filepath).suffix.lower()
-    safe_email = re.sub(r"[^\w\-_.]", "_", candidate_email)
-    storage_path = f"{safe_email}_{int(time.time())}{ext}"
+    job = _job_index.lookup(job_title)
+    if job:
+        log("DEBUG", f"Matched: '{job['title'].strip()}'")
+    else:
+        log("DEBUG", f"Extracted: '{job_title}' | No matching job in DB")
+    return job
 
-    mime_types = {".pdf": "application/pdf", ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document", ".doc": "application/msword"}
-    content_type = mime_types.get(ext, "application/octet-stream")
 
-    with open(filepath, "rb") as f:
-        supabase.storage.from_("resumes").upload(
-            path=storage_path,
-            file=f,
-            file_options={"content-type": content_type},
-        )
+RESUME_MIME_TYPES = {
+    ".pdf": "application/pdf",
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    ".doc": "application/msword",
+}
+
+
+def upload_resume_to_storage(supabase, filepath, resume_data: bytes, digest: str):
+    """
+    Upload the original resume file to Supabase Storage under its content hash and
+    return (storage_path, public_url). Identical files always map to the same object.
+    """
+    ext = Path(filepath).suffix.lower()
+    storage_path = f"sha256/{digest}{ext}"
+    content_type = RESUME_MIME_TYPES.get(ext, "application/octet-stream")
+
+    supabase.storage.from_("resumes").upload(
+        path=storage_path,
+        file=resume_data,
+        file_options={"content-type": content_type, "upsert": "true"},
+    )
 
     public_url = supabase.storage.from_("resumes").get_public_url(storage_path)
     log("INFO", f"Uploaded resume to storage: {storage_path}")
-    return public_url
+    return storage_path, public_url
+
+
+def fetch_resume_blob(supabase, digest: str) -> dict | None:
+    """
+    Return the stored file and cached text for a resume hash, if we've seen it before.
+    A failed lookup is treated as a miss, so ingestion still works without the cache.
+    """
+    try:
+        result = (
+            supabase.table("resume_blobs")
+            .select("sha256, storage_path, resume_url, resume_text")
+            .eq("sha256", digest)
+            .execute()
+        )
+    except Exception as e:
+        log("WARN", f"Resume cache lookup failed for {digest[:12]}, processing it from scratch: {e}")
+        return None
+    return result.data[0] if result.data else None
 
 
-def save_candidate(supabase, email, name, resume_text, gmail_msg_id, job_id, job_description, resume_url=None):
+def save_resume_blob(supabase, digest: str, filepath, size_bytes: int, storage_path, resume_url, resume_text: str):
+    supabase.table("resume_blobs").upsert({
+        "sha256": digest,
+        "storage_path": storage_path,
+        "resume_url": resume_url,
+        "content_type": RESUME_MIME_TYPES.get(Path(filepath).suffix.lower(), "application/octet-stream"),
+        "size_bytes": size_bytes,
+        "resume_text": resume_text,
+    }).execute()
+
+
+def build_candidate_row(email, name, resume_text, gmail_msg_id, job_id, job_description, resume_url=None, grade=None,
+                        grade_metadata=None) -> dict:
     data = {
         "email": email,
         "full_name": name,
@@ -304,21 +648,57 @@ def save_candidate(supabase, email, name, resume_text, gmail_msg_id, job_id, job
     }
     if resume_url:
         data["resume_url"] = resume_url
-    supabase.table("candidates").insert(data).execute()
+    if grade:
+        # Already graded in the ingest pass — goes straight to the mailer/rejection
+        score = grade.get("score", 0)
+        data["jd_match_score"] = score
+        data["status"] = grade_status(score)
+        data["metadata"]["grading_reasoning"] = grade.get("reasoning", "No reasoning provided")
+        data["metadata"]["graded_at_ingest"] = True
+        # Same keys the grader records (grading_tier, grading_model, cv_prompt_version)
+        data["metadata"].update(grade_metadata or {})
+    return data
+
+
+def save_candidates(supabase, rows: list[dict]) -> list[dict]:
+    """
+    Insert candidate rows in one request. If the bulk insert is rejected, fall back to
+    row-by-row inserts so one bad row does not lose the rest. Returns the rows saved.
+    """
+    if not rows:
+        return []
+    try:
+        supabase.table("candidates").insert(rows).execute()
+        return rows
+    except Exception as e:
+        log("WARN", f"Bulk insert of {len(rows)} candidate(s) failed, retrying one by one: {e}")
+
+    saved = []
+    for row in rows:
+        try:
+            supabase.table("candidates").insert(row).execute()
+            saved.append(row)
+        except Exception as e:
+            log("ERROR", f"Failed to save {row['email']}: {e}")
+    return saved
 
 
 # --- Main Processing ---
-def process_email(gmail, supabase, msg_id):
-    sender_email, sender_name = get_sender(gmail, msg_id)
+def parse_application(supabase, msg: dict) -> dict | None:
+    """
+    Route an application email to its job and work out the candidate's name and email.
+    Returns None (leaving the email unread) if the subject or job can't be matched.
+    """
+    sender_email, sender_name = get_sender(msg)
     log("INFO", f"Processing email from {sender_email}...")
 
     # --- Job Router Logic ---
-    subject = get_email_subject(gmail, msg_id)
+    subject = get_email_subject(msg)
     job_title = parse_job_title_from_subject(subject)
     
     if not job_title:
         log("ERROR", f"Could not parse job title from subject: '{subject}'")
-        return
+        return None
     
     # Parse candidate name from subject
     name = parse_name_from_subject(subject)
@@ -328,7 +708,7 @@ def process_email(gmail, supabase, msg_id):
     
     # --- Extract REAL candidate email from body ---
     # Betterteam emails come from noreply@betterteam.com, but contain the actual email in body
-    email_body = get_email_body(gmail, msg_id)
+    email_body = get_email_body(msg)
     candidate_email = parse_candidate_email_from_body(email_body)
     
     if candidate_email:
@@ -344,42 +724,89 @@ def process_email(gmail, supabase, msg_id):
     
     if not job:
         log("ERROR", f"CRITICAL: Job '{job_title}' not found in DB. Skipping candidate.")
-        return
+        return None
     
     log("INFO", f"Matched job: {job_title} (ID: {job['id']}) | Candidate: {name} <{email}>")
     # --- End Job Router ---
 
-    if candidate_exists(supabase, email):
-        log("INFO", f"{email} already exists, skipping")
-        mark_as_read(gmail, msg_id)
-        return
+    return {"msg": msg, "email": email, "name": name, "job": job, "job_title": job_title}
 
-    filepath = download_resume(gmail, msg_id, name or email)
+
+def prepare_candidate(supabase, application: dict, prompt_version=None, cache_jobs=frozenset()) -> dict | None:
+    """
+    Download, store and parse the resume for a new application and return the
+    candidate row to insert. Returns None (leaving the email unread) if there's no resume.
+    Runs on an ingest worker thread, so it uses that thread's own Gmail service.
+    With INLINE_GRADING, prompt_version is recorded on the grade and jobs in cache_jobs
+    grade through their Gemini context cache.
+    """
+    gmail = get_gmail_service()
+    msg, email, name, job = application["msg"], application["email"], application["name"], application["job"]
+
+    filepath = download_resume(gmail, msg, name or email)
     if not filepath:
         log("WARN", f"No resume attachment (PDF/DOCX/DOC) for {email}, skipping")
-        return
+        return None
 
-    # Upload original file to Supabase Storage
-    resume_url = None
     try:
-        resume_url = upload_resume_to_storage(supabase, filepath, email)
-    except Exception as e:
-        log("WARN", f"Failed to upload resume to storage: {e} — continuing with text extraction")
+        resume_data = filepath.read_bytes()
+        digest = hashlib.sha256(resume_data).hexdigest()
+
+        # Same CV seen before (reapplication, or several roles): reuse file and text
+        blob = fetch_resume_blob(supabase, digest)
+        if blob and blob.get("resume_url") and blob.get("resume_text"):
+            log("INFO", f"Resume {digest[:12]} already stored for {email} — skipping upload and parsing")
+            return build_candidate_row(
+                email, name, blob["resume_text"], msg["id"], job["id"], job["description"], blob["resume_url"]
+            )
+
+        # Upload original file to Supabase Storage
+        storage_path = blob.get("storage_path") if blob else None
+        resume_url = blob.get("resume_url") if blob else None
+        if not resume_url:
+            try:
+                storage_path, resume_url = upload_resume_to_storage(supabase, filepath, resume_data, digest)
+            except Exception as e:
+                log("WARN", f"Failed to upload resume to storage: {e} — continuing with text extraction")
+
+        grade, grade_metadata = None, None
+        cached_text = (blob or {}).get("resume_text")
+        if INLINE_GRADING and Path(filepath).suffix.lower() == ".pdf":
+            cache_job_id = job["id"] if job["id"] in cache_jobs else None
+            resume_text, grade, tier = parse_and_grade_resume(filepath, job["description"], cache_job_id)
+            resume_text = cached_text or resume_text
+            grade_metadata = {**tier_metadata(tier), "cv_prompt_version": prompt_version}
+        else:
+            resume_text = cached_text or parse_resume(filepath)
 
-    resume_text = parse_resume(filepath)
-    save_candidate(supabase, email, name, resume_text, msg_id, job["id"], job["description"], resume_url)
-    mark_as_read(gmail, msg_id)
+        try:
+            save_resume_blob(supabase, digest, filepath, len(resume_data), storage_path, resume_url, resume_text)
+        except Exception as e:
+            log("WARN", f"Failed to cache resume {digest[:12]}: {e}")
+    finally:
+        # Cleanup downloaded file
+        filepath.unlink(missing_ok=True)
+
+    return build_candidate_row(
+        email, name, resume_text, msg["id"], job["id"], job["description"], resume_url, grade, grade_metadata
+    )
 
-    # Cleanup downloaded file
-    filepath.unlink(missing_ok=True)
 
-    log("INFO", f"Saved {name} <{email}> for job: {job_title}")
+def get_ingest_pool() -> ThreadPoolExecutor:
+    global _ingest_pool
+    if _ingest_pool is None:
+        _ingest_pool = ThreadPoolExecutor(max_workers=INGEST_CONCURRENCY, thread_name_prefix="ingest")
+    return _ingest_pool
 
 
 def run_ingest() -> int:
     """
     Main ingest function - can be called from other modules.
-    Returns the number of emails processed.
+    Returns the number of candidates saved.
+
+    Each cycle works in bulk: load all messages, check every candidate email for
+    duplicates in one query, insert the new candidates in one request and clear
+    UNREAD on all handled emails with a single batchModify.
     """
     log("INFO", "Starting email ingestion...")
     
@@ -387,23 +814,108 @@ def run_ingest() -> int:
     supabase = get_supabase_client()
     DOWNLOADS_DIR.mkdir(exist_ok=True)
 
-    messages = fetch_unread_emails(gmail)
+    messages, history_cursor = fetch_messages_to_ingest(gmail, supabase)
+    failed_ids = set()
     log("INFO", f"Found {len(messages)} unread application(s)")
 
     if not messages:
+        if history_cursor:
+            save_history_cursor(supabase, history_cursor)
         return 0
 
-    success, failed = 0, 0
-    for msg in messages:
+    _job_index.refresh(supabase)
+
+    msg_ids = [m["id"] for m in messages]
+    loaded = load_messages(gmail, msg_ids)
+    failed_ids.update(msg_id for msg_id in msg_ids if msg_id not in loaded)
+
+    # --- Route every email to a job ---
+    applications = []
+    for msg_id in msg_ids:
+        msg = loaded.get(msg_id)
+        if not msg:
+            continue
         try:
-            process_email(gmail, supabase, msg["id"])
-            success += 1
+            application = parse_application(supabase, msg)
+            if application:
+                applications.append(application)
         except Exception as e:
-            log("ERROR", f"Failed to process {msg['id']}: {e}")
-            failed += 1
-
-    log("INFO", f"Ingestion complete: {success} succeeded, {failed} failed")
-    return success
+            log("ERROR", f"Failed to process {msg_id}: {e}")
+            failed_ids.add(msg_id)
+
+    # --- Drop duplicates (already in DB, or repeated within this batch) ---
+    existing = find_existing_emails(supabase, [a["email"] for a in applications])
+    read_ids = []
+    new_applications = []
+    # Repeats within this batch only count as duplicates once one of them is saved
+    repeats = {}
+    for application in applications:
+        email = application["email"]
+        if email in existing:
+            log("INFO", f"{email} already exists, skipping")
+            read_ids.append(application["msg"]["id"])
+        elif email in repeats:
+            repeats[email].append(application)
+        else:
+            repeats[email] = []
+            new_applications.append(application)
+
+    # --- Download, store and parse resumes (in parallel) ---
+    prompt_version, cache_jobs = None, set()
+    if INLINE_GRADING:
+        prompt_version = fetch_cv_scoring_prompt(supabase)[1]
+        # Like the grader, only build a job's context cache when several resumes share it
+        job_counts = Counter(application["job"]["id"] for application in new_applications)
+        cache_jobs = {job_id for job_id, count in job_counts.items() if count >= CONTEXT_CACHE_MIN_CANDIDATES}
+
+    rows = []
+    pool = get_ingest_pool()
+    futures = {
+        pool.submit(prepare_candidate, supabase, application, prompt_version, cache_jobs): application
+        for application in new_applications
+    }
+    while futures:
+        done, _ = wait(futures, return_when=FIRST_COMPLETED)
+        for future in done:
+            application = futures.pop(future)
+            row = None
+            try:
+                row = future.result()
+            except Exception as e:
+                log("ERROR", f"Failed to process {application['msg']['id']}: {e}")
+                failed_ids.add(application["msg"]["id"])
+            if row:
+                rows.append(row)
+            elif repeats[application["email"]]:
+                # Fall back to the applicant's next email in this batch (e.g. the one with the resume)
+                retry = repeats[application["email"]].pop(0)
+                log("INFO", f"Trying {application['email']}'s next application in this batch instead")
+                futures[pool.submit(prepare_candidate, supabase, retry, prompt_version, cache_jobs)] = retry
+
+    # --- Save and mark as read in bulk ---
+    saved = save_candidates(supabase, rows)
+    failed_ids.update(
+        {row["metadata"]["gmail_message_id"] for row in rows} - {row["metadata"]["gmail_message_id"] for row in saved}
+    )
+    for row in saved:
+        log("INFO", f"Saved {row['full_name']} <{row['email']}>")
+        read_ids.append(row["metadata"]["gmail_message_id"])
+        duplicates = repeats.get(row["email"], [])
+        if duplicates:
+            log("INFO", f"{row['email']} applied {len(duplicates)} more time(s) in this batch, skipping")
+            read_ids.extend(application["msg"]["id"] for application in duplicates)
+    # Repeats of an application that wasn't saved stay unread, so a later cycle can take them instead
+
+    if read_ids:
+        mark_as_read(gmail, read_ids)
+
+    if history_cursor:
+        save_history_cursor(supabase, history_cursor)
+    remember_failed_messages(failed_ids)
+
+    log("INFO", f"Ingestion complete: {len(saved)} saved, {len(read_ids) - len(saved)} duplicate(s), "
+                f"{len(failed_ids)} failed")
+    return len(saved)
 
 
 def main():
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Local resume text extraction for born-digital PDFs and DOCX files, with a quality score.
+
+ingest.py uses this as a fast path: when the local text scores well, Gemini is not
+called at all. Scanned PDFs (no text layer) and garbled extractions score low and
+fall back to Gemini.
+"""
+
+import re
+import sys
+from pathlib import Path
+
+# pypdf is optional - without it every PDF falls back to Gemini
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+# --- Configuration ---
+# Extracted text needs at least this score (0-1) to skip Gemini
+MIN_QUALITY_SCORE = 0.6
+# A born-digital resume page usually has well over this many characters
+TARGET_CHARS_PER_PAGE = 400
+# Below this many words there isn't enough text to trust, whatever the page count
+MIN_WORDS = 80
+
+_WORD_RE = re.compile(r"[A-Za-zÀ-ɏ]{2,25}")
+
+
+def extract_text_from_pdf(filepath) -> tuple[str, int]:
+    """Extract the text layer of a PDF. Returns (text, page_count)."""
+    if PdfReader is None:
+        raise RuntimeError("pypdf is not installed")
+    reader = PdfReader(str(filepath))
+    pages = [page.extract_text() or "" for page in reader.pages]
+    return "\n\n".join(pages).strip(), len(pages)
+
+
+def extract_text_from_docx(filepath) -> str:
+    """Extract text from a DOCX file using python-docx, including tables."""
+    from docx import Document
+    doc = Document(filepath)
+    full_text = [para.text for para in doc.paragraphs]
+
+    # Many CV templates lay out sections in tables; merged cells repeat, so skip duplicates
+    for table in doc.tables:
+        for row in table.rows:
+            cells = []
+            for cell in row.cells:
+                text = cell.text.strip()
+                if text and text not in cells:
+                    cells.append(text)
+            if cells:
+                full_text.append(" | ".join(cells))
+
+    return '\n'.join(full_text).strip()
+
+
+def score_text_quality(text: str, pages: int = 1) -> float:
+    """
+    Score extracted text from 0 (unusable) to 1 (clean). Combines:
+    - density: characters per page (scanned PDFs have almost none)
+    - readability: share of printable characters (broken font maps produce junk)
+    - wordiness: share of whitespace-separated tokens that look like words
+    """
+    if not text:
+        return 0.0
+
+    tokens = text.split()
+    if len(tokens) < MIN_WORDS:
+        return 0.0
+
+    density = min(1.0, len(text) / max(pages, 1) / TARGET_CHARS_PER_PAGE)
+    printable = sum(1 for ch in text if ch.isprintable() or ch in "\n\t") - text.count("�")
+    readability = printable / len(text)
+    wordiness = sum(1 for token in tokens if _WORD_RE.search(token)) / len(tokens)
+
+    return round(density * readability * wordiness, 3)
+
+
+def extract_text(filepath) -> tuple[str, float]:
+    """Extract resume text locally. Returns (text, quality_score); score is 0 if unsupported."""
+    ext = Path(filepath).suffix.lower()
+    if ext == ".pdf" and PdfReader is not None:
+        text, pages = extract_text_from_pdf(filepath)
+        return text, score_text_quality(text, pages)
+    if ext == ".docx":
+        text = extract_text_from_docx(filepath)
+        # DOCX has no fixed pages; judge on content alone
+        return text, score_text_quality(text, pages=max(1, len(text) // TARGET_CHARS_PER_PAGE))
+    return "", 0.0
+
+
+def main():
+    """Print the quality score and text of the resume files given on the command line."""
+    for path in sys.argv[1:]:
+        text, score = extract_text(path)
+        print(f"=== {path}: score {score} ({len(text)} chars) ===")
+        print(text[:2000])
+
+
+if __name__ == "__main__":
+    main()